@@ -2,8 +2,26 @@
 """
 CityJSON Parser voor 3D BAG - Aparte module voor betere onderhoudbaarheid
 BELANGRIJK: 3D BAG API returnt vertices als strings "x y z", niet als arrays!
+Ondersteunt streaming: CityJSONSeq (een feature per regel) en gepagineerde
+/collections/pand/items responses worden gebouw voor gebouw verwerkt.
+Vertices worden per feature in een keer gedecodeerd naar een compacte
+float64 array (NumPy indien beschikbaar, anders array('d')).
+Surfaces worden met earcut getrianguleerd, inclusief binnenringen (gaten).
 """
 
+import json
+import math
+from array import array
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from earcut import earcut
+
+
 
 def parse_cityjson_vertices(raw_vertices):
     """Parse raw vertices die als strings of arrays kunnen komen.
@@ -50,43 +68,173 @@ def triangulate_polygon(vertex_indices):
     return triangles
 
 
-def extract_lod22_faces(geometry):
+def extract_lod22_faces(geometry, vertices=None):
     """Extraheer faces uit CityJSON geometry object.
     
     Args:
         geometry: CityJSON geometry dict met type en boundaries
+        vertices: Optioneel de vertex coordinaten; dan wordt met earcut
+            getrianguleerd inclusief gaten, anders fan triangulation van de buitenring
     
     Returns:
         List van triangulated faces
     """
+    faces = []
+    triangulator = SurfaceTriangulator(vertices) if vertices is not None else None
+    for surface in extract_surfaces(geometry):
+        if triangulator is not None:
+            faces.extend(triangulator.triangulate(surface))
+        elif len(surface[0]) >= 3:
+            faces.extend(triangulate_polygon(surface[0]))
+    return faces
+
+
+def extract_surfaces(geometry):
+    """Geef alle surfaces van een Solid / MultiSurface / CompositeSurface.
+
+    Returns:
+        List van surfaces; elke surface is een list van ringen (eerste = buitenring)
+    """
     geom_type = geometry.get('type', '')
     boundaries = geometry.get('boundaries', [])
-    
-    if not boundaries:
-        return []
-    
-    faces = []
-    
     if geom_type == 'Solid':
-        # Solid: boundaries[shell][surface][rings]
-        # Elke surface heeft 1+ rings (outer + optional inner)
-        for shell in boundaries:
-            for surface in shell:
-                # surface is een lijst van rings, neem outer ring (eerste)
-                if surface and len(surface) > 0:
-                    ring = surface[0] if isinstance(surface[0], list) else surface
-                    if len(ring) >= 3:
-                        faces.extend(triangulate_polygon(ring))
-    
-    elif geom_type == 'MultiSurface':
-        # MultiSurface: boundaries[surface][rings]
-        for surface in boundaries:
-            if surface and len(surface) > 0:
-                ring = surface[0] if isinstance(surface[0], list) else surface
-                if len(ring) >= 3:
-                    faces.extend(triangulate_polygon(ring))
-    
-    return faces
+        candidates = [surface for shell in boundaries for surface in shell]
+    elif geom_type in ('MultiSurface', 'CompositeSurface'):
+        candidates = boundaries
+    else:
+        return []
+    surfaces = []
+    for surface in candidates:
+        if not surface:
+            continue
+        rings = surface if isinstance(surface[0], list) else [surface]
+        if rings and len(rings[0]) >= 3:
+            surfaces.append([list(ring) for ring in rings])
+    return surfaces
+
+
+def polygon_normal(points):
+    """Newell normaal (niet genormaliseerd) van een 3D ring."""
+    nx = ny = nz = 0.0
+    count = len(points)
+    for i in range(count):
+        x1, y1, z1 = points[i]
+        x2, y2, z2 = points[(i + 1) % count]
+        nx += (y1 - y2) * (z1 + z2)
+        ny += (z1 - z2) * (x1 + x2)
+        nz += (x1 - x2) * (y1 + y2)
+    return nx, ny, nz
+
+
+def triangulate_surface(rings, vertices, min_area=1e-10):
+    """Trianguleer een 3D surface met gaten via earcut.
+
+    De surface wordt geprojecteerd op het vlak met de grootste normaal-
+    component; de driehoeken krijgen dezelfde orientatie als de buitenring.
+
+    Args:
+        rings: List van ringen met vertex indices (eerste = buitenring)
+        vertices: Indexeerbare (x, y, z) coordinaten
+        min_area: Driehoeken met kleinere (dubbele) oppervlakte vervallen
+
+    Returns:
+        List van (i, j, k) vertex index tuples
+    """
+    coords = {}
+    for ring in rings:
+        for vi in ring:
+            if vi not in coords:
+                coords[vi] = vertices[vi]
+    outer = [coords[i] for i in rings[0]]
+    nx, ny, nz = polygon_normal(outer)
+    ax, ay, az = abs(nx), abs(ny), abs(nz)
+    if ax + ay + az == 0:
+        return []
+    if az >= ax and az >= ay:
+        project = lambda v: (v[0], v[1])
+    elif ax >= ay:
+        project = lambda v: (v[1], v[2])
+    else:
+        project = lambda v: (v[2], v[0])
+
+    points = []
+    index_map = []
+    hole_starts = []
+    for n, ring in enumerate(rings):
+        if n > 0:
+            if len(ring) < 3:
+                continue
+            hole_starts.append(len(points))
+        for vi in ring:
+            points.append(project(coords[vi]))
+            index_map.append(vi)
+
+    if not hole_starts and _is_convex(points):
+        local = [(0, i, i + 1) for i in range(1, len(points) - 1)]
+    else:
+        local = earcut(points, hole_starts)
+
+    triangles = []
+    for a, b, c in local:
+        ia, ib, ic = index_map[a], index_map[b], index_map[c]
+        pa, pb, pc = coords[ia], coords[ib], coords[ic]
+        ux, uy, uz = pb[0] - pa[0], pb[1] - pa[1], pb[2] - pa[2]
+        vx, vy, vz = pc[0] - pa[0], pc[1] - pa[1], pc[2] - pa[2]
+        cx, cy, cz = uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+        if cx * cx + cy * cy + cz * cz <= min_area * min_area:
+            continue
+        if cx * nx + cy * ny + cz * nz < 0:
+            triangles.append((ia, ic, ib))
+        else:
+            triangles.append((ia, ib, ic))
+    return triangles
+
+
+def _is_convex(points):
+    """True als een 2D ring strikt convex en enkelvoudig is (dan volstaat fan triangulation).
+
+    Alle bochten moeten dezelfde kant op gaan en samen precies een omwenteling
+    (2 pi) maken; een ster (pentagram) of een twee keer doorlopen ring draait
+    verder rond en gaat via earcut.
+    """
+    count = len(points)
+    if count == 3:
+        return True
+    sign = 0
+    turning = 0.0
+    for i in range(count):
+        ax, ay = points[i]
+        bx, by = points[(i + 1) % count]
+        cx, cy = points[(i + 2) % count]
+        ux, uy, vx, vy = bx - ax, by - ay, cx - bx, cy - by
+        cross = ux * vy - uy * vx
+        if cross == 0:
+            return False
+        if sign == 0:
+            sign = 1 if cross > 0 else -1
+        elif (cross > 0) != (sign > 0):
+            return False
+        turning += math.atan2(cross, ux * vx + uy * vy)
+    return abs(abs(turning) - 2 * math.pi) < 1e-6
+
+
+class SurfaceTriangulator(object):
+    """Earcut triangulatie met cache per surface (zelfde ringen = zelfde resultaat)."""
+
+    def __init__(self, vertices):
+        self.vertices = vertices
+        self.cache = {}
+        self.hits = 0
+
+    def triangulate(self, surface):
+        key = tuple(tuple(ring) for ring in surface)
+        triangles = self.cache.get(key)
+        if triangles is None:
+            triangles = triangulate_surface(surface, self.vertices)
+            self.cache[key] = triangles
+        else:
+            self.hits += 1
+        return triangles
 
 
 def transform_vertices(vertices, scale, translate, rd_x, rd_y):
@@ -108,3 +256,347 @@ def transform_vertices(vertices, scale, translate, rd_x, rd_y):
         z = float(vz) * scale[2] + translate[2]
         converted.append((x - rd_x, y - rd_y, z))
     return converted
+
+
+class VertexArray(object):
+    """Compacte vertex opslag: platte float64 buffer [x0, y0, z0, x1, ...].
+
+    Indexeren geeft een (x, y, z) tuple, zodat bestaande code die met
+    lijsten van tuples werkt ongewijzigd blijft.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.count = len(data) // 3
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError(index)
+        j = index * 3
+        d = self.data
+        return (float(d[j]), float(d[j + 1]), float(d[j + 2]))
+
+    def __iter__(self):
+        d = self.data
+        for j in range(0, len(d) - 2, 3):
+            yield (float(d[j]), float(d[j + 1]), float(d[j + 2]))
+
+
+def decode_vertex_block(raw_vertices):
+    """Decodeer alle vertices van een feature in een keer.
+
+    Strings ("x y z") worden samengevoegd en met een enkele split() verwerkt;
+    arrays worden direct afgevlakt. Gemengde of afwijkende input valt terug
+    op parse_cityjson_vertices.
+
+    Args:
+        raw_vertices: List van vertices als strings of [x, y, z] arrays
+
+    Returns:
+        Platte float64 buffer (numpy.ndarray of array('d')) met 3 waarden per vertex
+    """
+    if not raw_vertices:
+        return np.zeros(0) if np is not None else array('d')
+    n = len(raw_vertices)
+    try:
+        if isinstance(raw_vertices[0], str):
+            text = ' '.join(raw_vertices)
+            data = np.array(text.split(), dtype=float) if np is not None else array('d', map(float, text.split()))
+        elif np is not None:
+            data = np.asarray(raw_vertices, dtype=float).reshape(-1)
+        else:
+            data = array('d', chain.from_iterable(raw_vertices))
+        if len(data) == n * 3:
+            return data
+    except (TypeError, ValueError):
+        pass
+    flat = chain.from_iterable(parse_cityjson_vertices(raw_vertices))
+    return np.fromiter(flat, dtype=float) if np is not None else array('d', flat)
+
+
+def transform_vertex_block(data, scale, translate, rd_x, rd_y):
+    """Pas scale/translate en de RD offset toe op een platte vertex buffer (in-place).
+
+    Args:
+        data: Buffer van decode_vertex_block
+        scale: [sx, sy, sz]
+        translate: [tx, ty, tz]
+        rd_x, rd_y: Project centrum coordinaten
+
+    Returns:
+        VertexArray met relatieve meters
+    """
+    offset = (translate[0] - rd_x, translate[1] - rd_y, translate[2])
+    if np is not None and isinstance(data, np.ndarray):
+        block = data.reshape(-1, 3)
+        block *= np.asarray(scale, dtype=float)
+        block += np.asarray(offset, dtype=float)
+    else:
+        for axis in range(3):
+            s, o = scale[axis], offset[axis]
+            data[axis::3] = array('d', [v * s + o for v in data[axis::3]])
+    return VertexArray(data)
+
+
+class VertexRange(object):
+    """Aaneengesloten deel van een VertexPool: de vertices van een gebouw."""
+
+    def __init__(self, data, start, count):
+        self.data = data
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError(index)
+        j = (self.start + index) * 3
+        d = self.data
+        return (d[j], d[j + 1], d[j + 2])
+
+    def __iter__(self):
+        d = self.data
+        for j in range(self.start * 3, (self.start + self.count) * 3, 3):
+            yield (d[j], d[j + 1], d[j + 2])
+
+
+class ParseStats(object):
+    """Tellers over de vertex pools en face opschoning van een import."""
+
+    def __init__(self):
+        self.buildings = 0
+        self.source_vertices = 0
+        self.pooled_vertices = 0
+        self.duplicate_faces = 0
+        self.degenerate_faces = 0
+
+    def summary(self):
+        return "{} gebouwen, {} van {} vertices gebruikt, {} dubbele en {} gedegenereerde faces verwijderd".format(
+            self.buildings, self.pooled_vertices, self.source_vertices,
+            self.duplicate_faces, self.degenerate_faces)
+
+
+class VertexPool(object):
+    """Gedeelde vertex opslag per feature.
+
+    Elk gebouw krijgt een aaneengesloten bereik met alleen de vertices die het
+    gebruikt (samenvallende vertices samengevoegd); face indices worden naar
+    dat bereik omgenummerd. Dubbele en gedegenereerde faces vervallen.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.data = array('d')
+
+    def add(self, face_lists, stats=None):
+        """Voeg een gebouw toe.
+
+        Args:
+            face_lists: Lists van faces (elk een reeks indices in source)
+            stats: Optioneel ParseStats object
+
+        Returns:
+            Tuple (VertexRange, omgenummerde face_lists)
+        """
+        start = len(self.data) // 3
+        local = {}
+        by_coord = {}
+        result = []
+        for faces in face_lists:
+            seen = set()
+            out = []
+            for face in faces:
+                mapped = []
+                try:
+                    for vi in face:
+                        li = local.get(vi)
+                        if li is None:
+                            v = self.source[vi]
+                            li = by_coord.get(v)
+                            if li is None:
+                                li = len(by_coord)
+                                by_coord[v] = li
+                                self.data.extend(v)
+                            local[vi] = li
+                        if not mapped or mapped[-1] != li:
+                            mapped.append(li)
+                except IndexError:
+                    mapped = []
+                if len(mapped) > 1 and mapped[0] == mapped[-1]:
+                    mapped.pop()
+                if len(set(mapped)) < 3:
+                    if stats is not None:
+                        stats.degenerate_faces += 1
+                    continue
+                key = tuple(sorted(mapped))
+                if key in seen:
+                    if stats is not None:
+                        stats.duplicate_faces += 1
+                    continue
+                seen.add(key)
+                out.append(tuple(mapped))
+            result.append(out)
+        if stats is not None:
+            stats.pooled_vertices += len(by_coord)
+        return VertexRange(self.data, start, len(by_coord)), result
+
+
+def parse_transform(transform):
+    """Lees scale/translate uit een CityJSON transform (arrays of "x y z" strings).
+
+    Returns:
+        Tuple (scale, translate) als lijsten van 3 floats
+    """
+    transform = transform or {}
+
+    def as_floats(value, default):
+        if not value:
+            return list(default)
+        if isinstance(value, str):
+            return [float(x) for x in value.split()]
+        return [float(x) for x in value]
+
+    return (as_floats(transform.get('scale'), [1.0, 1.0, 1.0]),
+            as_floats(transform.get('translate'), [0.0, 0.0, 0.0]))
+
+
+def extract_polygon_faces(geometry):
+    """Geef de buitenringen (vertex indices) van een Solid of MultiSurface.
+
+    Returns:
+        List van ringen, elk een list van vertex indices
+    """
+    return [surface[0] for surface in extract_surfaces(geometry)]
+
+
+def surfaces_center(surfaces, vertices):
+    """Horizontaal midden (bbox) van de vertices die de surfaces gebruiken."""
+    xs = []
+    ys = []
+    for surface in surfaces:
+        for vi in surface[0]:
+            v = vertices[vi]
+            xs.append(v[0])
+            ys.append(v[1])
+    if not xs:
+        return 0.0, 0.0
+    return (min(xs) + max(xs)) / 2.0, (min(ys) + max(ys)) / 2.0
+
+
+def iter_feature_buildings(feature, scale, translate, rd_x, rd_y, lod='2.2', stats=None):
+    """Geef de gebouwen van een enkele CityJSONFeature.
+
+    Args:
+        feature: CityJSONFeature dict (CityObjects + vertices)
+        scale, translate: CityJSON transform
+        rd_x, rd_y: Project centrum coordinaten
+        lod: Gewenste LOD als string, of een selector object met
+            choose(beschikbare_lods, afstand) -> lod of None (zie mesh_tools)
+        stats: Optioneel ParseStats object
+
+    Yields:
+        Dicts met 'id', 'lod', 'distance' (horizontaal tot het project
+        centrum), 'vertices' (VertexRange in relatieve meters met alleen de
+        eigen vertices), 'polygon_faces' (buitenringen) en 'triangles'
+        (earcut, inclusief gaten), beide genummerd binnen 'vertices'
+    """
+    raw_vertices = feature.get('vertices', [])
+    if not raw_vertices:
+        return
+    selector = None if isinstance(lod, str) else lod
+    vertices = None
+    triangulator = None
+    pool = None
+    for obj_id, obj in feature.get('CityObjects', {}).items():
+        if obj.get('type', '') not in ['BuildingPart', 'Building']:
+            continue
+        by_lod = {}
+        for geom in obj.get('geometry', []):
+            surfaces = extract_surfaces(geom)
+            if surfaces:
+                by_lod.setdefault(str(geom.get('lod', '')), surfaces)
+        if not by_lod or (selector is None and lod not in by_lod):
+            continue
+        if vertices is None:
+            vertices = transform_vertex_block(decode_vertex_block(raw_vertices), scale, translate, rd_x, rd_y)
+            triangulator = SurfaceTriangulator(vertices)
+            pool = VertexPool(vertices)
+            if stats is not None:
+                stats.source_vertices += len(vertices)
+        cx, cy = surfaces_center(next(iter(by_lod.values())), vertices)
+        distance = (cx * cx + cy * cy) ** 0.5
+        chosen = selector.choose(sorted(by_lod), distance) if selector is not None else lod
+        if chosen is None or chosen not in by_lod:
+            continue
+        surfaces = by_lod[chosen]
+        triangles = []
+        for surface in surfaces:
+            triangles.extend(triangulator.triangulate(surface))
+        vertex_range, (polygon_faces, triangles) = pool.add(
+            [[surface[0] for surface in surfaces], triangles], stats)
+        if not triangles and not polygon_faces:
+            continue
+        if stats is not None:
+            stats.buildings += 1
+        yield {'id': obj_id, 'lod': chosen, 'distance': distance, 'vertices': vertex_range,
+               'polygon_faces': polygon_faces, 'triangles': triangles}
+
+
+def iter_cityjsonseq(lines):
+    """Lees een CityJSONSeq stroom regel voor regel.
+
+    De eerste regel is het CityJSON header object (met transform), elke
+    volgende regel een CityJSONFeature. Er staat nooit meer dan een feature
+    tegelijk in het geheugen.
+
+    Args:
+        lines: Iterable van tekstregels (bestand, HTTP response, ...)
+
+    Yields:
+        Tuples (feature, scale, translate)
+    """
+    scale, translate = parse_transform(None)
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        obj = json.loads(line)
+        obj_type = obj.get('type')
+        if obj_type == 'CityJSON':
+            scale, translate = parse_transform(obj.get('transform') or obj.get('metadata', {}).get('transform'))
+        elif obj_type == 'CityJSONFeature':
+            yield obj, scale, translate
+
+
+def iter_cityjson_pages(pages):
+    """Loop gepagineerde 3D BAG /collections/pand/items responses af.
+
+    Args:
+        pages: Iterable van pagina dicts (metadata.transform + features)
+
+    Yields:
+        Tuples (feature, scale, translate)
+    """
+    for page in pages:
+        scale, translate = parse_transform(page.get('metadata', {}).get('transform') or page.get('transform'))
+        features = page.get('features', []) or []
+        if 'feature' in page and not features:
+            features = [page['feature']]
+        for feature in features:
+            yield feature, scale, translate
+
+
+def iter_buildings(features, rd_x, rd_y, lod='2.2', stats=None):
+    """Zet een stroom (feature, scale, translate) om in een stroom gebouwen."""
+    for feature, scale, translate in features:
+        for building in iter_feature_buildings(feature, scale, translate, rd_x, rd_y, lod, stats):
+            yield building
@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Earcut - ear clipping triangulatie van 2D polygonen met gaten
+Python port van het mapbox/earcut algoritme (ISC licentie): gaten worden via
+bruggen in de buitenring opgenomen, grote polygonen gebruiken een z-order
+index voor de ear test, en lastige gevallen worden opgelost door lokale
+doorsnijdingen te herstellen of de polygoon te splitsen.
+"""
+
+
+class _Node(object):
+    __slots__ = ('i', 'x', 'y', 'prev', 'next', 'z', 'prev_z', 'next_z', 'steiner')
+
+    def __init__(self, i, x, y):
+        self.i = i
+        self.x = x
+        self.y = y
+        self.prev = None
+        self.next = None
+        self.z = 0
+        self.prev_z = None
+        self.next_z = None
+        self.steiner = False
+
+
+HASH_THRESHOLD = 80
+
+
+def earcut(points, hole_starts=None):
+    """Trianguleer een polygoon met optionele gaten.
+
+    Args:
+        points: List van (x, y) tuples: eerst de buitenring, dan de gaten
+        hole_starts: Index in points waar elk gat begint
+
+    Returns:
+        List van (i, j, k) index tuples in points
+    """
+    triangles = []
+    hole_starts = hole_starts or []
+    outer_len = hole_starts[0] if hole_starts else len(points)
+    outer = _linked_list(points, 0, outer_len, True)
+    if outer is None or outer.next is outer.prev:
+        return triangles
+    if hole_starts:
+        outer = _eliminate_holes(points, hole_starts, outer)
+
+    min_x = min_y = inv_size = 0
+    if len(points) > HASH_THRESHOLD:
+        xs = [p[0] for p in points[:outer_len]]
+        ys = [p[1] for p in points[:outer_len]]
+        min_x, min_y = min(xs), min(ys)
+        size = max(max(xs) - min_x, max(ys) - min_y)
+        inv_size = 32767.0 / size if size else 0
+
+    _earcut_linked(outer, triangles, min_x, min_y, inv_size, 0)
+    return triangles
+
+
+def _signed_area(points, start, end):
+    total = 0.0
+    j = end - 1
+    for i in range(start, end):
+        total += (points[j][0] - points[i][0]) * (points[i][1] + points[j][1])
+        j = i
+    return total
+
+
+def _linked_list(points, start, end, clockwise):
+    last = None
+    if clockwise == (_signed_area(points, start, end) > 0):
+        for i in range(start, end):
+            last = _insert_node(i, points[i][0], points[i][1], last)
+    else:
+        for i in range(end - 1, start - 1, -1):
+            last = _insert_node(i, points[i][0], points[i][1], last)
+    if last is not None and _equals(last, last.next):
+        _remove_node(last)
+        last = last.next
+    return last
+
+
+def _filter_points(start, end=None):
+    if start is None:
+        return start
+    if end is None:
+        end = start
+    p = start
+    while True:
+        again = False
+        if not p.steiner and (_equals(p, p.next) or _area(p.prev, p, p.next) == 0):
+            _remove_node(p)
+            p = end = p.prev
+            if p is p.next:
+                break
+            again = True
+        else:
+            p = p.next
+        if not again and p is end:
+            break
+    return end
+
+
+def _earcut_linked(ear, triangles, min_x, min_y, inv_size, pass_no):
+    if ear is None:
+        return
+    if not pass_no and inv_size:
+        _index_curve(ear, min_x, min_y, inv_size)
+    stop = ear
+    while ear.prev is not ear.next:
+        prev, nxt = ear.prev, ear.next
+        if _is_ear_hashed(ear, min_x, min_y, inv_size) if inv_size else _is_ear(ear):
+            triangles.append((prev.i, ear.i, nxt.i))
+            _remove_node(ear)
+            ear = nxt.next
+            stop = nxt.next
+            continue
+        ear = nxt
+        if ear is stop:
+            if not pass_no:
+                _earcut_linked(_filter_points(ear), triangles, min_x, min_y, inv_size, 1)
+            elif pass_no == 1:
+                ear = _cure_local_intersections(_filter_points(ear), triangles)
+                _earcut_linked(ear, triangles, min_x, min_y, inv_size, 2)
+            elif pass_no == 2:
+                _split_earcut(ear, triangles, min_x, min_y, inv_size)
+            break
+
+
+def _is_ear(ear):
+    a, b, c = ear.prev, ear, ear.next
+    if _area(a, b, c) >= 0:
+        return False
+    x0, x1 = min(a.x, b.x, c.x), max(a.x, b.x, c.x)
+    y0, y1 = min(a.y, b.y, c.y), max(a.y, b.y, c.y)
+    p = c.next
+    while p is not a:
+        if (x0 <= p.x <= x1 and y0 <= p.y <= y1 and
+                _point_in_triangle(a.x, a.y, b.x, b.y, c.x, c.y, p.x, p.y) and
+                _area(p.prev, p, p.next) >= 0):
+            return False
+        p = p.next
+    return True
+
+
+def _blocks_ear(p, a, b, c, x0, y0, x1, y1):
+    return (x0 <= p.x <= x1 and y0 <= p.y <= y1 and p is not a and p is not c and
+            _point_in_triangle(a.x, a.y, b.x, b.y, c.x, c.y, p.x, p.y) and
+            _area(p.prev, p, p.next) >= 0)
+
+
+def _is_ear_hashed(ear, min_x, min_y, inv_size):
+    a, b, c = ear.prev, ear, ear.next
+    if _area(a, b, c) >= 0:
+        return False
+    x0, x1 = min(a.x, b.x, c.x), max(a.x, b.x, c.x)
+    y0, y1 = min(a.y, b.y, c.y), max(a.y, b.y, c.y)
+    min_z = _z_order(x0, y0, min_x, min_y, inv_size)
+    max_z = _z_order(x1, y1, min_x, min_y, inv_size)
+    p, n = ear.prev_z, ear.next_z
+    while p is not None and p.z >= min_z and n is not None and n.z <= max_z:
+        if _blocks_ear(p, a, b, c, x0, y0, x1, y1):
+            return False
+        p = p.prev_z
+        if _blocks_ear(n, a, b, c, x0, y0, x1, y1):
+            return False
+        n = n.next_z
+    while p is not None and p.z >= min_z:
+        if _blocks_ear(p, a, b, c, x0, y0, x1, y1):
+            return False
+        p = p.prev_z
+    while n is not None and n.z <= max_z:
+        if _blocks_ear(n, a, b, c, x0, y0, x1, y1):
+            return False
+        n = n.next_z
+    return True
+
+
+def _cure_local_intersections(start, triangles):
+    p = start
+    while True:
+        a, b = p.prev, p.next.next
+        if (not _equals(a, b) and _intersects(a, p, p.next, b) and
+                _locally_inside(a, b) and _locally_inside(b, a)):
+            triangles.append((a.i, p.i, b.i))
+            _remove_node(p)
+            _remove_node(p.next)
+            p = start = b
+        p = p.next
+        if p is start:
+            break
+    return _filter_points(p)
+
+
+def _split_earcut(start, triangles, min_x, min_y, inv_size):
+    a = start
+    while True:
+        b = a.next.next
+        while b is not a.prev:
+            if a.i != b.i and _is_valid_diagonal(a, b):
+                c = _split_polygon(a, b)
+                a = _filter_points(a, a.next)
+                c = _filter_points(c, c.next)
+                _earcut_linked(a, triangles, min_x, min_y, inv_size, 0)
+                _earcut_linked(c, triangles, min_x, min_y, inv_size, 0)
+                return
+            b = b.next
+        a = a.next
+        if a is start:
+            break
+
+
+def _eliminate_holes(points, hole_starts, outer):
+    queue = []
+    for n, start in enumerate(hole_starts):
+        end = hole_starts[n + 1] if n + 1 < len(hole_starts) else len(points)
+        node = _linked_list(points, start, end, False)
+        if node is None:
+            continue
+        if node is node.next:
+            node.steiner = True
+        queue.append(_get_leftmost(node))
+    queue.sort(key=lambda node: node.x)
+    for hole in queue:
+        outer = _eliminate_hole(hole, outer)
+    return outer
+
+
+def _eliminate_hole(hole, outer):
+    bridge = _find_hole_bridge(hole, outer)
+    if bridge is None:
+        return outer
+    bridge_reverse = _split_polygon(bridge, hole)
+    _filter_points(bridge_reverse, bridge_reverse.next)
+    return _filter_points(bridge, bridge.next)
+
+
+def _find_hole_bridge(hole, outer):
+    p = outer
+    hx, hy = hole.x, hole.y
+    qx = float('-inf')
+    m = None
+    while True:
+        if hy <= p.y and hy >= p.next.y and p.next.y != p.y:
+            x = p.x + (hy - p.y) * (p.next.x - p.x) / float(p.next.y - p.y)
+            if x <= hx and x > qx:
+                qx = x
+                m = p if p.x < p.next.x else p.next
+                if x == hx:
+                    return m
+        p = p.next
+        if p is outer:
+            break
+    if m is None:
+        return None
+
+    stop = m
+    mx, my = m.x, m.y
+    tan_min = float('inf')
+    p = m
+    while True:
+        if (hx >= p.x and p.x >= mx and hx != p.x and
+                _point_in_triangle(hx if hy < my else qx, hy, mx, my, qx if hy < my else hx, hy, p.x, p.y)):
+            tan = abs(hy - p.y) / float(hx - p.x)
+            if _locally_inside(p, hole) and (tan < tan_min or (tan == tan_min and (
+                    p.x > m.x or (p.x == m.x and _sector_contains_sector(m, p))))):
+                m = p
+                tan_min = tan
+        p = p.next
+        if p is stop:
+            break
+    return m
+
+
+def _sector_contains_sector(m, p):
+    return _area(m.prev, m, p.prev) < 0 and _area(p.next, m, m.next) < 0
+
+
+def _index_curve(start, min_x, min_y, inv_size):
+    nodes = []
+    p = start
+    while True:
+        if p.z == 0:
+            p.z = _z_order(p.x, p.y, min_x, min_y, inv_size)
+        nodes.append(p)
+        p = p.next
+        if p is start:
+            break
+    nodes.sort(key=lambda node: node.z)
+    prev = None
+    for node in nodes:
+        node.prev_z = prev
+        if prev is not None:
+            prev.next_z = node
+        prev = node
+    prev.next_z = None
+
+
+def _z_order(x, y, min_x, min_y, inv_size):
+    x = int((x - min_x) * inv_size)
+    y = int((y - min_y) * inv_size)
+    x = (x | (x << 8)) & 0x00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F
+    x = (x | (x << 2)) & 0x33333333
+    x = (x | (x << 1)) & 0x55555555
+    y = (y | (y << 8)) & 0x00FF00FF
+    y = (y | (y << 4)) & 0x0F0F0F0F
+    y = (y | (y << 2)) & 0x33333333
+    y = (y | (y << 1)) & 0x55555555
+    return x | (y << 1)
+
+
+def _get_leftmost(start):
+    p = leftmost = start
+    while True:
+        if p.x < leftmost.x or (p.x == leftmost.x and p.y < leftmost.y):
+            leftmost = p
+        p = p.next
+        if p is start:
+            break
+    return leftmost
+
+
+def _point_in_triangle(ax, ay, bx, by, cx, cy, px, py):
+    return ((cx - px) * (ay - py) >= (ax - px) * (cy - py) and
+            (ax - px) * (by - py) >= (bx - px) * (ay - py) and
+            (bx - px) * (cy - py) >= (cx - px) * (by - py))
+
+
+def _is_valid_diagonal(a, b):
+    return (a.next.i != b.i and a.prev.i != b.i and not _intersects_polygon(a, b) and
+            ((_locally_inside(a, b) and _locally_inside(b, a) and _middle_inside(a, b) and
+              (_area(a.prev, a, b.prev) or _area(a, b.prev, b))) or
+             (_equals(a, b) and _area(a.prev, a, a.next) > 0 and _area(b.prev, b, b.next) > 0)))
+
+
+def _area(p, q, r):
+    return (q.y - p.y) * (r.x - q.x) - (q.x - p.x) * (r.y - q.y)
+
+
+def _equals(p1, p2):
+    return p1.x == p2.x and p1.y == p2.y
+
+
+def _sign(value):
+    return 1 if value > 0 else (-1 if value < 0 else 0)
+
+
+def _on_segment(p, q, r):
+    return min(p.x, r.x) <= q.x <= max(p.x, r.x) and min(p.y, r.y) <= q.y <= max(p.y, r.y)
+
+
+def _intersects(p1, q1, p2, q2):
+    o1 = _sign(_area(p1, q1, p2))
+    o2 = _sign(_area(p1, q1, q2))
+    o3 = _sign(_area(p2, q2, p1))
+    o4 = _sign(_area(p2, q2, q1))
+    if o1 != o2 and o3 != o4:
+        return True
+    if o1 == 0 and _on_segment(p1, p2, q1):
+        return True
+    if o2 == 0 and _on_segment(p1, q2, q1):
+        return True
+    if o3 == 0 and _on_segment(p2, p1, q2):
+        return True
+    if o4 == 0 and _on_segment(p2, q1, q2):
+        return True
+    return False
+
+
+def _intersects_polygon(a, b):
+    p = a
+    while True:
+        if (p.i != a.i and p.next.i != a.i and p.i != b.i and p.next.i != b.i and
+                _intersects(p, p.next, a, b)):
+            return True
+        p = p.next
+        if p is a:
+            break
+    return False
+
+
+def _locally_inside(a, b):
+    if _area(a.prev, a, a.next) < 0:
+        return _area(a, b, a.next) >= 0 and _area(a, a.prev, b) >= 0
+    return _area(a, b, a.prev) < 0 or _area(a, a.next, b) < 0
+
+
+def _middle_inside(a, b):
+    p = a
+    inside = False
+    px, py = (a.x + b.x) / 2.0, (a.y + b.y) / 2.0
+    while True:
+        if (((p.y > py) != (p.next.y > py)) and p.next.y != p.y and
+                px < (p.next.x - p.x) * (py - p.y) / float(p.next.y - p.y) + p.x):
+            inside = not inside
+        p = p.next
+        if p is a:
+            break
+    return inside
+
+
+def _split_polygon(a, b):
+    a2 = _Node(a.i, a.x, a.y)
+    b2 = _Node(b.i, b.x, b.y)
+    an, bp = a.next, b.prev
+    a.next = b
+    b.prev = a
+    a2.next = an
+    an.prev = a2
+    b2.next = a2
+    a2.prev = b2
+    bp.next = b2
+    b2.prev = bp
+    return b2
+
+
+def _insert_node(i, x, y, last):
+    p = _Node(i, x, y)
+    if last is None:
+        p.prev = p
+        p.next = p
+    else:
+        p.next = last.next
+        p.prev = last
+        last.next.prev = p
+        last.next = p
+    return p
+
+
+def _remove_node(p):
+    p.next.prev = p.prev
+    p.prev.next = p.next
+    if p.prev_z is not None:
+        p.prev_z.next_z = p.next_z
+    if p.next_z is not None:
+        p.next_z.prev_z = p.prev_z
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Geocoding voor GIS2BIM - PDOK Locatieserver met cache en autocomplete
+Zoekopdrachten worden genormaliseerd en met een verlooptijd in het geheugen
+en per gebruiker op schijf bewaard, zodat projectadressen die vaker gezocht
+worden geen netwerkverkeer meer kosten. AutoComplete gebruikt het 'suggest'
+endpoint met debouncing; verouderde zoekopdrachten worden afgebroken of
+genegeerd.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    from urllib import quote
+except ImportError:
+    from urllib.parse import quote
+
+from tile_cache import default_cache_dir
+
+
+LOCATIESERVER_URL = 'https://api.pdok.nl/bzk/locatieserver/search/v3_1'
+DEFAULT_ROWS = 5
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_DEBOUNCE = 0.3
+DEFAULT_MIN_CHARS = 3
+CACHE_NAME = 'geocode.json'
+FIELDS = 'id,weergavenaam,type,centroide_rd'
+
+
+def normalize_query(text):
+    """Normaliseer een zoekopdracht: kleine letters, enkele spaties, ', ' tussen delen."""
+    text = re.sub(r'\s+', ' ', text.strip().lower())
+    return re.sub(r'\s*,\s*', ', ', text).strip(', ')
+
+
+def quote_query(text):
+    """URL-encode een zoekopdracht volledig (UTF-8), inclusief &, # en +."""
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return quote(text, safe='')
+
+
+def locatieserver_url(endpoint, rows=DEFAULT_ROWS, base_url=LOCATIESERVER_URL, **params):
+    query = "&".join("{}={}".format(name, quote_query(value)) for name, value in sorted(params.items()))
+    return "{}/{}?{}&rows={}&fl={}".format(base_url, endpoint, query, rows, FIELDS)
+
+
+def parse_point(wkt):
+    """'POINT(x y)' -> (x, y), of None."""
+    if not wkt:
+        return None
+    coords = wkt.replace('POINT(', '').replace(')', '').split()
+    if len(coords) < 2:
+        return None
+    return float(coords[0]), float(coords[1])
+
+
+def parse_docs(data):
+    """Locatieserver response -> list van dicts met id, name, type en x/y (of None)."""
+    results = []
+    for d in data.get('response', {}).get('docs', []) or []:
+        point = parse_point(d.get('centroide_rd', ''))
+        results.append({'id': d.get('id'), 'name': d.get('weergavenaam', ''), 'type': d.get('type'),
+                        'x': point[0] if point else None, 'y': point[1] if point else None})
+    return results
+
+
+class GeocodeCache(object):
+    """Cache van Locatieserver antwoorden per (soort, genormaliseerde query).
+
+    Entries verlopen na ttl seconden; boven max_entries vervallen de oudste.
+    Met een pad wordt de cache als JSON per gebruiker bewaard (flush()).
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path, 'r') as f:
+                    self._entries = json.load(f)
+            except (IOError, OSError, ValueError):
+                self._entries = {}
+
+    @staticmethod
+    def key(kind, query):
+        return u"{}|{}".format(kind, normalize_query(query))
+
+    def get(self, kind, query):
+        key = self.key(kind, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                    self._dirty = True
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, kind, query, value):
+        with self._lock:
+            self._entries[self.key(kind, query)] = [time.time(), value]
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries.items(), key=lambda kv: kv[1][0])
+                for key, _ in oldest[:len(self._entries) - self.max_entries]:
+                    del self._entries[key]
+            self._dirty = True
+
+    def flush(self):
+        """Schrijf de cache naar schijf als er iets veranderd is."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+            self._dirty = False
+
+
+def default_geocode_cache():
+    return GeocodeCache(os.path.join(default_cache_dir('geocode'), CACHE_NAME))
+
+
+class Geocoder(object):
+    """PDOK Locatieserver client met cache.
+
+    Args:
+        fetch_text: Functie url -> response tekst
+        cache: GeocodeCache (None = alleen in het geheugen)
+        rows: Maximaal aantal resultaten
+        base_url: Locatieserver endpoint
+    """
+
+    def __init__(self, fetch_text, cache=None, rows=DEFAULT_ROWS, base_url=LOCATIESERVER_URL):
+        self.fetch_text = fetch_text
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.rows = rows
+        self.base_url = base_url
+        self.requests = 0
+
+    def _query(self, kind, query, url, fetch_text=None):
+        cached = self.cache.get(kind, query)
+        if cached is not None:
+            return cached
+        self.requests += 1
+        results = parse_docs(json.loads((fetch_text or self.fetch_text)(url)))
+        self.cache.put(kind, query, results)
+        self.cache.flush()
+        return results
+
+    def search(self, address):
+        """Vrij zoeken: list van dicts (id, name, type, x, y) met coordinaten."""
+        if not normalize_query(address):
+            return []
+        results = self._query('free', address, locatieserver_url('free', self.rows, self.base_url, q=normalize_query(address)))
+        return [r for r in results if r['x'] is not None]
+
+    def suggest(self, text, fetch_text=None):
+        """Suggesties tijdens het typen (coordinaten indien meegeleverd)."""
+        if not normalize_query(text):
+            return []
+        return self._query('suggest', text, locatieserver_url('suggest', self.rows, self.base_url, q=normalize_query(text)),
+                           fetch_text)
+
+    def resolve(self, result):
+        """Vul de coordinaten van een suggestie aan via 'lookup' (gecachet)."""
+        if result.get('x') is not None or not result.get('id'):
+            return result
+        found = self._query('lookup', result['id'], locatieserver_url('lookup', 1, self.base_url, id=result['id']))
+        return found[0] if found else result
+
+    def stats(self):
+        return {'requests': self.requests, 'hits': self.cache.hits, 'misses': self.cache.misses}
+
+
+class AutoComplete(object):
+    """Debounced suggesties in een achtergrond thread.
+
+    update(text) plant een zoekopdracht na 'delay' seconden stilte. Een nieuwere
+    update vervangt een geplande opdracht en breekt een lopende request af
+    (via de abort functie van open_request); resultaten van verouderde
+    opdrachten worden nooit aan on_results doorgegeven.
+
+    Args:
+        geocoder: Geocoder
+        on_results: Functie(text, results), aangeroepen vanuit de achtergrond
+            thread (in WinForms via BeginInvoke naar de UI thread)
+        delay: Debounce tijd in seconden
+        min_chars: Minimale lengte van de genormaliseerde tekst
+        open_request: Optionele functie () -> (fetch_text, abort) per request
+        on_error: Optionele functie(text, exception)
+    """
+
+    def __init__(self, geocoder, on_results, delay=DEFAULT_DEBOUNCE, min_chars=DEFAULT_MIN_CHARS,
+                 open_request=None, on_error=None):
+        self.geocoder = geocoder
+        self.on_results = on_results
+        self.delay = delay
+        self.min_chars = min_chars
+        self.open_request = open_request
+        self.on_error = on_error
+        self.requested = 0
+        self.cancelled = 0
+        self._generation = 0
+        self._text = None
+        self._due = 0.0
+        self._abort = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def update(self, text):
+        """Nieuwe invoer; vervangt geplande en lopende zoekopdrachten."""
+        with self._cond:
+            self._generation += 1
+            abort, self._abort = self._abort, None
+            if abort is not None:
+                self.cancelled += 1
+            self._text = text if len(normalize_query(text)) >= self.min_chars else None
+            self._due = time.time() + self.delay
+            self._cond.notify()
+        if abort is not None:
+            try:
+                abort()
+            except Exception:
+                pass
+
+    def cancel(self):
+        self.update('')
+
+    def close(self):
+        self.cancel()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _current(self, generation):
+        with self._cond:
+            return generation == self._generation
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (self._text is None or time.time() < self._due):
+                    self._cond.wait(None if self._text is None else max(0.01, self._due - time.time()))
+                if self._closed:
+                    return
+                text, generation = self._text, self._generation
+                self._text = None
+                fetch_text, abort = self.open_request() if self.open_request else (None, None)
+                self._abort = abort
+                self.requested += 1
+            try:
+                results = self.geocoder.suggest(text, fetch_text)
+                error = None
+            except Exception as e:
+                results, error = None, e
+            with self._cond:
+                if self._abort is abort:
+                    self._abort = None
+            if not self._current(generation):
+                continue
+            if error is not None:
+                if self.on_error is not None:
+                    self.on_error(text, error)
+            else:
+                self.on_results(text, results)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+GeoTIFF lezer voor GIS2BIM - hoogtegrids (AHN) zonder GDAL of PIL
+Leest de eerste band van een (Geo)TIFF: strips of tiles, ongecomprimeerd,
+Deflate of LZW, met horizontale predictor, als integer of float samples.
+Genoeg voor de GeoTIFF's die WCS services zoals PDOK AHN teruggeven; geen
+BigTIFF, JPEG compressie of floating point predictor.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+
+
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 16: 8}
+_TYPE_FORMATS = {1: 'B', 3: 'H', 4: 'I', 6: 'b', 8: 'h', 9: 'i', 11: 'f', 12: 'd', 16: 'Q'}
+# (SampleFormat, BitsPerSample) -> array typecode
+_SAMPLE_CODES = {(1, 8): 'B', (1, 16): 'H', (1, 32): 'I', (2, 8): 'b', (2, 16): 'h', (2, 32): 'i',
+                 (3, 32): 'f', (3, 64): 'd'}
+
+TAG_WIDTH = 256
+TAG_HEIGHT = 257
+TAG_BITS = 258
+TAG_COMPRESSION = 259
+TAG_STRIP_OFFSETS = 273
+TAG_SAMPLES = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_COUNTS = 279
+TAG_PLANAR = 284
+TAG_PREDICTOR = 317
+TAG_TILE_WIDTH = 322
+TAG_TILE_LENGTH = 323
+TAG_TILE_OFFSETS = 324
+TAG_TILE_COUNTS = 325
+TAG_SAMPLE_FORMAT = 339
+TAG_PIXEL_SCALE = 33550
+TAG_TIEPOINT = 33922
+TAG_NODATA = 42113
+
+COMPRESSION_NONE = 1
+COMPRESSION_LZW = 5
+COMPRESSION_DEFLATE = (8, 32946)
+
+
+class Raster(object):
+    """Een band als platte reeks waarden (rij 0 = noordzijde).
+
+    Attributes:
+        width, height: Afmetingen in pixels
+        values: array('d') met width * height waarden
+        nodata: NoData waarde (float) of None
+        pixel_scale, tiepoint: GeoTIFF georeferentie indien aanwezig
+    """
+
+    def __init__(self, width, height, values, nodata=None, pixel_scale=None, tiepoint=None):
+        self.width = width
+        self.height = height
+        self.values = values
+        self.nodata = nodata
+        self.pixel_scale = pixel_scale
+        self.tiepoint = tiepoint
+
+
+def lzw_decode(data):
+    """TIFF LZW (MSB-first codes, 'early change') uitpakken."""
+    data = bytearray(data) + bytearray(3)
+    total_bits = (len(data) - 3) * 8
+    result = bytearray()
+    table = [bytes(bytearray([i])) for i in range(256)] + [b'', b'']
+    width = 9
+    pos = 0
+    prev = None
+    while pos + width <= total_bits:
+        byte = pos >> 3
+        window = (data[byte] << 16) | (data[byte + 1] << 8) | data[byte + 2]
+        code = (window >> (24 - (pos & 7) - width)) & ((1 << width) - 1)
+        pos += width
+        if code == 257:
+            break
+        if code == 256:
+            del table[258:]
+            width = 9
+            prev = None
+            continue
+        if prev is None:
+            entry = table[code]
+        else:
+            entry = table[code] if code < len(table) else prev + prev[:1]
+            table.append(prev + entry[:1])
+        result += entry
+        prev = entry
+        if len(table) + 1 >= (1 << width) and width < 12:
+            width += 1
+    return bytes(result)
+
+
+def _decompress(chunk, compression):
+    if compression == COMPRESSION_NONE:
+        return chunk
+    if compression in COMPRESSION_DEFLATE:
+        return zlib.decompress(chunk)
+    if compression == COMPRESSION_LZW:
+        return lzw_decode(chunk)
+    raise ValueError("TIFF compressie {} wordt niet ondersteund".format(compression))
+
+
+def _read_ifd(data, endian, offset):
+    count = struct.unpack_from(endian + 'H', data, offset)[0]
+    tags = {}
+    for n in range(count):
+        tag, kind, length, value = struct.unpack_from(endian + 'HHI4s', data, offset + 2 + n * 12)
+        size = _TYPE_SIZES.get(kind, 1) * length
+        raw = value[:size] if size <= 4 else data[struct.unpack(endian + 'I', value)[0]:][:size]
+        if kind == 2:
+            tags[tag] = raw.rstrip(b'\0').decode('latin-1')
+        elif kind in (5, 10):
+            parts = struct.unpack(endian + ('I' if kind == 5 else 'i') * (2 * length), raw)
+            tags[tag] = [parts[i] / float(parts[i + 1] or 1) for i in range(0, len(parts), 2)]
+        elif kind in _TYPE_FORMATS:
+            tags[tag] = list(struct.unpack(endian + _TYPE_FORMATS[kind] * length, raw))
+        else:
+            tags[tag] = raw
+    return tags
+
+
+def _first(tags, tag, default=None):
+    value = tags.get(tag)
+    if value is None:
+        return default
+    return value[0] if isinstance(value, list) else value
+
+
+def _samples(chunk, typecode, swap):
+    values = array(typecode)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(chunk[:len(chunk) - len(chunk) % values.itemsize])
+    else:
+        values.fromstring(chunk[:len(chunk) - len(chunk) % values.itemsize])
+    if swap:
+        values.byteswap()
+    return values
+
+
+def read_geotiff(data):
+    """Lees de eerste band van een TIFF/GeoTIFF.
+
+    Args:
+        data: Het bestand als bytes
+
+    Returns:
+        Raster
+    """
+    data = bytes(data)
+    if data[:4] == b'II*\x00':
+        endian = '<'
+    elif data[:4] == b'MM\x00*':
+        endian = '>'
+    else:
+        raise ValueError("Geen (klassiek) TIFF bestand")
+    tags = _read_ifd(data, endian, struct.unpack_from(endian + 'I', data, 4)[0])
+    width, height = _first(tags, TAG_WIDTH), _first(tags, TAG_HEIGHT)
+    bits = _first(tags, TAG_BITS, 1)
+    samples = _first(tags, TAG_SAMPLES, 1)
+    fmt = _first(tags, TAG_SAMPLE_FORMAT, 1)
+    typecode = _SAMPLE_CODES.get((fmt, bits))
+    if typecode is None:
+        raise ValueError("TIFF samples ({}, {} bits) worden niet ondersteund".format(fmt, bits))
+    compression = _first(tags, TAG_COMPRESSION, COMPRESSION_NONE)
+    predictor = _first(tags, TAG_PREDICTOR, 1)
+    if predictor not in (1, 2):
+        raise ValueError("TIFF predictor {} wordt niet ondersteund".format(predictor))
+    if _first(tags, TAG_PLANAR, 1) != 1:
+        samples_per_chunk = 1
+    else:
+        samples_per_chunk = samples
+    swap = (endian == '<') != (sys.byteorder == 'little')
+
+    if TAG_TILE_OFFSETS in tags:
+        chunk_w, chunk_h = _first(tags, TAG_TILE_WIDTH), _first(tags, TAG_TILE_LENGTH)
+        offsets, counts = tags[TAG_TILE_OFFSETS], tags[TAG_TILE_COUNTS]
+    else:
+        chunk_w, chunk_h = width, min(_first(tags, TAG_ROWS_PER_STRIP, height), height)
+        offsets, counts = tags[TAG_STRIP_OFFSETS], tags[TAG_STRIP_COUNTS]
+    across = (width + chunk_w - 1) // chunk_w
+    down = (height + chunk_h - 1) // chunk_h
+
+    values = array('d', [0.0]) * (width * height)
+    for index in range(across * down):
+        chunk = _decompress(data[offsets[index]:offsets[index] + counts[index]], compression)
+        chunk_samples = _samples(chunk, typecode, swap)
+        row_len = chunk_w * samples_per_chunk
+        x0 = (index % across) * chunk_w
+        y0 = (index // across) * chunk_h
+        for r in range(min(chunk_h, height - y0)):
+            row = chunk_samples[r * row_len:(r + 1) * row_len]
+            if predictor == 2:
+                row = list(row)
+                for k in range(samples_per_chunk, len(row)):
+                    row[k] += row[k - samples_per_chunk]
+                # Sommen lopen over zoals in de integer samples van het bestand
+                mask, half = (1 << bits) - 1, 1 << (bits - 1)
+                if typecode in 'BHI':
+                    row = [v & mask for v in row]
+                else:
+                    row = [((v + half) & mask) - half for v in row]
+            count = min(chunk_w, width - x0)
+            start = (y0 + r) * width + x0
+            values[start:start + count] = array('d', row[0:count * samples_per_chunk:samples_per_chunk])
+
+    nodata = tags.get(TAG_NODATA)
+    if nodata is not None:
+        try:
+            nodata = float(nodata.strip())
+        except (ValueError, AttributeError):
+            nodata = None
+    return Raster(width, height, values, nodata, tags.get(TAG_PIXEL_SCALE), tags.get(TAG_TIEPOINT))
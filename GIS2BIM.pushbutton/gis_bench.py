@@ -0,0 +1,994 @@
+# -*- coding: utf-8 -*-
+"""
+GIS2BIM benchmarks - draait buiten Revit tegen de lokale stand-in server
+Gebruik: python gis_bench.py <benchmark> [opties]   (python gis_bench.py -h voor de lijst)
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    from urllib2 import urlopen
+except ImportError:
+    from urllib.request import urlopen
+
+import cityjson_parser
+from cityjson_parser import (decode_vertex_block, iter_buildings, iter_cityjson_pages, iter_cityjsonseq,
+                             parse_cityjson_vertices, transform_vertex_block, transform_vertices)
+from gis_standin import (StandinServer, cityjson_pages_handler, wms_handler, cityjson_header, iter_cityjson_features, locatieserver_handler,
+                         make_parcel_features, paged_geojson_handler, tile_handler, wcs_dem_handler, wfs_handler)
+from line_simplify import LineStats, simplify_features
+from gis_pipeline import iter_prepared_layers, prepare_layer
+from geocoder import AutoComplete, GeocodeCache, Geocoder
+from mesh_tools import (InstanceStats, LodSelector, MergeStats, MeshStats, group_identical_buildings,
+                        merge_buildings_by_tile, simplify_buildings)
+from ogcapi_client import PageStats, iter_ogcapi_features, iter_ogcapi_pages
+from tile_cache import TileCache
+from tile_fetcher import fetch_tiles, wmts_tile_url
+from wms_tiler import MosaicStats, WmsTilePlan, wms_getmap_tile_url, write_wms_mosaic
+from png_codec import decode_image
+import rd_transform
+from rd_transform import rd_point_to_wgs84, rd_to_wgs84, transform_rings, wgs84_to_rd
+from line_simplify import extract_polygon_rings
+from gis_fixtures import FixtureRecorder, FixtureSet, replay_handler
+from http_client import HttpClient, ValidatorStore
+from vector_cache import VectorCache, load_rings, write_rings
+from site_prefetch import PrefetchProgress, Site, prefetch_sites
+from span_tracer import Tracer
+from spatial_index import ClipStats, bbox_contains, bbox_intersects, clip_rings, feature_rings, ring_bounds
+from wfs_client import WfsStats, iter_wfs_features
+
+
+def http_fetch(url, timeout=60, cached=None):
+    response = urlopen(url, timeout=timeout)
+    try:
+        return response.read()
+    finally:
+        response.close()
+
+
+def bench_wmts(args):
+    side = int(args.tiles ** 0.5)
+    with StandinServer(latency=args.latency) as server:
+        server.add_route('/wmts', tile_handler(fail_every=args.fail_every))
+        urls = [wmts_tile_url(server.url + '/wmts', 'bench', 14, row, col)
+                for row in range(side) for col in range(side)]
+        print("WMTS: {} tiles, latency {:.0f} ms".format(len(urls), args.latency * 1000))
+        for workers in [int(w) for w in args.workers.split(',')]:
+            start = time.time()
+            payloads, stats = fetch_tiles(urls, http_fetch, max_workers=workers, backoff=0.01)
+            elapsed = time.time() - start
+            print("  workers={:<3} {:7.2f} s  ok={} fout={} retries={}".format(
+                workers, elapsed, stats.succeeded, stats.failed, stats.retries))
+
+
+def bench_cache(args):
+    side = int(args.tiles ** 0.5)
+    root = tempfile.mkdtemp(prefix='gis2bim_cache_')
+    try:
+        with StandinServer(latency=args.latency) as server:
+            server.add_route('/wmts', tile_handler())
+            urls = [wmts_tile_url(server.url + '/wmts', 'bench', 14, row, col)
+                    for row in range(side) for col in range(side)]
+            print("Tile cache: {} tiles, latency {:.0f} ms".format(len(urls), args.latency * 1000))
+            for run in range(1, 3):
+                cache = TileCache(root)
+                start = time.time()
+                fetch_tiles(urls, cache.wrap(http_fetch), max_workers=args.workers)
+                cache.flush()
+                stats = cache.stats()
+                print("  run {}: {:7.2f} s  hits={} misses={} requests={}".format(
+                    run, time.time() - start, stats['hits'], stats['misses'], server.request_count))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_ogcapi(args):
+    with StandinServer(latency=args.latency) as server:
+        server.add_route('/ogc/collections/', paged_geojson_handler(lambda: server.url, total=args.features))
+        fetch_text = lambda url: http_fetch(url).decode('utf-8')
+        bbox = (99000, 424000, 100000, 425000)
+        print("OGC API: {} features, page size {}, latency {:.0f} ms".format(
+            args.features, args.page_size, args.latency * 1000))
+        stats = PageStats()
+        start = time.time()
+        first = None
+        count = 0
+        for _ in iter_ogcapi_features(server.url + '/ogc', 'pand', bbox, fetch_text,
+                                      page_size=args.page_size, max_features=args.max_features, stats=stats):
+            if first is None:
+                first = time.time() - start
+            count += 1
+        print("  eerste feature na {:.3f} s, totaal {:.2f} s".format(first or 0.0, time.time() - start))
+        print("  " + stats.summary())
+        for i, (n, seconds, size) in enumerate(stats.pages):
+            print("    pagina {:>3}: {:>5} features {:6.3f} s {:8.0f} kB".format(i + 1, n, seconds, size / 1024.0))
+
+
+def bench_wfs(args):
+    with StandinServer(latency=args.latency) as server:
+        server.add_route('/wfs', wfs_handler(server_cap=args.server_cap, report_matched=not args.no_matched))
+        fetch_text = lambda url: http_fetch(url).decode('utf-8')
+        half = args.bbox / 2.0
+        bbox = (100000 - half, 425000 - half, 100000 + half, 425000 + half)
+        print("WFS: bbox {:.0f} m, page size {}, tile limiet {}, server cap {}".format(
+            args.bbox, args.page_size, args.tile_max, args.server_cap))
+        stats = WfsStats()
+        start = time.time()
+        count = sum(1 for _ in iter_wfs_features(server.url + '/wfs', 'bag:pand', bbox, fetch_text,
+                                                 page_size=args.page_size, tile_max_features=args.tile_max,
+                                                 stats=stats))
+        print("  {} unieke features in {:.2f} s".format(count, time.time() - start))
+        print("  " + stats.summary())
+
+
+def _measure(func):
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+    if tracemalloc:
+        tracemalloc.start()
+    start = time.time()
+    result = func()
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1] if tracemalloc else 0
+    if tracemalloc:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_cityjson(args):
+    root = tempfile.mkdtemp(prefix='gis2bim_cityjson_')
+    try:
+        seq_path = os.path.join(root, 'bench.city.jsonl')
+        page_path = os.path.join(root, 'bench.json')
+        features = list(iter_cityjson_features(args.buildings))
+        with open(seq_path, 'w') as f:
+            f.write(json.dumps(cityjson_header()) + '\n')
+            for feature in features:
+                f.write(json.dumps(feature) + '\n')
+        header = cityjson_header()
+        with open(page_path, 'w') as f:
+            json.dump({'metadata': {'transform': header['transform']}, 'features': features}, f)
+        del features
+        print("CityJSON: {} gebouwen ({:.1f} MB als een response)".format(
+            args.buildings, os.path.getsize(page_path) / 1048576.0))
+
+        def whole():
+            with open(page_path) as f:
+                page = json.load(f)
+            return sum(1 for _ in iter_buildings(iter_cityjson_pages([page]), 99500.0, 424500.0))
+
+        def streamed():
+            with open(seq_path) as f:
+                return sum(1 for _ in iter_buildings(iter_cityjsonseq(f), 99500.0, 424500.0))
+
+        for name, func in [('json.load geheel', whole), ('CityJSONSeq stream', streamed)]:
+            count, elapsed, peak = _measure(func)
+            print("  {:<20} {:>6} gebouwen {:7.2f} s  piek {:8.0f} kB".format(name, count, elapsed, peak / 1024.0))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_vertices(args):
+    root = tempfile.mkdtemp(prefix='gis2bim_vertices_')
+    try:
+        path = os.path.join(root, 'vertices.city.json')
+        n = args.vertices
+        if args.strings:
+            raw = ["{} {} {}".format(i % 100000, (i * 7) % 100000, (i * 13) % 20000) for i in range(n)]
+        else:
+            raw = [[i % 100000, (i * 7) % 100000, (i * 13) % 20000] for i in range(n)]
+        with open(path, 'w') as f:
+            json.dump({'type': 'CityJSONFeature', 'CityObjects': {}, 'vertices': raw}, f)
+        del raw
+        with open(path) as f:
+            raw = json.load(f)['vertices']
+        header = cityjson_header()['transform']
+        scale, translate = header['scale'], header['translate']
+        backend = 'numpy' if cityjson_parser.np is not None else "array('d')"
+        print("Vertices: {} ({}), batch backend: {}".format(n, 'strings' if args.strings else 'arrays', backend))
+
+        start = time.time()
+        per_vertex = transform_vertices(parse_cityjson_vertices(raw), scale, translate, 99500.0, 424500.0)
+        t_old = time.time() - start
+
+        start = time.time()
+        batched = transform_vertex_block(decode_vertex_block(raw), scale, translate, 99500.0, 424500.0)
+        t_new = time.time() - start
+
+        check = max(abs(a - b) for i in range(0, n, max(1, n // 1000)) for a, b in zip(per_vertex[i], batched[i]))
+        print("  per vertex  {:7.3f} s".format(t_old))
+        print("  batch       {:7.3f} s  ({:.1f}x, max afwijking {:.2e})".format(t_new, t_old / max(t_new, 1e-9), check))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _mesh_volume(vertices, triangles):
+    """Volume van een gesloten mesh (divergentie stelling), ter controle."""
+    volume = 0.0
+    for a, b, c in triangles:
+        (x1, y1, z1), (x2, y2, z2), (x3, y3, z3) = vertices[a], vertices[b], vertices[c]
+        volume += x1 * (y2 * z3 - y3 * z2) - x2 * (y1 * z3 - y3 * z1) + x3 * (y1 * z2 - y2 * z1)
+    return volume / 6.0
+
+
+def bench_lod(args):
+    if args.file:
+        print("LOD: opgenomen fixture {}".format(args.file))
+
+        def features():
+            with open(args.file) as f:
+                if args.file.endswith('.jsonl'):
+                    for item in iter_cityjsonseq(f):
+                        yield item
+                else:
+                    for item in iter_cityjson_pages([json.load(f)]):
+                        yield item
+    else:
+        print("LOD: {} synthetische gebouwen, {} stroken per gevel".format(args.buildings, args.segments))
+        header = cityjson_header()['transform']
+
+        def features():
+            for feature in iter_cityjson_features(args.buildings, segments=args.segments):
+                yield feature, header['scale'], header['translate']
+
+    configs = [
+        ('LOD 2.2 overal', None),
+        ('LOD keuze', LodSelector(args.radius, merge_planar=False)),
+        ('LOD keuze + vlakken', LodSelector(args.radius)),
+        ('LOD 2.2 + vlakken', LodSelector(args.radius, far_lods=('2.2',))),
+    ]
+    if args.cluster:
+        configs.append(('+ clustering {}m'.format(args.cluster), LodSelector(args.radius, cluster_size=args.cluster)))
+    for name, selector in configs:
+        stats = MeshStats()
+        start = time.time()
+        buildings = iter_buildings(features(), args.rd_x, args.rd_y, lod=selector or '2.2')
+        volume = 0.0
+        for building in simplify_buildings(buildings, selector or LodSelector(None), stats):
+            volume += _mesh_volume(building['vertices'], building['triangles'])
+        print("  {:<22} {:7.2f} s  {:>8} driehoeken  volume {:12.1f} m3  {}".format(
+            name, time.time() - start, stats.faces_out, volume, stats.summary()))
+
+
+def bench_lines(args):
+    if args.file:
+        with open(args.file) as f:
+            features = json.load(f).get('features', [])
+        print("Lijnen: {} features uit {}".format(len(features), args.file))
+    else:
+        features = make_parcel_features(args.grid, args.grid, points_per_edge=args.points, jitter=args.jitter)
+        print("Lijnen: {}x{} percelen, {} punten per rand, ruis {} m".format(
+            args.grid, args.grid, args.points, args.jitter))
+    for tolerance in [float(t) for t in args.tolerances.split(',')]:
+        stats = LineStats()
+        start = time.time()
+        for _ in simplify_features(features, tolerance, stats):
+            pass
+        print("  tolerantie {:<6} {:7.3f} s  {}".format(tolerance, time.time() - start, stats.summary()))
+
+
+def bench_execute(args):
+    with StandinServer(latency=args.latency) as server:
+        server.add_route('/wmts', tile_handler())
+        server.add_route('/wfs', wfs_handler())
+        layers = []
+        for i in range(args.layers):
+            if i % 2:
+                layers.append(('wfs{}'.format(i), {'name': 'WFS {}'.format(i), 'type': 'wfs',
+                                                   'url': server.url + '/wfs', 'layer': 'bench'}))
+            else:
+                layers.append(('wmts{}'.format(i), {'name': 'WMTS {}'.format(i), 'type': 'wmts', 'zoom': 14,
+                                                    'url': server.url + '/wmts', 'layer': 'bench{}'.format(i)}))
+        print("Execute: {} lagen, latency {:.0f} ms, {:.2f} s Revit werk per laag (gesimuleerd)".format(
+            len(layers), args.latency * 1000, args.create))
+
+        def prepare(key, layer):
+            return prepare_layer(key, layer, 100000.0, 425000.0, args.bbox, http_fetch, lambda u: http_fetch(u).decode('utf-8'))
+
+        start = time.time()
+        for key, layer in layers:
+            prepared = prepare(key, layer)
+            time.sleep(args.create)
+        sequential = time.time() - start
+        print("  sequentieel   {:7.2f} s".format(sequential))
+
+        start = time.time()
+        slowest = 0.0
+        for index, prepared in iter_prepared_layers(layers, prepare, args.workers):
+            slowest = max(slowest, prepared.seconds)
+            time.sleep(args.create)
+        overlapped = time.time() - start
+        print("  overlapt      {:7.2f} s  ({:.1f}x, langste download {:.2f} s)".format(
+            overlapped, sequential / max(overlapped, 1e-9), slowest))
+
+
+def bench_geocode(args):
+    root = tempfile.mkdtemp(prefix='gis2bim_geocode_')
+    addresses = ["Burgemeester de Raadtsingel {}, Dordrecht".format(n) for n in range(1, args.addresses + 1)]
+    try:
+        with StandinServer(latency=args.latency) as server:
+            server.add_route('/locatieserver', locatieserver_handler())
+            base_url = server.url + '/locatieserver'
+            fetch = lambda url: http_fetch(url).decode('utf-8')
+            print("Geocode: {} adressen, latency {:.0f} ms".format(len(addresses), args.latency * 1000))
+            for run in range(1, 3):
+                geocoder = Geocoder(fetch, GeocodeCache(os.path.join(root, 'geocode.json')), base_url=base_url)
+                before = server.request_count
+                start = time.time()
+                for address in addresses:
+                    geocoder.search(address.upper() if run == 2 else address)
+                print("  run {}: {:7.3f} s  requests={}  cache hits={}".format(
+                    run, time.time() - start, server.request_count - before, geocoder.cache.hits))
+
+            geocoder = Geocoder(fetch, base_url=base_url)
+            done = []
+            autocomplete = AutoComplete(geocoder, lambda text, results: done.append(text), delay=args.debounce)
+            before = server.request_count
+            text = addresses[0]
+            for i in range(1, len(text) + 1):
+                autocomplete.update(text[:i])
+                time.sleep(args.typing)
+            time.sleep(args.debounce + args.latency + 0.2)
+            autocomplete.close()
+            print("  typen ({} tekens, {:.0f} ms/teken, debounce {:.0f} ms): {} requests, {} afgebroken, laatste: {}".format(
+                len(text), args.typing * 1000, args.debounce * 1000, server.request_count - before,
+                autocomplete.cancelled, done[-1] if done else '-'))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_wms(args):
+    root = tempfile.mkdtemp(prefix='gis2bim_wms_')
+    try:
+        with StandinServer(latency=args.latency) as server:
+            server.add_route('/wms', wms_handler(max_px=args.server_max))
+            base_url = server.url + '/wms'
+            print("WMS: resolutie {:.2f} m/px, server limiet {} px, latency {:.0f} ms".format(
+                args.resolution, args.server_max, args.latency * 1000))
+            for size in [float(s) for s in args.sizes.split(',')]:
+                bbox = (100000.0 - size / 2, 425000.0 - size / 2, 100000.0 + size / 2, 425000.0 + size / 2)
+                single = WmsTilePlan(bbox, args.resolution, tile_px=10 ** 9, max_px=args.server_max)
+
+                def fetch_single():
+                    data = http_fetch(wms_getmap_tile_url(base_url, 'bench', single.bbox, single.width, single.height))
+                    return decode_image(data)[0]
+                _, single_time, single_peak = _measure(fetch_single)
+
+                plan = WmsTilePlan(bbox, args.resolution, args.tile_px, args.max_px)
+                stats = MosaicStats()
+                path = os.path.join(root, 'wms_{:.0f}.png'.format(size))
+                _, tiled_time, tiled_peak = _measure(
+                    lambda: write_wms_mosaic(path, plan, base_url, 'bench', http_fetch, max_workers=args.workers, stats=stats))
+                print("  {:5.0f} m  een GetMap: {:5d} px {:.2f} m/px {:6.2f} s {:7.1f} MB | tiles: {:5d} px {:.2f} m/px {:6.2f} s {:7.1f} MB ({})".format(
+                    size, single.width, single.resolution, single_time, single_peak / 1e6,
+                    plan.width, plan.resolution, tiled_time, tiled_peak / 1e6, stats.summary()))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_crs(args):
+    # Nauwkeurigheid: heen en terug over een raster dat Nederland dekt (en pyproj als referentie)
+    grid = [(x, y) for x in range(13000, 280001, args.step) for y in range(306000, 620001, args.step)]
+    back = wgs84_to_rd(rd_to_wgs84(grid))
+    errors = sorted(((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5 for a, b in zip(grid, back))
+    print("RD <-> WGS84: {} punten, heen en terug max {:.3f} m, p95 {:.3f} m".format(
+        len(grid), errors[-1], errors[int(len(errors) * 0.95)]))
+    try:
+        from pyproj import Transformer
+    except ImportError:
+        Transformer = None
+    if Transformer is not None:
+        transformer = Transformer.from_crs('EPSG:28992', 'EPSG:4326', always_xy=True)
+        ref = [transformer.transform(x, y) for x, y in grid]
+        approx = rd_to_wgs84(grid)
+        worst = max(max(abs(a[0] - r[0]) * 68000.0, abs(a[1] - r[1]) * 111000.0) for a, r in zip(approx, ref))
+        print("  t.o.v. pyproj: max ~{:.2f} m".format(worst))
+
+    # Doorvoer: per punt, batch (lists) en NumPy array; ringen van extract_polygon_rings
+    features = make_parcel_features(args.parcels, args.parcels, points_per_edge=args.points)
+    rings = [ring for f in features for ring in extract_polygon_rings(f['geometry'])]
+    points = [p for ring in rings for p in ring]
+    print("Doorvoer: {} punten in {} ringen".format(len(points), len(rings)))
+    start = time.time()
+    [rd_point_to_wgs84(x, y) for x, y in points]
+    per_point = time.time() - start
+    print("  per punt       {:7.3f} s  {:10.0f} punten/s".format(per_point, len(points) / max(per_point, 1e-9)))
+    start = time.time()
+    transform_rings(rings, rd_to_wgs84)
+    batch = time.time() - start
+    print("  ringen batch   {:7.3f} s  {:10.0f} punten/s".format(batch, len(points) / max(batch, 1e-9)))
+    if rd_transform.np is not None:
+        block = rd_transform.np.array(points, dtype=float)
+        start = time.time()
+        rd_to_wgs84(block)
+        arrays = time.time() - start
+        print("  NumPy array    {:7.3f} s  {:10.0f} punten/s".format(arrays, len(points) / max(arrays, 1e-9)))
+
+
+# Maximaal aantal kinderen per knoop van de STR-tree in de index bench
+STR_NODE_CAPACITY = 16
+
+
+class StrTree(object):
+    """Statische R-tree over (bbox, item) paren, gebouwd met STR packing.
+
+    Args:
+        entries: Iterable van (bbox, item), bbox = (minx, miny, maxx, maxy)
+        node_capacity: Maximaal aantal kinderen per knoop
+    """
+
+    def __init__(self, entries, node_capacity=STR_NODE_CAPACITY):
+        self.node_capacity = max(2, node_capacity)
+        self.items = []
+        self.bounds = []
+        level = []
+        for bbox, item in entries:
+            level.append((tuple(bbox), len(self.items)))
+            self.items.append(item)
+            self.bounds.append(tuple(bbox))
+        self.size = len(level)
+        # Elk niveau: list van (bbox, kinderen); bladeren verwijzen naar item indexen
+        self.levels = []
+        while True:
+            level = self._pack(level)
+            self.levels.append(level)
+            if len(level) <= 1:
+                break
+            level = [(node[0], i) for i, node in enumerate(level)]
+        self.root = self.levels[-1][0] if self.levels[-1] else None
+
+    def _pack(self, entries):
+        capacity = self.node_capacity
+        if not entries:
+            return []
+        entries = sorted(entries, key=lambda e: e[0][0] + e[0][2])
+        node_count = int(math.ceil(len(entries) / float(capacity)))
+        slice_size = int(math.ceil(math.sqrt(node_count))) * capacity
+        nodes = []
+        for s in range(0, len(entries), slice_size):
+            strip = sorted(entries[s:s + slice_size], key=lambda e: e[0][1] + e[0][3])
+            for n in range(0, len(strip), capacity):
+                group = strip[n:n + capacity]
+                bbox = (min(e[0][0] for e in group), min(e[0][1] for e in group),
+                        max(e[0][2] for e in group), max(e[0][3] for e in group))
+                nodes.append((bbox, [e[1] for e in group]))
+        return nodes
+
+    def __len__(self):
+        return self.size
+
+    def query(self, bbox):
+        """Items waarvan de bbox de gegeven bbox raakt (volgorde niet gegarandeerd)."""
+        if self.root is None or not bbox_intersects(self.root[0], bbox):
+            return []
+        result = []
+        stack = [(len(self.levels) - 1, self.root)]
+        while stack:
+            depth, (_, children) = stack.pop()
+            if depth == 0:
+                result.extend(self.items[i] for i in children if bbox_intersects(self.bounds[i], bbox))
+                continue
+            below = self.levels[depth - 1]
+            for i in children:
+                child = below[i]
+                if bbox_intersects(child[0], bbox):
+                    if depth - 1 == 0 and bbox_contains(bbox, child[0]):
+                        result.extend(self.items[j] for j in child[1])
+                    else:
+                        stack.append((depth - 1, child))
+        return result
+
+
+def bench_index(args):
+    import random
+    features = make_parcel_features(args.grid, args.grid, points_per_edge=args.points)
+    rings = [ring for f in features for ring in extract_polygon_rings(f['geometry'])]
+    # Tweede pagina/laag met een deel van dezelfde geometrie
+    rings += rings[:len(rings) * args.duplicates // 100]
+    segments = sum(len(r) - 1 for r in rings)
+    extent = args.grid * 25.0
+    site = (99000.0 + extent * 0.25, 424000.0 + extent * 0.25, 99000.0 + extent * 0.75, 424000.0 + extent * 0.75)
+    print("Index: {} ringen, {} segmenten, site {:.0f} m".format(len(rings), segments, extent / 2))
+
+    start = time.time()
+    bounds = [ring_bounds(r) for r in rings]
+    tree = StrTree(zip(bounds, range(len(rings))))
+    print("  bouwen         {:7.3f} s".format(time.time() - start))
+    rng = random.Random(1)
+    queries = []
+    for _ in range(args.queries):
+        x, y = 99000.0 + rng.uniform(0, extent), 424000.0 + rng.uniform(0, extent)
+        queries.append((x, y, x + args.window, y + args.window))
+    start = time.time()
+    linear = [sum(1 for b in bounds if bbox_intersects(b, q)) for q in queries]
+    linear_time = time.time() - start
+    start = time.time()
+    indexed = [len(tree.query(q)) for q in queries]
+    tree_time = time.time() - start
+    print("  {} queries   lineair {:7.3f} s | STR-tree {:7.3f} s ({:.0f}x){}".format(
+        len(queries), linear_time, tree_time, linear_time / max(tree_time, 1e-9),
+        "" if linear == indexed else "  VERSCHIL"))
+
+    stats = ClipStats()
+    start = time.time()
+    clipped = clip_rings(rings, site, stats=stats)
+    print("  clip + dedup   {:7.3f} s  {} -> {} segmenten, {}".format(
+        time.time() - start, segments, sum(len(r) - 1 for r in clipped), stats.summary()))
+
+
+def bench_instancing(args):
+    header = cityjson_header()['transform']
+    features = [(f, header['scale'], header['translate'])
+                for f in iter_cityjson_features(args.buildings, segments=args.segments, variants=args.variants)]
+    buildings = list(iter_buildings(features, args.rd_x, args.rd_y))
+    print("Instancing: {} gebouwen, {} varianten".format(len(buildings), args.variants))
+    for precision in [float(p) for p in args.precisions.split(',')]:
+        stats = InstanceStats()
+        groups = group_identical_buildings(buildings, precision, stats)
+        largest = max(len(g.members) for g in groups) if groups else 0
+        print("  precisie {:<6} {}  grootste groep {}".format(precision, stats.summary(), largest))
+
+
+def bench_merge(args):
+    header = cityjson_header()['transform']
+    features = [(f, header['scale'], header['translate'])
+                for f in iter_cityjson_features(args.buildings, per_row=args.per_row, segments=args.segments)]
+    buildings = list(iter_buildings(features, args.rd_x, args.rd_y))
+    faces = sum(len(b.get('triangles') or []) for b in buildings)
+    print("Samenvoegen per tegel: {} gebouwen, {} driehoeken".format(len(buildings), faces))
+    stats = InstanceStats()
+    groups = group_identical_buildings(buildings, stats=stats)
+    print("  per gebouw     {:5} DirectShapes, {:5} TessellatedShapeBuilders".format(len(buildings), len(buildings)))
+    print("  instancing     {:5} DirectShapes, {:5} TessellatedShapeBuilders".format(len(buildings), stats.shapes))
+    for size in [float(t) for t in args.tiles.split(',')]:
+        stats = MergeStats()
+        tiles = merge_buildings_by_tile(buildings, size, (args.rd_x, args.rd_y), stats)
+        covered = sum(len(t.ranges) for t in tiles)
+        assert covered == len(buildings) and stats.faces == faces
+        print("  tegel {:>5.0f} m {:5} DirectShapes, {:5} TessellatedShapeBuilders  {}".format(
+            size, len(tiles), len(tiles), stats.summary()))
+
+
+def record_synthetic_fixtures(root, rd_x, rd_y, bbox_size):
+    """Neem een fixture set op van de synthetische stand-in (een laag per service type)."""
+    with StandinServer() as server:
+        url = server.url
+        server.add_route('/wmts', tile_handler())
+        server.add_route('/wms', wms_handler())
+        server.add_route('/wfs', wfs_handler())
+        server.add_route('/ogc', paged_geojson_handler(lambda: url, total=2000))
+        server.add_route('/3dbag', cityjson_pages_handler(lambda: url))
+        layers = {
+            'wmts': {'name': 'WMTS', 'type': 'wmts', 'url': url + '/wmts', 'layer': 'bench', 'zoom': 14},
+            'wms': {'name': 'WMS', 'type': 'wms', 'url': url + '/wms', 'layer': 'bench'},
+            'wfs': {'name': 'WFS', 'type': 'wfs', 'url': url + '/wfs', 'layer': 'bench'},
+            'ogcapi': {'name': 'OGC API', 'type': 'ogcapi', 'url': url + '/ogc', 'collection': 'bench'},
+            'cityjson': {'name': '3D BAG', 'type': '3dbag_cityjson', 'url': url + '/3dbag'},
+        }
+        recorder = FixtureRecorder(root, rd_x, rd_y, bbox_size)
+        fetch_text = recorder.wrap_text(lambda u: http_fetch(u).decode('utf-8'))
+        for key, layer in sorted(layers.items()):
+            prepared = prepare_layer(key, layer, rd_x, rd_y, bbox_size, recorder.wrap_bytes(http_fetch), fetch_text,
+                                     out_dir=root)
+            if prepared.error:
+                raise Exception("{}: {}".format(key, prepared.error))
+        recorder.save(layers)
+
+
+def bench_replay(args):
+    root = None
+    fixture_dir = args.fixtures
+    if not fixture_dir:
+        root = fixture_dir = tempfile.mkdtemp(prefix='gis2bim_fixtures_')
+        record_synthetic_fixtures(fixture_dir, 99250.0, 424250.0, args.bbox)
+    out_dir = tempfile.mkdtemp(prefix='gis2bim_replay_')
+    try:
+        fixtures = FixtureSet(fixture_dir)
+        site = fixtures.site
+        print("Replay: {} responses ({:.1f} MB) uit {}, latency {:.0f} ms, bandbreedte {}".format(
+            len(fixtures.entries), fixtures.total_bytes / 1048576.0, fixture_dir, args.latency * 1000,
+            "{:.1f} MB/s".format(args.bandwidth / 1e6) if args.bandwidth else "onbeperkt"))
+        server = StandinServer(latency=args.latency, bandwidth=args.bandwidth)
+        server.add_route('/', replay_handler(fixtures, lambda: server.url))
+        with server:
+            layers = fixtures.replay_layers(server.url)
+            for key in sorted(layers):
+                layer = layers[key]
+                times = []
+                error = None
+                for _ in range(args.repeat):
+                    tracer = Tracer()
+                    prepared = prepare_layer(key, layer, site['rd_x'], site['rd_y'], site['bbox_size'], http_fetch,
+                                             lambda u: http_fetch(u).decode('utf-8'), out_dir=out_dir, tracer=tracer)
+                    error = error or prepared.error
+                    times.append(prepared.seconds)
+                totals = {}
+                for row in tracer.summary():
+                    for name in ('requests', 'bytes'):
+                        totals[name] = totals.get(name, 0) + row['counts'].get(name, 0)
+                times.sort()
+                print("  {:<12} {:<15} mediaan {:6.2f} s  min {:6.2f}  max {:6.2f}  {:4} requests {:8.0f} kB{}".format(
+                    key, layer['type'], times[len(times) // 2], times[0], times[-1], totals.get('requests', 0),
+                    totals.get('bytes', 0) / 1024.0, "  FOUT: {}".format(error) if error else ""))
+        if fixtures.misses:
+            print("  {} requests niet in de fixtures, bijv. {}".format(len(fixtures.misses), fixtures.misses[0]))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        if root:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_http(args):
+    side = int(args.tiles ** 0.5)
+    server = StandinServer(latency=args.latency, bandwidth=args.bandwidth, compress=True, etags=True,
+                           connect_latency=args.connect_latency)
+    server.add_route('/wmts', tile_handler())
+    server.add_route('/ogc/collections/', paged_geojson_handler(lambda: server.url, total=args.features))
+    server.add_route('/3dbag/collections/', cityjson_pages_handler(lambda: server.url, total=args.buildings))
+    server.add_route('/locatieserver', locatieserver_handler())
+    with server:
+        tile_urls = [wmts_tile_url(server.url + '/wmts', 'bench', 14, row, col)
+                     for row in range(side) for col in range(side)]
+        bbox = (99000, 424000, 100000, 425000)
+
+        def workload(fetch_bytes):
+            fetch_text = lambda url: fetch_bytes(url).decode('utf-8')
+            fetch_tiles(tile_urls, fetch_bytes, max_workers=args.workers)
+            for _ in iter_ogcapi_features(server.url + '/ogc', 'pand', bbox, fetch_text, page_size=args.page_size):
+                pass
+            for _ in iter_ogcapi_pages(server.url + '/3dbag/collections/pand/items?limit=50', fetch_text):
+                pass
+            geocoder = Geocoder(fetch_text, base_url=server.url + '/locatieserver')
+            for n in range(1, args.addresses + 1):
+                geocoder.search("Burgemeester de Raadtsingel {}, Dordrecht".format(n))
+
+        print("HTTP: {} tiles, {} features, {} gebouwen, {} adressen; latency {:.0f} ms, handshake {:.0f} ms, {}".format(
+            len(tile_urls), args.features, args.buildings, args.addresses, args.latency * 1000,
+            args.connect_latency * 1000, "{:.1f} MB/s".format(args.bandwidth / 1e6) if args.bandwidth else "onbeperkt"))
+        client = HttpClient(validators=ValidatorStore())
+        # TTL 0: bij de tweede run is alles verlopen en wordt de oude kopie gerevalideerd
+        root = tempfile.mkdtemp(prefix='gis2bim_http_')
+        cache = TileCache(root, ttl=0)
+        runs = [("urlopen", http_fetch), ("HttpClient koud", cache.wrap(client.fetch_bytes)),
+                ("HttpClient verlopen", cache.wrap(client.fetch_bytes))]
+        for name, fetch in runs:
+            before = (server.request_count, server.connection_count, server.sent_bytes, server.not_modified_count)
+            start = time.time()
+            workload(fetch)
+            elapsed = time.time() - start
+            print("  {:<19} {:7.2f} s  {:4} requests  {:4} verbindingen  {:8.0f} kB verstuurd  {:4} x 304".format(
+                name, elapsed, server.request_count - before[0], server.connection_count - before[1],
+                (server.sent_bytes - before[2]) / 1024.0, server.not_modified_count - before[3]))
+        print("  " + client.stats.summary())
+        client.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_vectorcache(args):
+    root = tempfile.mkdtemp(prefix='gis2bim_vectors_')
+    try:
+        features = make_parcel_features(args.grid, args.grid, points_per_edge=args.points)
+        text = json.dumps({'type': 'FeatureCollection', 'features': features})
+        path = os.path.join(root, 'percelen.g2bv')
+        print("Vector cache: {} percelen, GeoJSON {:.1f} MB".format(len(features), len(text) / 1048576.0))
+        rings = feature_rings(json.loads(text)['features'])
+        size = write_rings(path, rings, {'key': 'bench', 'bbox': [0, 0, 1, 1], 'fetched': time.time()})
+        points = sum(len(r) for r in rings)
+
+        def parse():
+            return sum(len(r) for r in feature_rings(json.loads(text)['features']))
+
+        def load():
+            with load_rings(path) as ring_set:
+                return sum(len(r) for r in ring_set)
+
+        for name, func in (("json.loads + ringen", parse), ("mmap .g2bv", load)):
+            times = []
+            for _ in range(args.repeat):
+                start = time.time()
+                count = func()
+                times.append(time.time() - start)
+            assert count == points
+            print("  {:<20} {:7.3f} s  {} punten".format(name, min(times), count))
+        print("  bestand {:.1f} MB ({:.0f}% van de GeoJSON)".format(size / 1048576.0, 100.0 * size / len(text)))
+
+        with StandinServer(latency=args.latency) as server:
+            server.add_route('/ogc/collections/', paged_geojson_handler(lambda: server.url, total=args.features))
+            layer = {'name': 'Bench', 'type': 'ogcapi', 'url': server.url + '/ogc', 'collection': 'pand'}
+            vector_cache = VectorCache(os.path.join(root, 'cache'))
+            fetch_text = lambda url: http_fetch(url).decode('utf-8')
+            print("  OGC API laag, {} features, latency {:.0f} ms:".format(args.features, args.latency * 1000))
+            for run in ("koud", "warm", "kleiner"):
+                size = 400.0 if run == "kleiner" else 1000.0
+                before = server.request_count
+                prepared = prepare_layer('bench', layer, 99500.0, 424500.0, size, http_fetch, fetch_text,
+                                         vector_cache=vector_cache)
+                print("    {:<8} {:7.3f} s  {:3} requests  {} lijnen{}".format(
+                    run, prepared.seconds, server.request_count - before, len(prepared.data.get('polylines', [])),
+                    "  FOUT: {}".format(prepared.error) if prepared.error else ""))
+            print("    cache: {}".format(vector_cache.stats()))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_prefetch(args):
+    root = tempfile.mkdtemp(prefix='gis2bim_prefetch_')
+    try:
+        server = StandinServer(latency=args.latency)
+        url = server.url
+        server.add_route('/wmts', tile_handler())
+        server.add_route('/wms', wms_handler())
+        server.add_route('/ogc/collections/', paged_geojson_handler(lambda: url, total=2000))
+        server.add_route('/3dbag/collections/', cityjson_pages_handler(lambda: url, total=200))
+        server.add_route('/locatieserver', locatieserver_handler())
+        layers = {
+            'wmts': {'name': 'WMTS', 'type': 'wmts', 'url': url + '/wmts', 'layer': 'bench', 'zoom': 14},
+            'wms': {'name': 'WMS', 'type': 'wms', 'url': url + '/wms', 'layer': 'bench', 'resolution': 0.5},
+            'ogcapi': {'name': 'OGC API', 'type': 'ogcapi', 'url': url + '/ogc', 'collection': 'bench'},
+            'cityjson': {'name': '3D BAG', 'type': '3dbag_cityjson', 'url': url + '/3dbag'},
+        }
+        sizes = dict((key, args.bbox) for key in layers)
+        texts = ["Projectstraat {}, Dordrecht".format(n) for n in range(1, args.addresses + 1)]
+        texts += ["{} {}".format(99250 + 300 * n, 424250) for n in range(args.coords)]
+        progress_file = os.path.join(root, 'sites.txt.progress.jsonl')
+        with server:
+            geocoder = Geocoder(lambda u: http_fetch(u).decode('utf-8'), GeocodeCache(os.path.join(root, 'geo.json')),
+                                base_url=url + '/locatieserver')
+            cache, vector_cache = TileCache(os.path.join(root, 'tiles')), VectorCache(os.path.join(root, 'vectors'))
+            print("Prefetch: {} locaties x {} lagen, bbox {:.0f} m, {} workers, latency {:.0f} ms".format(
+                len(texts), len(layers), args.bbox, args.workers, args.latency * 1000))
+            calls = [0]
+
+            def failing_fetch(u):
+                calls[0] += 1
+                if calls[0] > args.fail_after:
+                    raise IOError("verbinding weg")
+                return http_fetch(u)
+
+            runs = (("onderbroken", failing_fetch), ("hervat", http_fetch), ("opnieuw", http_fetch))
+            for name, fetch in runs:
+                sites = [Site(text, dict(sizes)) for text in texts]
+                for site in sites:
+                    site.rd = site.rd or _rd_from_text(site.text)
+                before = server.request_count
+                stats = prefetch_sites(sites, geocoder, cache, vector_cache, PrefetchProgress(progress_file),
+                                       fetch, lambda u: fetch(u).decode('utf-8'), args.workers, layers=layers)
+                print("  {:<12} {:6.2f} s  {:4} requests  {}".format(
+                    name, stats.seconds, server.request_count - before, stats.summary()))
+
+            site_x, site_y = 99250.0, 424250.0
+            for name, tile_cache, vectors in (("zonder cache", None, None), ("na prefetch", cache, vector_cache)):
+                before = server.request_count
+                start = time.time()
+                for key in sorted(layers):
+                    prepared = prepare_layer(key, layers[key], site_x, site_y, args.bbox, http_fetch,
+                                             lambda u: http_fetch(u).decode('utf-8'), tile_cache, root,
+                                             vector_cache=vectors)
+                    if prepared.error:
+                        print("    {}: FOUT {}".format(key, prepared.error))
+                print("  import {:<13} {:6.2f} s  {:4} requests".format(
+                    name, time.time() - start, server.request_count - before))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _rd_from_text(text):
+    parts = text.split()
+    if len(parts) == 2 and all(p.replace('.', '').isdigit() for p in parts):
+        return float(parts[0]), float(parts[1])
+    return None
+
+
+def bench_terrain(args):
+    with StandinServer(latency=args.latency) as server:
+        server.add_route('/wcs', wcs_dem_handler())
+        layer = {'name': 'AHN', 'type': 'ahn_dtm', 'url': server.url + '/wcs', 'layer': 'dtm_05m',
+                 'resolution': args.resolution}
+        downloads = {}
+
+        def fetch(url):
+            # Een download; de TIN varianten werken op hetzelfde grid
+            if url not in downloads:
+                downloads[url] = http_fetch(url)
+            return downloads[url]
+
+        print("AHN maaiveld: {:.0f} m rond RD {:.0f}, {:.0f} op {:.2f} m".format(
+            args.bbox, args.rd_x, args.rd_y, args.resolution))
+        for budget in [int(b) for b in args.budgets.split(',')]:
+            for tolerance in [float(t) for t in args.tolerances.split(',')]:
+                config = dict(layer, tolerance=tolerance, max_triangles=budget)
+                t0 = time.time()
+                prepared = prepare_layer('ahn_dtm', config, args.rd_x, args.rd_y, args.bbox, fetch, None)
+                if prepared.error:
+                    raise Exception(prepared.error)
+                stats = prepared.stats['tin']
+                assert stats.triangles <= budget and (stats.budget_hit or stats.max_error <= tolerance)
+                print("  budget {:>7} tolerantie {:.2f} m: {} ({:.2f}s totaal)".format(
+                    budget, tolerance, stats.summary(), time.time() - t0))
+        size = sum(len(data) for data in downloads.values())
+        print("  GeoTIFF {:.0f} kB, vol grid {} driehoeken".format(size / 1024.0, stats.grid_triangles))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GIS2BIM benchmarks")
+    sub = parser.add_subparsers(dest='command')
+
+    p = sub.add_parser('wmts', help="Parallelle WMTS tile downloads")
+    p.add_argument('--tiles', type=int, default=64)
+    p.add_argument('--latency', type=float, default=0.05)
+    p.add_argument('--workers', default='1,4,8')
+    p.add_argument('--fail-every', type=int, default=0)
+    p.set_defaults(func=bench_wmts)
+
+    p = sub.add_parser('cache', help="Tile cache: koude vs warme run")
+    p.add_argument('--tiles', type=int, default=64)
+    p.add_argument('--latency', type=float, default=0.05)
+    p.add_argument('--workers', type=int, default=6)
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser('ogcapi', help="OGC API Features paginering")
+    p.add_argument('--features', type=int, default=2500)
+    p.add_argument('--page-size', type=int, default=1000)
+    p.add_argument('--max-features', type=int, default=None)
+    p.add_argument('--latency', type=float, default=0.05)
+    p.set_defaults(func=bench_ogcapi)
+
+    p = sub.add_parser('wfs', help="WFS STARTINDEX paginering en bbox opsplitsing")
+    p.add_argument('--bbox', type=float, default=1000.0)
+    p.add_argument('--page-size', type=int, default=1000)
+    p.add_argument('--tile-max', type=int, default=5000)
+    p.add_argument('--server-cap', type=int, default=1000)
+    p.add_argument('--no-matched', action='store_true')
+    p.add_argument('--latency', type=float, default=0.02)
+    p.set_defaults(func=bench_wfs)
+
+    p = sub.add_parser('cityjson', help="CityJSON geheugengebruik: geheel vs stream")
+    p.add_argument('--buildings', type=int, default=5000)
+    p.set_defaults(func=bench_cityjson)
+
+    p = sub.add_parser('vertices', help="Vertex decodering/transformatie: per vertex vs batch")
+    p.add_argument('--vertices', type=int, default=1000000)
+    p.add_argument('--strings', action='store_true', help="Vertices als \"x y z\" strings (3D BAG API)")
+    p.set_defaults(func=bench_vertices)
+
+    p = sub.add_parser('lod', help="3D BAG LOD keuze en mesh vereenvoudiging")
+    p.add_argument('--buildings', type=int, default=2000)
+    p.add_argument('--segments', type=int, default=4)
+    p.add_argument('--radius', type=float, default=150.0)
+    p.add_argument('--cluster', type=float, default=0.0)
+    p.add_argument('--file', help="Opgenomen CityJSONSeq (.jsonl) of items response (.json)")
+    p.add_argument('--rd-x', type=float, default=99300.0)
+    p.add_argument('--rd-y', type=float, default=424240.0)
+    p.set_defaults(func=bench_lod)
+
+    p = sub.add_parser('lines', help="Lijn vereenvoudiging voor detail lines")
+    p.add_argument('--grid', type=int, default=30)
+    p.add_argument('--points', type=int, default=20)
+    p.add_argument('--jitter', type=float, default=0.01)
+    p.add_argument('--tolerances', default='0,0.05,0.5')
+    p.add_argument('--file', help="Opgenomen GeoJSON FeatureCollection")
+    p.set_defaults(func=bench_lines)
+
+    p = sub.add_parser('execute', help="Lagen: sequentieel vs downloaden op de achtergrond")
+    p.add_argument('--layers', type=int, default=6)
+    p.add_argument('--bbox', type=float, default=500.0)
+    p.add_argument('--create', type=float, default=0.3)
+    p.add_argument('--workers', type=int, default=3)
+    p.add_argument('--latency', type=float, default=0.05)
+    p.set_defaults(func=bench_execute)
+
+    p = sub.add_parser('geocode', help="Geocoding cache en autocomplete debouncing")
+    p.add_argument('--addresses', type=int, default=20)
+    p.add_argument('--latency', type=float, default=0.1)
+    p.add_argument('--debounce', type=float, default=0.3)
+    p.add_argument('--typing', type=float, default=0.08)
+    p.set_defaults(func=bench_geocode)
+
+    p = sub.add_parser('wms', help="WMS: een GetMap vs getegelde mosaic op grondresolutie")
+    p.add_argument('--sizes', default='250,500,1000')
+    p.add_argument('--resolution', type=float, default=0.25)
+    p.add_argument('--tile-px', type=int, default=1024)
+    p.add_argument('--max-px', type=int, default=8192)
+    p.add_argument('--server-max', type=int, default=2048)
+    p.add_argument('--workers', type=int, default=4)
+    p.add_argument('--latency', type=float, default=0.05)
+    p.set_defaults(func=bench_wms)
+
+    p = sub.add_parser('crs', help="RD <-> WGS84: nauwkeurigheid en doorvoer")
+    p.add_argument('--step', type=int, default=5000)
+    p.add_argument('--parcels', type=int, default=40)
+    p.add_argument('--points', type=int, default=20)
+    p.set_defaults(func=bench_crs)
+
+    p = sub.add_parser('index', help="STR-tree: queries, clipping en ontdubbeling")
+    p.add_argument('--grid', type=int, default=80)
+    p.add_argument('--points', type=int, default=20)
+    p.add_argument('--duplicates', type=int, default=20, help="Percentage dubbele ringen")
+    p.add_argument('--queries', type=int, default=500)
+    p.add_argument('--window', type=float, default=100.0)
+    p.set_defaults(func=bench_index)
+
+    p = sub.add_parser('instancing', help="3D BAG vormen herkennen voor DirectShapeLibrary instanties")
+    p.add_argument('--buildings', type=int, default=2000)
+    p.add_argument('--variants', type=int, default=4)
+    p.add_argument('--segments', type=int, default=1)
+    p.add_argument('--precisions', default='0.001,0.01')
+    p.add_argument('--rd-x', type=float, default=100000.0)
+    p.add_argument('--rd-y', type=float, default=425000.0)
+    p.set_defaults(func=bench_instancing)
+
+    p = sub.add_parser('merge', help="3D BAG: een DirectShape per gebouw vs per tegel")
+    p.add_argument('--buildings', type=int, default=4000)
+    p.add_argument('--per-row', type=int, default=80, help="Gebouwen per rij (12 m uit elkaar)")
+    p.add_argument('--segments', type=int, default=1)
+    p.add_argument('--tiles', default='50,100,200')
+    p.add_argument('--rd-x', type=float, default=100000.0)
+    p.add_argument('--rd-y', type=float, default=425000.0)
+    p.set_defaults(func=bench_merge)
+
+    p = sub.add_parser('replay', help="Alle laagtypes end-to-end tegen opgenomen fixtures")
+    p.add_argument('--fixtures', help="Fixture map (gis_pipeline.py --record); standaard synthetisch opgenomen")
+    p.add_argument('--bbox', type=float, default=500.0, help="Gebied voor de synthetische fixtures")
+    p.add_argument('--latency', type=float, default=0.03)
+    p.add_argument('--bandwidth', type=float, default=0, help="Bytes/s per verbinding (0 = onbeperkt)")
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_replay)
+
+    p = sub.add_parser('http', help="Gedeelde HTTP client: keep-alive, gzip en revalidatie vs urlopen")
+    p.add_argument('--tiles', type=int, default=121)
+    p.add_argument('--features', type=int, default=5000)
+    p.add_argument('--page-size', type=int, default=1000)
+    p.add_argument('--buildings', type=int, default=500)
+    p.add_argument('--addresses', type=int, default=20)
+    p.add_argument('--workers', type=int, default=6)
+    p.add_argument('--latency', type=float, default=0.02, help="Seconden per request")
+    p.add_argument('--connect-latency', type=float, default=0.05, help="Seconden per nieuwe verbinding")
+    p.add_argument('--bandwidth', type=float, default=2e6, help="Bytes/s per verbinding (0 = onbeperkt)")
+    p.set_defaults(func=bench_http)
+
+    p = sub.add_parser('vectorcache', help="Geparste vectorlagen: GeoJSON parsen vs binaire cache via mmap")
+    p.add_argument('--grid', type=int, default=80, help="Percelen per zijde")
+    p.add_argument('--points', type=int, default=20, help="Punten per perceelgrens")
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--features', type=int, default=5000)
+    p.add_argument('--latency', type=float, default=0.05)
+    p.set_defaults(func=bench_vectorcache)
+
+    p = sub.add_parser('prefetch', help="Caches vullen voor een lijst locaties, met hervatten na een onderbreking")
+    p.add_argument('--addresses', type=int, default=3)
+    p.add_argument('--coords', type=int, default=3)
+    p.add_argument('--bbox', type=float, default=300.0)
+    p.add_argument('--workers', type=int, default=3)
+    p.add_argument('--latency', type=float, default=0.03)
+    p.add_argument('--fail-after', type=int, default=150, help="Requests voordat de eerste run 'wegvalt'")
+    p.set_defaults(func=bench_prefetch)
+
+    p = sub.add_parser('terrain', help="AHN maaiveld: adaptieve TIN vs vol hoogtegrid")
+    p.add_argument('--bbox', type=float, default=500.0)
+    p.add_argument('--resolution', type=float, default=1.0)
+    p.add_argument('--budgets', default='2000,20000,200000')
+    p.add_argument('--tolerances', default='0.05,0.1,0.25')
+    p.add_argument('--latency', type=float, default=0.0)
+    p.add_argument('--rd-x', type=float, default=100000.0)
+    p.add_argument('--rd-y', type=float, default=425000.0)
+    p.set_defaults(func=bench_terrain)
+
+    args = parser.parse_args(argv)
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        return 1
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
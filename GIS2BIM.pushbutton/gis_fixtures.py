@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures voor GIS2BIM - service responses opnemen en terugspelen
+De recorder wrapt de fetch functies van de pipeline en bewaart elke response
+in een fixture map (manifest.json + bodies/). De replay handler serveert die
+responses via de StandinServer (met latency en bandbreedte), zodat
+benchmarks op een vaste dataset herhaalbaar zijn. Absolute URLs in de
+opgenomen bodies (zoals OGC API 'next' links) worden naar de stand-in
+herschreven.
+
+Opnemen:  python gis_pipeline.py --rd X Y --layers ... --record fixtures/site
+Afspelen: python gis_bench.py replay --fixtures fixtures/site
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+
+MANIFEST_NAME = 'manifest.json'
+BODY_DIR = 'bodies'
+
+
+def fixture_key(url):
+    """Sleutel voor een URL: /host/pad?query met gesorteerde query parameters."""
+    parsed = urlparse(url)
+    key = "/{}{}".format(parsed.netloc, parsed.path) if parsed.netloc else parsed.path
+    if parsed.query:
+        key += "?" + "&".join(sorted(parsed.query.split("&")))
+    return key
+
+
+def rebase_url(url, server_url):
+    """https://host/pad?q -> {server_url}/host/pad?q (route in de replay server)."""
+    parsed = urlparse(url)
+    rebased = "{}/{}{}".format(server_url.rstrip('/'), parsed.netloc, parsed.path)
+    return rebased + ("?" + parsed.query if parsed.query else "")
+
+
+def guess_content_type(body):
+    if body[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if body[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if body[:1] in (b'{', b'['):
+        return 'application/json'
+    return 'application/octet-stream'
+
+
+class FixtureRecorder(object):
+    """Neemt responses op via gewrapte fetch functies (thread-safe).
+
+    Args:
+        root: Fixture map (wordt aangemaakt)
+        rd_x, rd_y, bbox_size: De opgenomen locatie, voor het manifest
+    """
+
+    def __init__(self, root, rd_x=None, rd_y=None, bbox_size=None):
+        self.root = root
+        self.site = {'rd_x': rd_x, 'rd_y': rd_y, 'bbox_size': bbox_size}
+        self.entries = {}
+        self._lock = threading.Lock()
+        body_dir = os.path.join(root, BODY_DIR)
+        if not os.path.exists(body_dir):
+            os.makedirs(body_dir)
+
+    def record(self, url, body):
+        key = fixture_key(url)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+        with open(os.path.join(self.root, BODY_DIR, name), 'wb') as f:
+            f.write(body)
+        with self._lock:
+            self.entries[key] = {'file': name, 'content_type': guess_content_type(body), 'size': len(body)}
+
+    def wrap_bytes(self, fetch_bytes):
+        def recording(url, **kwargs):
+            body = fetch_bytes(url, **kwargs)
+            self.record(url, body)
+            return body
+        return recording
+
+    def wrap_text(self, fetch_text):
+        def recording(url, **kwargs):
+            text = fetch_text(url, **kwargs)
+            self.record(url, text.encode('utf-8'))
+            return text
+        return recording
+
+    def save(self, layers):
+        """Schrijf het manifest met de opgenomen lagen (key -> laag configuratie)."""
+        manifest = {'created': time.time(), 'site': self.site, 'layers': layers, 'entries': self.entries}
+        with open(os.path.join(self.root, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        return manifest
+
+
+class FixtureSet(object):
+    """Een opgenomen fixture map."""
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        self.site = manifest.get('site', {})
+        self.layers = manifest.get('layers', {})
+        self.entries = manifest.get('entries', {})
+        self.hosts = sorted(set(key.split('/')[1] for key in self.entries if key.count('/') > 1))
+        self.misses = []
+
+    @property
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self.entries.values())
+
+    def get(self, key):
+        """(content_type, body) voor een fixture sleutel, of None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        with open(os.path.join(self.root, BODY_DIR, entry['file']), 'rb') as f:
+            return entry['content_type'], f.read()
+
+    def replay_layers(self, server_url):
+        """De opgenomen laag configuraties met URLs naar de replay server."""
+        layers = {}
+        for key, layer in self.layers.items():
+            layer = dict(layer)
+            layer['url'] = rebase_url(layer['url'], server_url)
+            layers[key] = layer
+        return layers
+
+
+def replay_handler(fixtures, base_url_func):
+    """Route handler ('/') die een FixtureSet terugspeelt.
+
+    Onbekende requests geven 404 en worden in fixtures.misses bijgehouden.
+
+    Args:
+        fixtures: FixtureSet
+        base_url_func: Functie die de server URL teruggeeft (voor het
+            herschrijven van absolute URLs in de bodies)
+    """
+    def handler(path):
+        found = fixtures.get(fixture_key(path))
+        if found is None:
+            fixtures.misses.append(path)
+            return 404, 'text/plain', b'not recorded'
+        content_type, body = found
+        if not content_type.startswith('image/'):
+            base = base_url_func().encode('utf-8')
+            for host in fixtures.hosts:
+                host = host.encode('utf-8')
+                for scheme in (b'https://', b'http://'):
+                    body = body.replace(scheme + host, base + b'/' + host)
+                    # JSON met ge-escapete slashes
+                    body = body.replace(scheme.replace(b'/', b'\\/') + host,
+                                        base.replace(b'/', b'\\/') + b'\\/' + host)
+        return 200, content_type, body
+    return handler
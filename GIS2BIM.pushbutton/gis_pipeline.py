@@ -0,0 +1,748 @@
+# -*- coding: utf-8 -*-
+"""
+GIS2BIM data pipeline - lagen downloaden en verwerken zonder Revit
+Bevat de laagdefinities (GIS_LAYERS) en de fetch/parse/transform stappen;
+script.py voegt daar alleen de Revit en WinForms kant aan toe. Als CLI
+schrijft deze module per laag plaatsbare bestanden naar een projectmap
+(samengevoegde PNG's, vereenvoudigde lijnen als JSON, gebouwen als OBJ):
+
+    python gis_pipeline.py --rd 99628 424889 --bbox 500 --layers top10nl,bag_3d_cityjson --out ./GIS2BIM
+"""
+
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from tile_fetcher import fetch_tiles, wmts_tile_url
+from tile_cache import TileCache, url_key, wmts_url_key
+from ogcapi_client import CRS84, PageStats, iter_ogcapi_features, iter_ogcapi_pages
+from wfs_client import WfsStats, iter_wfs_features
+from cityjson_parser import ParseStats, iter_buildings, iter_cityjson_pages
+from mesh_tools import (InstanceStats, LodSelector, MergeStats, MeshStats, group_identical_buildings,
+                        merge_buildings_by_tile, simplify_buildings)
+from line_simplify import LineSimplifier, LineStats, iter_pages
+from spatial_index import ClipStats, GeometryDedup, clip_rings, feature_rings
+from span_tracer import Tracer, trace_path
+from png_codec import PngWriter, decode_image
+from rd_transform import rd_bbox_to_wgs84, transform_features, wgs84_to_rd
+from wms_tiler import MosaicStats, WmsTilePlan, write_wms_mosaic
+from http_client import HttpClient, default_client
+from geotiff import read_geotiff
+from terrain_tin import DemGridPlan, TinStats, terrain_mesh, wcs_coverage_url
+from vector_cache import RingBuffer, VectorCache
+
+
+# =============================================================================
+# CONSTANTEN
+# =============================================================================
+
+WMTS_XCORNER = -285401.92
+WMTS_YCORNER = 903402.0
+WMTS_PIXEL_WIDTH = 256
+WMTS_MAX_WORKERS = 6
+WMTS_RETRIES = 3
+# WMS grondresolutie (m/px, per laag 'resolution'), GetMap tilegrootte en maximale beeldzijde
+WMS_RESOLUTION = 0.25
+WMS_TILE_PX = 1024
+WMS_MAX_PX = 8192
+OGCAPI_PAGE_SIZE = 1000
+OGCAPI_MAX_FEATURES = 50000
+WFS_PAGE_SIZE = 1000
+WFS_TILE_MAX_FEATURES = 5000
+THREEDBAG_URL = 'https://api.3dbag.nl'
+THREEDBAG_PAGE_SIZE = 50
+# Douglas-Peucker tolerantie (m) voor detail lines; per laag te overschrijven met 'tolerance'
+LINE_TOLERANCE = 0.05
+# Buiten deze straal (m) LOD 1.2 en samengevoegde vlakken; clustering 0 = uit
+THREEDBAG_NEAR_RADIUS = 250.0
+THREEDBAG_FAR_MERGE_PLANAR = True
+THREEDBAG_FAR_CLUSTER_SIZE = 0.0
+# Tegelgrootte (m) voor een DirectShape per tegel (laag optie 'merge_tile'; 0 = een per gebouw)
+THREEDBAG_MERGE_TILE = 100.0
+# AHN maaiveld: grid resolutie (m), toegestane afwijking (m), driehoekbudget en
+# dikte (m) van de bodem onder het laagste punt (laag opties; base_depth None = alleen het vlak)
+AHN_WCS_URL = 'https://service.pdok.nl/rws/ahn/wcs/v1_0'
+AHN_RESOLUTION = 1.0
+AHN_TOLERANCE = 0.10
+AHN_MAX_TRIANGLES = 20000
+AHN_BASE_DEPTH = 1.0
+# Aantal lagen dat tegelijk op de achtergrond gedownload en verwerkt wordt
+LAYER_WORKERS = 3
+
+ZOOMLEVEL_RESOLUTIONS = {
+    0: 3440.640, 1: 1720.320, 2: 860.160, 3: 430.080,
+    4: 215.040, 5: 107.520, 6: 53.720, 7: 26.880,
+    8: 13.440, 9: 6.720, 10: 3.360, 11: 1.680,
+    12: 0.840, 13: 0.420, 14: 0.210, 15: 0.105, 16: 0.0575
+}
+
+
+# =============================================================================
+# GIS DATA LAGEN
+# =============================================================================
+
+GIS_LAYERS = {
+    'luchtfoto_actueel': {'name': 'Luchtfoto Actueel', 'category': 'Rasterkaarten', 'type': 'wmts', 'url': 'https://service.pdok.nl/hwh/luchtfotorgb/wmts/v1_0', 'layer': 'Actueel_orthoHR', 'zoom': 14, 'sheet_name': 'GIS - Luchtfoto Actueel'},
+    'luchtfoto_2023': {'name': 'Luchtfoto 2023', 'category': 'Rasterkaarten', 'type': 'wmts', 'url': 'https://service.pdok.nl/hwh/luchtfotorgb/wmts/v1_0', 'layer': '2023_orthoHR', 'zoom': 14, 'sheet_name': 'GIS - Luchtfoto 2023'},
+    'top10nl': {'name': 'Top10NL Achtergrond', 'category': 'Rasterkaarten', 'type': 'wmts', 'url': 'https://service.pdok.nl/brt/achtergrondkaart/wmts/v2_0', 'layer': 'standaard', 'zoom': 11, 'sheet_name': 'GIS - Top10NL'},
+    'bestemmingsplan': {'name': 'Bestemmingsplan', 'category': 'Rasterkaarten', 'type': 'wms', 'url': 'https://service.pdok.nl/kadaster/plu/wms/v1_0', 'layer': 'Bestemmingsplangebied', 'sheet_name': 'GIS - Bestemmingsplan'},
+    'bouwvlak_wms': {'name': 'Bouwvlak (kaart)', 'category': 'Rasterkaarten', 'type': 'wms', 'url': 'https://service.pdok.nl/kadaster/plu/wms/v1_0', 'layer': 'Bouwvlak', 'sheet_name': 'GIS - Bouwvlak'},
+    'bgt_achtergrond': {'name': 'BGT Achtergrondkaart', 'category': 'Rasterkaarten', 'type': 'wmts', 'url': 'https://service.pdok.nl/lv/bgt/wmts/v1_0', 'layer': 'standaardvisualisatie', 'zoom': 14, 'sheet_name': 'GIS - BGT'},
+    'kadaster_kaart': {'name': 'Kadastrale Kaart', 'category': 'Rasterkaarten', 'type': 'wms', 'url': 'https://service.pdok.nl/kadaster/kadastralekaart/wms/v5_0', 'layer': 'Kadastralekaart', 'sheet_name': 'GIS - Kadaster Kaart'},
+    'natura2000': {'name': 'Natura2000', 'category': 'Rasterkaarten', 'type': 'wms', 'url': 'https://service.pdok.nl/rvo/natura2000/wms/v1_0', 'layer': 'natura2000', 'sheet_name': 'GIS - Natura2000'},
+    'bag_panden_2d': {'name': 'BAG Panden 2D', 'category': '2D Vectordata', 'type': 'wfs', 'url': 'https://service.pdok.nl/lv/bag/wfs/v2_0', 'layer': 'bag:pand', 'sheet_name': 'GIS - BAG 2D'},
+    'bgt_wegdelen': {'name': 'BGT Wegdelen', 'category': '2D Vectordata', 'type': 'ogcapi', 'url': 'https://api.pdok.nl/lv/bgt/ogc/v1', 'collection': 'wegdeel', 'sheet_name': 'GIS - BGT Wegdelen'},
+    'bgt_waterdelen': {'name': 'BGT Waterdelen', 'category': '2D Vectordata', 'type': 'ogcapi', 'url': 'https://api.pdok.nl/lv/bgt/ogc/v1', 'collection': 'waterdeel', 'sheet_name': 'GIS - BGT Waterdelen'},
+    'bgt_panden': {'name': 'BGT Panden', 'category': '2D Vectordata', 'type': 'ogcapi', 'url': 'https://api.pdok.nl/lv/bgt/ogc/v1', 'collection': 'pand', 'sheet_name': 'GIS - BGT Panden'},
+    'kadaster_percelen': {'name': 'Kadaster Percelen', 'category': '2D Vectordata', 'type': 'wfs', 'url': 'https://service.pdok.nl/kadaster/kadastralekaart/wfs/v5_0', 'layer': 'kadastralekaart:Perceel', 'sheet_name': 'GIS - Percelen'},
+    'bag_3d_cityjson': {'name': '3D BAG LOD2.2 (CityJSON)', 'category': '3D Data', 'type': '3dbag_cityjson', 'url': THREEDBAG_URL, 'sheet_name': 'GIS - 3D BAG'},
+    'bag_3d_tiles': {'name': '3D BAG per tegel (100 m)', 'category': '3D Data', 'type': '3dbag_cityjson', 'url': THREEDBAG_URL, 'merge_tile': THREEDBAG_MERGE_TILE, 'sheet_name': 'GIS - 3D BAG Tegels'},
+    'ahn_dtm': {'name': 'AHN Maaiveld (DTM)', 'category': '3D Data', 'type': 'ahn_dtm', 'url': AHN_WCS_URL, 'layer': 'dtm_05m', 'sheet_name': 'GIS - AHN Maaiveld'},
+}
+
+
+# =============================================================================
+# DOWNLOAD EN VERWERKING
+# =============================================================================
+
+def http_fetch_bytes(url, cached=None):
+    """Download een URL via de gedeelde HttpClient (buiten Revit; script.py levert een .NET transport)."""
+    return default_client().fetch_bytes(url, cached=cached)
+
+
+def http_fetch_text(url, cached=None):
+    return default_client().fetch_text(url, cached=cached)
+
+
+def bbox_around(rd_x, rd_y, bbox_size):
+    half = bbox_size / 2.0
+    return (rd_x - half, rd_y - half, rd_x + half, rd_y + half)
+
+
+def wmts_tile_grid(layer_config, rd_x, rd_y, bbox_size):
+    """Rijen en kolommen van de WMTS tiles rond het centrum.
+
+    Returns:
+        Tuple (rows, cols, tile_width_m)
+    """
+    zoomlevel = layer_config.get('zoom', 12)
+    resolution = ZOOMLEVEL_RESOLUTIONS.get(zoomlevel, ZOOMLEVEL_RESOLUTIONS[12])
+    tile_width_m = WMTS_PIXEL_WIDTH * resolution
+    center_col = int((rd_x - WMTS_XCORNER) / tile_width_m)
+    center_row = int((WMTS_YCORNER - rd_y) / tile_width_m)
+    tiles_needed = int(math.ceil(bbox_size / tile_width_m))
+    if tiles_needed % 2 == 1:
+        tiles_needed += 1
+    half = tiles_needed // 2
+    cols = list(range(center_col - half, center_col + half + 1))
+    rows = list(range(center_row - half, center_row + half + 1))
+    return rows, cols, tile_width_m
+
+
+def fetch_wmts_tiles(layer_config, rd_x, rd_y, bbox_size, fetch_bytes, cache=None):
+    """Download de WMTS tiles rond het centrum (parallel, via de tile cache).
+
+    Returns:
+        Tuple (payloads, rows, cols, tile_width_m) met payloads in rij/kolom
+        volgorde (None voor mislukte tiles)
+    """
+    rows, cols, tile_width_m = wmts_tile_grid(layer_config, rd_x, rd_y, bbox_size)
+    zoomlevel = layer_config.get('zoom', 12)
+    urls = [wmts_tile_url(layer_config['url'], layer_config['layer'], zoomlevel, row, col)
+            for row in rows for col in cols]
+    hits_before = cache.hits if cache is not None else 0
+    fetch = cache.wrap(fetch_bytes, wmts_url_key) if cache is not None else fetch_bytes
+    payloads, stats = fetch_tiles(urls, fetch,
+                                  max_workers=layer_config.get('max_workers', WMTS_MAX_WORKERS),
+                                  retries=layer_config.get('retries', WMTS_RETRIES))
+    if cache is not None:
+        cache.flush()
+    print("WMTS {}: {} tiles in {:.1f}s ({} uit cache, {} mislukt, {} retries)".format(
+        layer_config['layer'], stats.requested, stats.elapsed,
+        (cache.hits if cache is not None else 0) - hits_before, stats.failed, stats.retries))
+    return payloads, rows, cols, tile_width_m
+
+
+def wms_tile_plan(layer_config, rd_x, rd_y, bbox_size):
+    return WmsTilePlan(bbox_around(rd_x, rd_y, bbox_size), layer_config.get('resolution', WMS_RESOLUTION),
+                       WMS_TILE_PX, WMS_MAX_PX)
+
+
+def fetch_wms_mosaic(layer_config, rd_x, rd_y, bbox_size, path, fetch_bytes, cache=None,
+                     decode_func=decode_image, stats=None):
+    """Download een WMS laag in tiles op de grondresolutie van de laag naar path.
+
+    Returns:
+        WmsTilePlan (met de werkelijke resolutie en afmetingen in meters)
+    """
+    plan = wms_tile_plan(layer_config, rd_x, rd_y, bbox_size)
+    fetch = cache.wrap(fetch_bytes, url_key) if cache is not None else fetch_bytes
+    write_wms_mosaic(path, plan, layer_config['url'], layer_config['layer'], fetch, decode_func,
+                     max_workers=layer_config.get('max_workers', WMTS_MAX_WORKERS),
+                     retries=layer_config.get('retries', WMTS_RETRIES), stats=stats)
+    if cache is not None:
+        cache.flush()
+    print("WMS {}: {}x{} px op {:.2f} m/px".format(layer_config['layer'], plan.width, plan.height, plan.resolution))
+    return plan
+
+
+def get_wfs_features(layer_config, rd_x, rd_y, bbox_size, fetch_text, stats=None):
+    return iter_wfs_features(layer_config['url'], layer_config['layer'], bbox_around(rd_x, rd_y, bbox_size),
+                             fetch_text, page_size=WFS_PAGE_SIZE, tile_max_features=WFS_TILE_MAX_FEATURES,
+                             stats=stats)
+
+
+def get_ogcapi_features(layer_config, rd_x, rd_y, bbox_size, fetch_text, max_features=OGCAPI_MAX_FEATURES,
+                        stats=None):
+    # Services zonder RD: bbox en features in CRS84 (lon/lat), features terug naar RD
+    bbox = bbox_around(rd_x, rd_y, bbox_size)
+    if layer_config.get('crs') == 'CRS84':
+        features = iter_ogcapi_features(layer_config['url'], layer_config['collection'], rd_bbox_to_wgs84(bbox),
+                                        fetch_text, page_size=OGCAPI_PAGE_SIZE, max_features=max_features,
+                                        stats=stats, crs=CRS84)
+        return transform_features(features, wgs84_to_rd)
+    return iter_ogcapi_features(layer_config['url'], layer_config['collection'], bbox, fetch_text,
+                                page_size=OGCAPI_PAGE_SIZE, max_features=max_features, stats=stats)
+
+
+def get_3dbag_cityjson_pages(rd_x, rd_y, bbox_size, fetch_text, stats=None, base_url=THREEDBAG_URL):
+    api_url = "{}/collections/pand/items?bbox={},{},{},{}&limit={}".format(
+        base_url, *(bbox_around(rd_x, rd_y, bbox_size) + (THREEDBAG_PAGE_SIZE,)))
+    print("3D BAG API URL: {}".format(api_url))
+    return iter_ogcapi_pages(api_url, fetch_text, stats)
+
+
+def threedbag_selector():
+    return LodSelector(THREEDBAG_NEAR_RADIUS, merge_planar=THREEDBAG_FAR_MERGE_PLANAR,
+                       cluster_size=THREEDBAG_FAR_CLUSTER_SIZE)
+
+
+def iter_3dbag_buildings(rd_x, rd_y, bbox_size, fetch_text, page_stats=None, parse_stats=None, mesh_stats=None,
+                         base_url=THREEDBAG_URL):
+    """Gebouwen uit de 3D BAG rond het centrum: LOD keuze en vereenvoudiging.
+
+    Yields:
+        Gebouw dicts met 'vertices' in meters t.o.v. (rd_x, rd_y) en 'triangles'
+    """
+    selector = threedbag_selector()
+    pages = get_3dbag_cityjson_pages(rd_x, rd_y, bbox_size, fetch_text, page_stats, base_url)
+    buildings = iter_buildings(iter_cityjson_pages(pages), rd_x, rd_y, lod=selector, stats=parse_stats)
+    return simplify_buildings(buildings, selector, mesh_stats)
+
+
+def ahn_grid_plan(layer_config, rd_x, rd_y, bbox_size):
+    return DemGridPlan(bbox_around(rd_x, rd_y, bbox_size), layer_config.get('resolution', AHN_RESOLUTION))
+
+
+def fetch_ahn_grid(layer_config, rd_x, rd_y, bbox_size, fetch_bytes, cache=None):
+    """Download het AHN hoogtegrid rond het centrum als GeoTIFF (WCS, via de tile cache).
+
+    Returns:
+        Tuple (DemGridPlan, geotiff.Raster)
+    """
+    plan = ahn_grid_plan(layer_config, rd_x, rd_y, bbox_size)
+    url = wcs_coverage_url(layer_config['url'], layer_config['layer'], plan.bbox, plan.width, plan.height)
+    fetch = cache.wrap(fetch_bytes, url_key) if cache is not None else fetch_bytes
+    data = fetch(url)
+    if cache is not None:
+        cache.flush()
+    raster = read_geotiff(data)
+    if (raster.width, raster.height) != (plan.width, plan.height):
+        raise ValueError("AHN grid van {}x{} punten, verwacht {}x{}".format(
+            raster.width, raster.height, plan.width, plan.height))
+    print("AHN {}: {}x{} punten op {:.2f} m".format(layer_config['layer'], plan.width, plan.height, plan.resolution))
+    return plan, raster
+
+
+# =============================================================================
+# BESTANDEN
+# =============================================================================
+
+def write_tiles_png(path, payloads, n_rows, n_cols, tile_px=WMTS_PIXEL_WIDTH):
+    """Voeg tiles samen tot een PNG, een tilerij tegelijk in het geheugen.
+
+    Ontbrekende of onleesbare tiles worden transparant.
+    """
+    blank = bytearray(tile_px * 4)
+    with PngWriter(path, n_cols * tile_px, n_rows * tile_px) as writer:
+        for ri in range(n_rows):
+            decoded = []
+            for ci in range(n_cols):
+                payload = payloads[ri * n_cols + ci]
+                rows = None
+                if payload is not None:
+                    try:
+                        width, height, rows = decode_image(payload)
+                        if width != tile_px or height != tile_px:
+                            rows = None
+                    except Exception:
+                        rows = None
+                decoded.append(rows)
+            for y in range(tile_px):
+                writer.write_row(b''.join(bytes(rows[y]) if rows is not None else bytes(blank)
+                                          for rows in decoded))
+
+
+def write_lines_json(path, polylines, rd_x, rd_y, extra=None):
+    """Schrijf polylines als JSON, in meters t.o.v. (rd_x, rd_y)."""
+    data = {'origin': [rd_x, rd_y],
+            'polylines': [[[round(x - rd_x, 4), round(y - rd_y, 4)] for x, y in line] for line in polylines]}
+    data.update(extra or {})
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def write_buildings_obj(path, buildings, title="3D BAG"):
+    """Schrijf gebouwen (of andere meshes) als Wavefront OBJ (een object per gebouw).
+
+    Returns:
+        Aantal geschreven gebouwen
+    """
+    count = 0
+    offset = 1
+    with open(path, 'w') as f:
+        f.write("# GIS2BIM {}, meters t.o.v. het project centrum\n".format(title))
+        for building in buildings:
+            faces = building.get('triangles') or building.get('polygon_faces') or []
+            vertices = building['vertices']
+            if not faces or not len(vertices):
+                continue
+            f.write("o {}\n".format(building.get('id', count)))
+            for v in vertices:
+                f.write("v {:.4f} {:.4f} {:.4f}\n".format(v[0], v[1], v[2]))
+            for face in faces:
+                f.write("f {}\n".format(" ".join(str(i + offset) for i in face)))
+            offset += len(vertices)
+            count += 1
+    return count
+
+
+def write_tile_ranges(path, tile_meshes, element_ids=None, errors=None):
+    """Schrijf per tegel de vlakbereiken per gebouw als JSON.
+
+    Args:
+        tile_meshes: List van TileMesh
+        element_ids: Optioneel dict tegel key -> Revit element id; tegels die
+            daar niet in staan zijn niet geplaatst en krijgen 'failed' in
+            plaats van vlakbereiken
+        errors: Optioneel dict tegel key -> foutmelding van niet geplaatste tegels
+    """
+    tiles = []
+    for tile in tile_meshes:
+        entry = {'tile': list(tile.key), 'bounds': list(tile.bounds)}
+        if element_ids is not None and tile.key not in element_ids:
+            entry['failed'] = (errors or {}).get(tile.key) or "niet geplaatst"
+        else:
+            entry.update(faces=sum(count for _, _, count in tile.ranges), buildings=tile.face_ranges())
+            if element_ids is not None:
+                entry['element_id'] = element_ids[tile.key]
+        tiles.append(entry)
+    with open(path, 'w') as f:
+        json.dump({'tiles': tiles}, f)
+
+
+class PreparedLayer(object):
+    """Resultaat van de download/verwerk stap van een laag.
+
+    Attributes:
+        key, layer, rd_x, rd_y, bbox_size: De laag, het centrum en de bbox
+        data: Dict met de verwerkte data (zie prepare_layer)
+        stats: Dict naam -> stats object (met summary())
+        error: Foutmelding als de stap mislukte, anders None
+        seconds: Duur van de stap
+    """
+
+    def __init__(self, key, layer, rd_x, rd_y, bbox_size):
+        self.key = key
+        self.layer = layer
+        self.rd_x = rd_x
+        self.rd_y = rd_y
+        self.bbox_size = bbox_size
+        self.data = {}
+        self.stats = {}
+        self.error = None
+        self.seconds = 0.0
+
+    def summaries(self):
+        return ["{} {}: {}".format(self.layer['name'], name, stats.summary())
+                for name, stats in sorted(self.stats.items())]
+
+
+def prepare_layer(key, layer_config, rd_x, rd_y, bbox_size, fetch_bytes=http_fetch_bytes,
+                  fetch_text=http_fetch_text, cache=None, out_dir=None, decode_func=decode_image, dedup=None,
+                  tracer=None, vector_cache=None):
+    """Download en verwerk een laag tot data die direct geplaatst kan worden.
+
+    Raakt geen Revit API aan, zodat dit in een achtergrond thread kan draaien.
+    WMS lagen worden direct als GIS2BIM_{key}.png in out_dir (standaard de
+    temp map) geschreven, decode_func decodeert de tiles daarvoor.
+    CityJSON pagina's van de 3D BAG gaan ook via de tile cache (cache).
+    Vectorlagen worden op de bbox geclipt en ontdubbeld; een gedeeld
+    GeometryDedup (dedup) ontdubbelt ook over lagen heen; met een
+    vector_cache (VectorCache) worden de geparste ringen bewaard en bij een
+    volgende import van dezelfde plek zonder download ingelezen. Elke stap
+    wordt als span in tracer (span_tracer.Tracer) vastgelegd.
+    Data per type:
+        wmts: payloads, rows, cols, width_m, height_m
+        wms: path (PNG), width_m, height_m
+        wfs / ogcapi: polylines (vereenvoudigd, RD), truncated
+        3dbag_cityjson: buildings (list, meters t.o.v. het centrum), shape_groups
+            (ShapeGroup per unieke vorm, voor instancing) of met 'merge_tile'
+            tile_meshes (TileMesh per tegel)
+        ahn_dtm: terrain (mesh dict van terrain_tin.terrain_mesh, meters t.o.v.
+            het centrum, z in m NAP zoals de 3D BAG), width_m, height_m
+
+    Returns:
+        PreparedLayer (fouten komen in .error)
+    """
+    prepared = PreparedLayer(key, layer_config, rd_x, rd_y, bbox_size)
+    if tracer is None:
+        tracer = Tracer()
+    start = time.time()
+    try:
+        with tracer.span('prepare', key):
+            _prepare_layer_data(prepared, layer_config, fetch_bytes, fetch_text, cache, out_dir, decode_func,
+                                dedup, tracer, vector_cache)
+    except Exception as e:
+        prepared.error = str(e)
+    prepared.seconds = time.time() - start
+    return prepared
+
+
+def _prepare_layer_data(prepared, layer_config, fetch_bytes, fetch_text, cache, out_dir, decode_func, dedup,
+                        tracer, vector_cache=None):
+    key, rd_x, rd_y, bbox_size = prepared.key, prepared.rd_x, prepared.rd_y, prepared.bbox_size
+    layer_type = layer_config['type']
+    if layer_type == 'wmts':
+        with tracer.span('download') as span:
+            payloads, rows, cols, tile_width_m = fetch_wmts_tiles(layer_config, rd_x, rd_y, bbox_size,
+                                                                  span.counting(fetch_bytes), cache)
+            _count_tiles(span, len(payloads), payloads.count(None))
+        prepared.data.update(payloads=payloads, rows=rows, cols=cols,
+                             width_m=len(cols) * tile_width_m, height_m=len(rows) * tile_width_m)
+    elif layer_type == 'wms':
+        path = os.path.join(out_dir or tempfile.gettempdir(), "GIS2BIM_{}.png".format(key))
+        mosaic_stats = MosaicStats()
+        with tracer.span('wms_mosaic') as span:
+            plan = fetch_wms_mosaic(layer_config, rd_x, rd_y, bbox_size, path, span.counting(fetch_bytes), cache,
+                                    decode_func, mosaic_stats)
+            _count_tiles(span, mosaic_stats.tiles, mosaic_stats.failed)
+            span.set(pixels=plan.width * plan.height)
+        prepared.data.update(path=path, width_m=plan.width_m, height_m=plan.height_m,
+                             resolution=plan.resolution)
+        prepared.stats['download'] = mosaic_stats
+    elif layer_type in ('wfs', 'ogcapi'):
+        bbox = bbox_around(rd_x, rd_y, bbox_size)
+        page_size = WFS_PAGE_SIZE if layer_type == 'wfs' else OGCAPI_PAGE_SIZE
+        tolerance = layer_config.get('tolerance', LINE_TOLERANCE)
+        clip_stats, line_stats = ClipStats(), LineStats()
+        simplifier = LineSimplifier(tolerance, stats=line_stats)
+        # Een dedup voor alle pagina's van de laag (of gedeeld tussen lagen)
+        dedup = dedup if dedup is not None else GeometryDedup()
+        polylines = prepared.data['polylines'] = []
+
+        # Clippen en vereenvoudigen per pagina; alleen de set getekende segmenten gaat mee
+        def add_page(rings):
+            with tracer.span('clip') as span:
+                rings = clip_rings(rings, bbox, dedup, clip_stats)
+                span.set(rings_out=len(rings))
+            with tracer.span('simplify') as span:
+                page_lines = simplifier.add(rings)
+                span.set(polylines=len(page_lines))
+            polylines.extend(page_lines)
+
+        ring_set = None
+        if vector_cache is not None:
+            with tracer.span('vector_cache') as span:
+                ring_set = vector_cache.get(key, layer_config, bbox)
+                if ring_set is not None:
+                    span.set(rings=len(ring_set), bytes=ring_set.nbytes)
+        if ring_set is None:
+            source = RingBuffer() if vector_cache is not None else None
+            with tracer.span('download_lines') as span:
+                if layer_type == 'wfs':
+                    stats = WfsStats()
+                    features = get_wfs_features(layer_config, rd_x, rd_y, bbox_size, span.counting(fetch_text),
+                                                stats=stats)
+                else:
+                    stats = PageStats()
+                    features = get_ogcapi_features(layer_config, rd_x, rd_y, bbox_size, span.counting(fetch_text),
+                                                   stats=stats)
+                for page in iter_pages(features, page_size):
+                    rings = feature_rings(page)
+                    span.add('features', len(page))
+                    span.add('rings', len(rings))
+                    if source is not None:
+                        source.extend(rings)
+                    add_page(rings)
+            truncated = stats.truncated
+            prepared.stats['download'] = stats
+            if vector_cache is not None:
+                with tracer.span('vector_cache_write'):
+                    try:
+                        vector_cache.put(key, layer_config, bbox, source, truncated)
+                    except (IOError, OSError):
+                        pass
+        else:
+            truncated = ring_set.header.get('truncated', False)
+            try:
+                for rings in iter_pages(ring_set, page_size):
+                    add_page(rings)
+            finally:
+                ring_set.close()
+        prepared.data['tolerance'] = tolerance
+        prepared.data['truncated'] = truncated
+        prepared.stats.update(clip=clip_stats, lines=line_stats)
+    elif layer_type == '3dbag_cityjson':
+        page_stats, parse_stats, mesh_stats = PageStats(), ParseStats(), MeshStats()
+        instance_stats = InstanceStats()
+        # Download, parsen en vereenvoudigen lopen als stroom door elkaar
+        with tracer.span('download_parse') as span:
+            fetch = span.counting(fetch_text)
+            if cache is not None:
+                fetch = cache.wrap_text(fetch, url_key)
+            prepared.data['buildings'] = list(iter_3dbag_buildings(rd_x, rd_y, bbox_size, fetch,
+                                                                   page_stats, parse_stats, mesh_stats,
+                                                                   layer_config.get('url', THREEDBAG_URL)))
+            if cache is not None:
+                cache.flush()
+            span.set(buildings=parse_stats.buildings, vertices=parse_stats.pooled_vertices,
+                     faces_in=mesh_stats.faces_in, faces=mesh_stats.faces_out)
+        prepared.stats.update(download=page_stats, parse=parse_stats, mesh=mesh_stats)
+        if layer_config.get('merge_tile'):
+            merge_stats = MergeStats()
+            with tracer.span('merge') as span:
+                prepared.data['tile_meshes'] = merge_buildings_by_tile(prepared.data['buildings'],
+                                                                       layer_config['merge_tile'], (rd_x, rd_y),
+                                                                       merge_stats)
+                span.set(tiles=merge_stats.tiles, faces=merge_stats.faces)
+            prepared.stats['merge'] = merge_stats
+        else:
+            with tracer.span('instancing') as span:
+                prepared.data['shape_groups'] = group_identical_buildings(prepared.data['buildings'],
+                                                                          stats=instance_stats)
+                span.set(shapes=instance_stats.shapes, unique_faces=instance_stats.unique_faces)
+            prepared.stats['instancing'] = instance_stats
+    elif layer_type == 'ahn_dtm':
+        tin_stats = TinStats()
+        with tracer.span('download') as span:
+            plan, raster = fetch_ahn_grid(layer_config, rd_x, rd_y, bbox_size, span.counting(fetch_bytes), cache)
+            span.set(points=raster.width * raster.height)
+        with tracer.span('tin') as span:
+            prepared.data['terrain'] = terrain_mesh(plan, raster.values, rd_x, rd_y,
+                                                    layer_config.get('tolerance', AHN_TOLERANCE),
+                                                    layer_config.get('max_triangles', AHN_MAX_TRIANGLES),
+                                                    layer_config.get('base_depth', AHN_BASE_DEPTH),
+                                                    raster.nodata, tin_stats)
+            span.set(filled=tin_stats.filled, triangles=tin_stats.triangles)
+        prepared.data.update(width_m=plan.width_m, height_m=plan.height_m, resolution=plan.resolution)
+        prepared.stats['tin'] = tin_stats
+    else:
+        prepared.error = "Onbekend laagtype '{}'".format(layer_type)
+
+
+def _count_tiles(span, tiles, failed):
+    # Geslaagde tiles die niet via het netwerk kwamen, kwamen uit de cache
+    span.set(tiles=tiles, failed=failed,
+             cache_hits=max(0, tiles - failed - span.counts.get('requests', 0)))
+
+
+def iter_prepared_layers(jobs, prepare_func, max_workers=LAYER_WORKERS, idle=None, poll=0.1):
+    """Producer/consumer: bereid lagen voor in achtergrond threads.
+
+    De aanroepende thread krijgt de resultaten zodra ze klaar zijn (in volgorde
+    van afronding) en kan ze meteen verwerken terwijl de overige lagen nog
+    downloaden. Tijdens het wachten wordt idle() aangeroepen (bijv.
+    Application.DoEvents om de UI responsief te houden).
+
+    Args:
+        jobs: List van argument tuples voor prepare_func
+        prepare_func: Functie(*job) -> resultaat (mag niet gooien)
+        max_workers: Aantal achtergrond threads
+        idle: Optionele functie die tijdens het wachten aangeroepen wordt
+        poll: Wachttijd per poging in seconden
+
+    Yields:
+        Tuple (index in jobs, resultaat)
+    """
+    pending = queue.Queue()
+    done = queue.Queue()
+    for index, job in enumerate(jobs):
+        pending.put((index, job))
+
+    def worker():
+        while True:
+            try:
+                index, job = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result = prepare_func(*job)
+            except Exception as e:
+                result = e
+            done.put((index, result))
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(int(max_workers), len(jobs))))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for _ in range(len(jobs)):
+        while True:
+            try:
+                item = done.get(timeout=poll)
+                break
+            except queue.Empty:
+                if idle is not None:
+                    idle()
+        yield item
+
+
+def write_prepared_layer(prepared, out_dir):
+    """Schrijf een voorbereide laag naar out_dir (CLI).
+
+    Naast de data komt GIS2BIM_{key}.json met de laag, het centrum, de
+    afmetingen in meters en de statistieken.
+
+    Returns:
+        Korte melding (zoals in het Revit resultaatoverzicht)
+    """
+    key, layer, data = prepared.key, prepared.layer, prepared.data
+    base = os.path.join(out_dir, "GIS2BIM_{}".format(key))
+    info = {'key': key, 'name': layer['name'], 'type': layer['type'], 'bbox_size': prepared.bbox_size,
+            'created': time.time(), 'seconds': prepared.seconds}
+    if layer['type'] == 'wmts':
+        write_tiles_png(base + '.png', data['payloads'], len(data['rows']), len(data['cols']))
+        info['files'] = [base + '.png']
+        message = "{} tiles".format(len(data['payloads']))
+    elif layer['type'] == 'wms':
+        info['files'] = [data['path']]
+        info['resolution'] = data['resolution']
+        message = "{:.2f} m/px".format(data['resolution'])
+    elif layer['type'] == 'ahn_dtm':
+        terrain = data['terrain']
+        write_buildings_obj(base + '.obj', [dict(terrain, id=key)], "AHN maaiveld (z in m NAP)")
+        info['files'] = [base + '.obj']
+        info.update(resolution=data['resolution'], min_z=terrain['min_z'], max_z=terrain['max_z'])
+        message = "{} driehoeken".format(terrain['surface_triangles'])
+    elif 'polylines' in data:
+        write_lines_json(base + '.lines.json', data['polylines'], prepared.rd_x, prepared.rd_y,
+                         {'tolerance': data['tolerance']})
+        info['files'] = [base + '.lines.json']
+        message = "{} segmenten".format(prepared.stats['lines'].segments_out)
+    else:
+        count = write_buildings_obj(base + '.obj', data['buildings'])
+        info['files'] = [base + '.obj']
+        message = "{} gebouwen".format(count)
+        if 'tile_meshes' in data:
+            write_tile_ranges(base + '.tiles.json', data['tile_meshes'])
+            info['files'].append(base + '.tiles.json')
+            message += " in {} tegels".format(len(data['tile_meshes']))
+    info.update(rd_x=prepared.rd_x, rd_y=prepared.rd_y, width_m=data.get('width_m'), height_m=data.get('height_m'))
+    info.update((name, stats.summary()) for name, stats in prepared.stats.items())
+    with open(base + '.json', 'w') as f:
+        json.dump(info, f, indent=2)
+    return message
+
+
+def run(rd_x, rd_y, bbox_size, keys, out_dir, fetch_bytes=http_fetch_bytes, fetch_text=http_fetch_text,
+        cache=None, bbox_sizes=None, max_workers=LAYER_WORKERS, dedup_layers=False, tracer=None, vector_cache=None):
+    """Exporteer meerdere lagen; fouten per laag worden gemeld, niet gegooid.
+
+    Met dedup_layers komt identieke geometrie maar in een vectorlaag terecht:
+    de laag die als eerste verwerkt wordt. De spans van alle stappen komen in
+    een tracebestand naast out_dir (standaard), met een tabel aan het eind.
+
+    Returns:
+        List van "naam: resultaat" regels, in de volgorde van keys
+    """
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    dedup = GeometryDedup() if dedup_layers else None
+    if tracer is None:
+        tracer = Tracer(trace_path(out_dir))
+
+    def prepare(key, size):
+        return prepare_layer(key, GIS_LAYERS[key], rd_x, rd_y, size, fetch_bytes, fetch_text, cache, out_dir,
+                             dedup=dedup, tracer=tracer, vector_cache=vector_cache)
+
+    jobs = [(key, (bbox_sizes or {}).get(key, bbox_size)) for key in keys]
+    results = [None] * len(jobs)
+    for index, prepared in iter_prepared_layers(jobs, prepare, max_workers):
+        name = GIS_LAYERS[keys[index]]['name']
+        try:
+            if isinstance(prepared, Exception):
+                raise prepared
+            if prepared.error:
+                raise Exception(prepared.error)
+            for line in prepared.summaries():
+                print(line)
+            with tracer.span('write', prepared.key):
+                message = write_prepared_layer(prepared, out_dir)
+            results[index] = "{}: {} ({:.1f}s)".format(name, message, prepared.seconds)
+        except Exception as e:
+            results[index] = "{}: FOUT - {}".format(name, str(e))
+    print(tracer.summary_table())
+    if tracer.path:
+        print("Trace: {}".format(tracer.path))
+    return results
+
+
+def main(argv=None):
+    import argparse
+    from tile_cache import default_cache_dir
+
+    parser = argparse.ArgumentParser(description="GIS2BIM lagen downloaden zonder Revit")
+    parser.add_argument('--rd', nargs=2, type=float, metavar=('X', 'Y'), help="RD centrum")
+    parser.add_argument('--bbox', type=float, default=500.0, help="Zijde van het gebied in meters")
+    parser.add_argument('--layers', default='', help="Komma gescheiden laag sleutels (of 'all')")
+    parser.add_argument('--out', default='GIS2BIM', help="Projectmap voor de bestanden")
+    parser.add_argument('--cache', default=default_cache_dir(), help="Tile cache map")
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--workers', type=int, default=LAYER_WORKERS, help="Lagen tegelijk")
+    parser.add_argument('--dedup-layers', action='store_true', help="Identieke geometrie maar in een laag")
+    parser.add_argument('--record', metavar='DIR', help="Neem alle responses op als fixtures (zonder cache)")
+    parser.add_argument('--list', action='store_true', help="Toon de beschikbare lagen")
+    args = parser.parse_args(argv)
+
+    if args.list or not args.rd or not args.layers:
+        for key in sorted(GIS_LAYERS):
+            print("{:<20} {:<15} {}".format(key, GIS_LAYERS[key]['type'], GIS_LAYERS[key]['name']))
+        return 0 if args.list else 1
+    keys = sorted(GIS_LAYERS) if args.layers == 'all' else [k.strip() for k in args.layers.split(',') if k.strip()]
+    unknown = [k for k in keys if k not in GIS_LAYERS]
+    if unknown:
+        print("Onbekende lagen: {}".format(", ".join(unknown)))
+        return 1
+    cache = None if args.no_cache or args.record else TileCache(args.cache)
+    vector_cache = None if args.no_cache or args.record else VectorCache()
+    # Zonder cache en bij opnemen ook geen revalidatie tegen bewaarde bodies
+    client = HttpClient() if args.no_cache or args.record else default_client()
+    fetch_bytes, fetch_text = client.fetch_bytes, client.fetch_text
+    recorder = None
+    if args.record:
+        from gis_fixtures import FixtureRecorder
+        recorder = FixtureRecorder(args.record, args.rd[0], args.rd[1], args.bbox)
+        fetch_bytes, fetch_text = recorder.wrap_bytes(fetch_bytes), recorder.wrap_text(fetch_text)
+    for line in run(args.rd[0], args.rd[1], args.bbox, keys, args.out, fetch_bytes, fetch_text, cache=cache,
+                    max_workers=args.workers, dedup_layers=args.dedup_layers, vector_cache=vector_cache):
+        print("- " + line)
+    print("HTTP: " + client.stats.summary())
+    client.close()
+    if recorder is not None:
+        recorder.save(dict((key, GIS_LAYERS[key]) for key in keys))
+        print("Fixtures: {} responses in {}".format(len(recorder.entries), args.record))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
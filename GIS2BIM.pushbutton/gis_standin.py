@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+"""
+Lokale HTTP stand-in voor GIS2BIM benchmarks
+Simuleert PDOK services op localhost met instelbare latency en bandbreedte,
+zodat de download code zonder netwerk en reproduceerbaar gemeten kan worden.
+Opgenomen responses (zie gis_fixtures) kunnen ook teruggespeeld worden.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+
+try:
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from urllib.parse import urlparse, parse_qs
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+
+BANDWIDTH_CHUNK = 16384
+
+
+def make_png(width, height, rgba=(200, 200, 200, 255)):
+    """Maak een effen RGBA PNG (voor nep-tiles).
+
+    Returns:
+        PNG bestand als bytes
+    """
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    pixel = struct.pack('>BBBB', *rgba)
+    raw = b''.join(b'\x00' + pixel * width for _ in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StandinServer(object):
+    """Kleine threaded HTTP server met route handlers.
+
+    Een route handler krijgt het request pad (incl. query) en geeft
+    (status, content_type, body) terug. Latency wordt per request toegevoegd;
+    met bandwidth (bytes/s, per verbinding) wordt de body in blokken
+    gedoseerd verstuurd. Met compress worden niet-beeld bodies gzip
+    gecomprimeerd als de client dat accepteert; met etags krijgt elke 200
+    response een ETag en geeft een passende If-None-Match een 304.
+    connect_latency simuleert de TCP/TLS handshake van een nieuwe verbinding;
+    verbindingen en requests worden geteld (keep-alive hergebruik).
+    """
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0, bandwidth=None, compress=False, etags=False,
+                 connect_latency=0.0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.bandwidth = bandwidth
+        self.compress = compress
+        self.etags = etags
+        self.routes = []
+        self.request_count = 0
+        self.connection_count = 0
+        self.not_modified_count = 0
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                with server._lock:
+                    server.connection_count += 1
+                if server.connect_latency:
+                    time.sleep(server.connect_latency)
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                status, content_type, body = server.dispatch(self.path)
+                etag = None
+                if server.etags and status == 200:
+                    etag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:16])
+                    if self.headers.get('If-None-Match') == etag:
+                        with server._lock:
+                            server.not_modified_count += 1
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        return
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                if etag:
+                    self.send_header('ETag', etag)
+                if (server.compress and not content_type.startswith('image/')
+                        and 'gzip' in (self.headers.get('Accept-Encoding') or '')):
+                    packer = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                    body = packer.compress(body) + packer.flush()
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                with server._lock:
+                    server.sent_bytes += len(body)
+                if not server.bandwidth:
+                    self.wfile.write(body)
+                    return
+                for pos in range(0, len(body), BANDWIDTH_CHUNK):
+                    chunk = body[pos:pos + BANDWIDTH_CHUNK]
+                    self.wfile.write(chunk)
+                    time.sleep(len(chunk) / float(server.bandwidth))
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def add_route(self, prefix, handler):
+        self.routes.append((prefix, handler))
+
+    def dispatch(self, path):
+        for prefix, handler in self.routes:
+            if path.startswith(prefix):
+                try:
+                    return handler(path)
+                except Exception as e:
+                    return 500, 'text/plain', str(e).encode('utf-8')
+        return 404, 'text/plain', b'not found'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def tile_handler(tile_size=256, fail_every=0):
+    """Route handler die voor elke WMTS GetTile een vaste PNG teruggeeft.
+
+    Args:
+        tile_size: Breedte/hoogte van de tile in pixels
+        fail_every: Geef elke n-de request een 503 (0 = nooit), om retries te meten
+    """
+    png = make_png(tile_size, tile_size)
+    counter = [0]
+    lock = threading.Lock()
+
+    def handler(path):
+        with lock:
+            counter[0] += 1
+            n = counter[0]
+        if fail_every and n % fail_every == 0:
+            return 503, 'text/plain', b'busy'
+        return 200, 'image/png', png
+    return handler
+
+
+def wms_handler(max_px=4096):
+    """Route handler voor WMS GetMap: effen PNG van WIDTH x HEIGHT.
+
+    Requests groter dan max_px geven, net als bij PDOK, een ServiceException.
+    """
+    cache = {}
+    lock = threading.Lock()
+
+    def handler(path):
+        query = parse_qs(urlparse(path).query)
+        width, height = int(query['WIDTH'][0]), int(query['HEIGHT'][0])
+        if width > max_px or height > max_px:
+            return 400, 'application/vnd.ogc.se_xml', b'<ServiceException>Image size out of range</ServiceException>'
+        with lock:
+            png = cache.get((width, height))
+            if png is None:
+                png = cache[(width, height)] = make_png(width, height)
+        return 200, 'image/png', png
+    return handler
+
+
+def make_square_feature(index, x, y, size=5.0):
+    """GeoJSON Polygon feature (vierkant) voor nep-vectordata."""
+    ring = [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+    return {
+        'type': 'Feature',
+        'id': index,
+        'properties': {'identificatie': 'standin.{}'.format(index)},
+        'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+    }
+
+
+def paged_geojson_handler(base_url_func, total=2500, origin=(99000.0, 424000.0), spacing=10.0):
+    """Route handler voor /collections/{c}/items met limit/offset paginering.
+
+    Args:
+        base_url_func: Functie die de server URL teruggeeft (voor 'next' links)
+        total: Totaal aantal features in de collectie
+        origin: RD coordinaat van de eerste feature
+        spacing: Afstand tussen features in meters
+    """
+    per_row = 100
+
+    def handler(path):
+        parsed = urlparse(path)
+        query = parse_qs(parsed.query)
+        limit = int(query.get('limit', ['10'])[0])
+        offset = int(query.get('offset', ['0'])[0])
+        end = min(total, offset + limit)
+        features = [make_square_feature(i, origin[0] + (i % per_row) * spacing, origin[1] + (i // per_row) * spacing)
+                    for i in range(offset, end)]
+        links = []
+        if end < total:
+            links.append({'rel': 'next', 'type': 'application/geo+json',
+                          'href': '{}{}?limit={}&offset={}&f=json'.format(base_url_func(), parsed.path, limit, end)})
+        body = {'type': 'FeatureCollection', 'numberReturned': len(features), 'features': features, 'links': links}
+        return 200, 'application/geo+json', json.dumps(body).encode('utf-8')
+    return handler
+
+
+def wfs_handler(extent=(99000.0, 424000.0, 101000.0, 426000.0), spacing=10.0, size=12.0,
+                server_cap=1000, report_matched=True):
+    """Route handler voor WFS 2.0 GetFeature met BBOX/COUNT/STARTINDEX.
+
+    Features zijn vierkanten op een raster; met size > spacing overlappen ze
+    tilegrenzen, zodat ontdubbeling meetbaar is.
+
+    Args:
+        extent: Gebied waarin features liggen (minx, miny, maxx, maxy)
+        spacing: Rasterafstand in meters
+        size: Zijde van elk vierkant in meters
+        server_cap: Maximaal aantal features per response (zoals een echte server)
+        report_matched: Of numberMatched in de response staat
+    """
+    cols = int((extent[2] - extent[0]) / spacing)
+    rows = int((extent[3] - extent[1]) / spacing)
+
+    def handler(path):
+        query = dict((k.upper(), v[0]) for k, v in parse_qs(urlparse(path).query).items())
+        minx, miny, maxx, maxy = [float(v) for v in query['BBOX'].split(',')[:4]]
+        count = min(int(query.get('COUNT', server_cap)), server_cap)
+        start = int(query.get('STARTINDEX', 0))
+        c0 = max(0, int((minx - size - extent[0]) // spacing))
+        c1 = min(cols - 1, int((maxx - extent[0]) // spacing))
+        r0 = max(0, int((miny - size - extent[1]) // spacing))
+        r1 = min(rows - 1, int((maxy - extent[1]) // spacing))
+        matched = []
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                x = extent[0] + c * spacing
+                y = extent[1] + r * spacing
+                if x < maxx and x + size > minx and y < maxy and y + size > miny:
+                    matched.append((r * cols + c, x, y))
+        page = [make_square_feature(i, x, y, size) for i, x, y in matched[start:start + count]]
+        body = {'type': 'FeatureCollection', 'numberReturned': len(page), 'features': page}
+        if report_matched:
+            body['numberMatched'] = len(matched)
+        return 200, 'application/json', json.dumps(body).encode('utf-8')
+    return handler
+
+
+CITYJSON_SCALE = [0.001, 0.001, 0.001]
+CITYJSON_TRANSLATE = [99000.0, 424000.0, 0.0]
+
+
+def cityjson_header():
+    """CityJSON header object (eerste regel van een CityJSONSeq stroom)."""
+    return {'type': 'CityJSON', 'version': '2.0',
+            'transform': {'scale': CITYJSON_SCALE, 'translate': CITYJSON_TRANSLATE},
+            'CityObjects': {}, 'vertices': []}
+
+
+def make_cityjson_feature(index, x, y, width=8.0, depth=10.0, height=9.0, ridge=3.0, segments=1):
+    """CityJSONFeature met een eenvoudig zadeldak-gebouw (LOD 1.2 + 2.2).
+
+    Args:
+        index: Volgnummer (voor de identificatie)
+        x, y: Linkeronderhoek in meters t.o.v. CITYJSON_TRANSLATE
+        segments: Aantal coplanaire stroken per lange gevel (zoals 3D BAG
+            gevels die door aangrenzende dakdelen opgeknipt zijn)
+    """
+    vertices = []
+
+    def v(px, py, pz):
+        vertices.append([int(round(px / CITYJSON_SCALE[0])), int(round(py / CITYJSON_SCALE[1])),
+                         int(round(pz / CITYJSON_SCALE[2]))])
+        return len(vertices) - 1
+
+    x1, y1, ym = x + width, y + depth, y + depth / 2.0
+    xs = [x + width * k / float(segments) for k in range(segments + 1)]
+    bf = [v(px, y, 0) for px in xs]
+    bb = [v(px, y1, 0) for px in xs]
+    tf = [v(px, y, height) for px in xs]
+    tb = [v(px, y1, height) for px in xs]
+    r0, r1 = v(x, ym, height + ridge), v(x1, ym, height + ridge)
+    floor = [[[bf[0]] + bb + bf[:0:-1]]]
+    front = [[[bf[k], bf[k + 1], tf[k + 1], tf[k]]] for k in range(segments)]
+    back = [[[bb[k + 1], bb[k], tb[k], tb[k + 1]]] for k in range(segments)]
+    lod22 = [floor + front + [[[bf[-1], bb[-1], tb[-1], r1, tf[-1]]]] + back +
+             [[[bb[0], bf[0], tf[0], r0, tb[0]]], [tf + [r1, r0]], [[tb[0], r0, r1] + tb[:0:-1]]]]
+    lod12 = [floor + front + [[[bf[-1], bb[-1], tb[-1], tf[-1]]]] + back +
+             [[[bb[0], bf[0], tf[0], tb[0]]], [tf + tb[::-1]]]]
+    pand_id = 'NL.IMBAG.Pand.{:016d}'.format(index)
+    part_id = pand_id + '-0'
+    return {
+        'type': 'CityJSONFeature',
+        'id': pand_id,
+        'CityObjects': {
+            pand_id: {'type': 'Building', 'children': [part_id], 'attributes': {},
+                      'geometry': [{'type': 'MultiSurface', 'lod': '0', 'boundaries': [[[bf[0], bf[-1], bb[-1], bb[0]]]]}]},
+            part_id: {'type': 'BuildingPart', 'parents': [pand_id], 'attributes': {},
+                      'geometry': [{'type': 'Solid', 'lod': '1.2', 'boundaries': lod12},
+                                   {'type': 'Solid', 'lod': '2.2', 'boundaries': lod22}]},
+        },
+        'vertices': vertices,
+    }
+
+
+def iter_cityjson_features(count, per_row=50, spacing=12.0, segments=1, variants=0):
+    """Genereer count synthetische CityJSONFeatures op een raster.
+
+    Met variants > 0 krijgen de gebouwen per rij zoveel verschillende
+    goothoogtes (rijtjeshuizen met enkele varianten); 0 = allemaal gelijk.
+    """
+    for i in range(count):
+        height = 9.0 + (i % variants) * 0.5 if variants else 9.0
+        yield make_cityjson_feature(i, (i % per_row) * spacing, (i // per_row) * spacing, height=height,
+                                    segments=segments)
+
+
+def make_parcel_features(cols=20, rows=20, size=25.0, points_per_edge=20, jitter=0.01, seed=1,
+                         origin=(99000.0, 424000.0)):
+    """Raster van aangrenzende percelen met verdichte, licht verstoorde randen.
+
+    Gedeelde randen hebben in beide percelen exact dezelfde tussenpunten
+    (zoals kadastrale percelen), zodat ontdubbeling meetbaar is.
+
+    Returns:
+        List van GeoJSON Polygon features
+    """
+    rng = random.Random(seed)
+    edges = {}
+
+    def edge(a, b):
+        key = (min(a, b), max(a, b))
+        if key not in edges:
+            (ax, ay), (bx, by) = [(origin[0] + p[0] * size, origin[1] + p[1] * size) for p in key]
+            points = [(ax, ay)]
+            for k in range(1, points_per_edge):
+                t = k / float(points_per_edge)
+                points.append((ax + (bx - ax) * t + rng.uniform(-jitter, jitter),
+                               ay + (by - ay) * t + rng.uniform(-jitter, jitter)))
+            points.append((bx, by))
+            edges[key] = points
+        points = edges[key]
+        return points if key[0] == a else points[::-1]
+
+    features = []
+    for r in range(rows):
+        for c in range(cols):
+            corners = [(c, r), (c + 1, r), (c + 1, r + 1), (c, r + 1)]
+            ring = []
+            for i in range(4):
+                ring.extend(edge(corners[i], corners[(i + 1) % 4])[:-1])
+            ring.append(ring[0])
+            feature = make_square_feature(r * cols + c, 0, 0)
+            feature['geometry']['coordinates'] = [[list(p) for p in ring]]
+            features.append(feature)
+    return features
+
+
+def make_geotiff(width, height, values, nodata=None, compress=False):
+    """Maak een float32 GeoTIFF (een strip per rij, optioneel Deflate).
+
+    Returns:
+        TIFF bestand als bytes (little-endian)
+    """
+    rows = [struct.pack('<{}f'.format(width), *values[r * width:(r + 1) * width]) for r in range(height)]
+    if compress:
+        rows = [zlib.compress(row) for row in rows]
+    nodata_text = (repr(float(nodata)).encode('ascii') + b'\0') if nodata is not None else None
+    entries = [(256, 4, 1, width), (257, 4, 1, height), (258, 3, 1, 32), (259, 3, 1, 8 if compress else 1),
+               (262, 3, 1, 1), (273, 4, height, None), (277, 3, 1, 1), (278, 4, 1, 1),
+               (279, 4, height, None), (339, 3, 1, 3)]
+    if nodata_text is not None:
+        entries.append((42113, 2, len(nodata_text), None))
+    ifd_size = 2 + 12 * len(entries) + 4
+    extra_offset = 8 + ifd_size
+    offsets_at = extra_offset
+    counts_at = offsets_at + 4 * height
+    nodata_at = counts_at + 4 * height
+    data_at = nodata_at + (len(nodata_text) if nodata_text else 0)
+    offsets, position = [], data_at
+    for row in rows:
+        offsets.append(position)
+        position += len(row)
+    out = [b'II*\x00', struct.pack('<I', 8), struct.pack('<H', len(entries))]
+    for tag, kind, count, value in entries:
+        if tag == 273:
+            value = offsets[0] if height == 1 else offsets_at
+        elif tag == 279:
+            value = len(rows[0]) if height == 1 else counts_at
+        elif tag == 42113:
+            value = nodata_at if len(nodata_text) > 4 else struct.unpack('<I', nodata_text.ljust(4, b'\0'))[0]
+        if kind == 3 and count == 1:
+            out.append(struct.pack('<HHIHH', tag, kind, count, value, 0))
+        else:
+            out.append(struct.pack('<HHII', tag, kind, count, value))
+    out.append(struct.pack('<I', 0))
+    out.append(struct.pack('<{}I'.format(height), *offsets))
+    out.append(struct.pack('<{}I'.format(height), *[len(row) for row in rows]))
+    if nodata_text:
+        out.append(nodata_text)
+    return b''.join(out) + b''.join(rows)
+
+
+def dem_height(x, y):
+    """Nep-maaiveld (m NAP): glooiing, een dijk en gaten (NoData) onder gebouwen."""
+    z = 1.5 * math.sin(x / 70.0) * math.cos(y / 55.0) + 0.004 * (x % 1000.0)
+    dike = abs((x - y) % 400.0 - 200.0)
+    if dike < 15.0:
+        z += 4.0 * (1.0 - dike / 15.0)
+    if (x % 60.0) < 14.0 and (y % 60.0) < 12.0:
+        return None
+    return z
+
+
+def wcs_dem_handler(nodata=-9999.0, compress=True, max_px=4000):
+    """Route handler voor WCS 2.0.1 GetCoverage (SUBSET/SCALESIZE) met dem_height als GeoTIFF."""
+    pattern = re.compile(r'([xy])\(([^,)]+)(?:,([^)]+))?\)')
+
+    def handler(path):
+        query = parse_qs(urlparse(path).query)
+        subset = dict((axis, (float(lo), float(hi))) for axis, lo, hi in
+                      (pattern.match(item).groups() for item in query['SUBSET']))
+        size = dict((axis, int(float(lo))) for axis, lo, _ in pattern.findall(query['SCALESIZE'][0]))
+        width, height = size['x'], size['y']
+        if width > max_px or height > max_px:
+            return 400, 'application/xml', b'<ows:ExceptionReport>Raster size out of range</ows:ExceptionReport>'
+        (minx, maxx), (miny, maxy) = subset['x'], subset['y']
+        res_x, res_y = (maxx - minx) / width, (maxy - miny) / height
+        values = []
+        for j in range(height):
+            y = maxy - (j + 0.5) * res_y
+            for i in range(width):
+                z = dem_height(minx + (i + 0.5) * res_x, y)
+                values.append(nodata if z is None else z)
+        return 200, 'image/tiff', make_geotiff(width, height, values, nodata, compress)
+    return handler
+
+
+def cityjson_pages_handler(base_url_func, total=500, per_row=25, segments=1):
+    """Route handler voor 3D BAG /collections/pand/items (CityJSON pagina's met limit/offset)."""
+    header = cityjson_header()
+
+    def handler(path):
+        parsed = urlparse(path)
+        query = parse_qs(parsed.query)
+        limit = int(query.get('limit', ['10'])[0])
+        offset = int(query.get('offset', ['0'])[0])
+        end = min(total, offset + limit)
+        features = [make_cityjson_feature(i, (i % per_row) * 12.0, (i // per_row) * 12.0, segments=segments)
+                    for i in range(offset, end)]
+        links = []
+        if end < total:
+            links.append({'rel': 'next', 'href': '{}{}?limit={}&offset={}'.format(base_url_func(), parsed.path, limit, end)})
+        body = {'type': 'FeatureCollection', 'metadata': {'transform': header['transform']},
+                'features': features, 'links': links}
+        return 200, 'application/city+json', json.dumps(body).encode('utf-8')
+    return handler
+
+
+def locatieserver_handler(count=5):
+    """Route handler voor PDOK Locatieserver free/suggest/lookup (nep-adressen)."""
+    def handler(path):
+        parsed = urlparse(path)
+        query = parse_qs(parsed.query)
+        text = query.get('q', query.get('id', ['']))[0]
+        rows = min(count, int(query.get('rows', [str(count)])[0]))
+        docs = []
+        for i in range(rows):
+            doc = {'id': 'adr-{}-{}'.format(abs(hash(text)) % 100000, i), 'type': 'adres',
+                   'weergavenaam': u'{} {}'.format(text, i + 1)}
+            if not parsed.path.endswith('/suggest'):
+                doc['centroide_rd'] = 'POINT({} {})'.format(99000 + i * 10, 424000 + i * 10)
+            docs.append(doc)
+        body = {'response': {'numFound': len(docs), 'start': 0, 'docs': docs}}
+        return 200, 'application/json', json.dumps(body).encode('utf-8')
+    return handler
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP client voor GIS2BIM - gedeelde verbindingen, compressie en revalidatie
+Alle service requests (WMTS, WMS, WFS, OGC API, Locatieserver, 3D BAG) lopen
+via een HttpClient:
+- keep-alive verbindingen per host worden hergebruikt in plaats van per
+  request een nieuwe TCP/TLS verbinding op te zetten
+- 'Accept-Encoding: gzip, deflate'; gecomprimeerde bodies worden uitgepakt
+- van responses met een ETag of Last-Modified worden alleen die validators
+  bewaard; heeft de aanroeper nog een (verlopen) kopie van de body, bijv. in
+  zijn TileCache, dan wordt met If-None-Match / If-Modified-Since
+  gerevalideerd (304 = die kopie, geen download)
+- per host een maximum aantal gelijktijdige requests
+
+Het eigenlijke versturen gebeurt door een transport: PooledTransport
+(httplib/http.client) buiten Revit, script.py levert een .NET transport.
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    from urlparse import urlparse, urljoin
+except ImportError:
+    from urllib.parse import urlparse, urljoin
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+from tile_cache import default_cache_dir
+
+
+USER_AGENT = "Mozilla/5.0 GIS2BIM/PyRevit"
+DEFAULT_TIMEOUT = 60
+DEFAULT_MAX_PER_HOST = 6
+DEFAULT_MAX_REDIRECTS = 5
+VALIDATOR_MAX_ENTRIES = 50000
+VALIDATOR_NAME = 'validators.json'
+VALIDATOR_TTL = 90 * 24 * 3600
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class HttpError(IOError):
+    """Response met een foutstatus (>= 400)."""
+
+    def __init__(self, status, url, body=b''):
+        IOError.__init__(self, "HTTP {} voor {}".format(status, url))
+        self.status = status
+        self.url = url
+        self.body = body
+
+
+def decode_body(body, encoding):
+    """Pak een body uit volgens de Content-Encoding (gzip, deflate of leeg)."""
+    encoding = (encoding or '').strip().lower()
+    if not body or encoding in ('', 'identity'):
+        return body
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        # Volgens de RFC met zlib header; sommige servers sturen raw deflate
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    raise IOError("Onbekende Content-Encoding: {}".format(encoding))
+
+
+def host_of(url):
+    parsed = urlparse(url)
+    return parsed.netloc.lower()
+
+
+class HttpStats(object):
+    """Tellers van een HttpClient (thread-safe via add)."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.reused = 0
+        self.not_modified = 0
+        self.redirects = 0
+        self.errors = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+        self.saved_bytes = 0
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self):
+        return "{} requests over {} verbindingen ({} hergebruikt), {} x 304, {:.0f} kB over de lijn voor {:.0f} kB aan bodies, {:.1f}s wachten op een vrije verbinding".format(
+            self.requests, self.connections, self.reused, self.not_modified, self.wire_bytes / 1024.0,
+            (self.body_bytes + self.saved_bytes) / 1024.0, self.wait_seconds)
+
+
+class ValidatorStore(object):
+    """ETag/Last-Modified per URL, zonder bodies.
+
+    De body bij een 304 is de kopie die de aanroeper zelf nog heeft (zie
+    HttpClient.fetch_bytes en TileCache.wrap), zodat bodies niet nog een keer
+    bewaard worden. Met een pad worden de validators als JSON bewaard, zodat
+    ook een volgende Revit sessie kan revalideren; maximaal max_entries URLs,
+    oudste eerst eruit.
+    """
+
+    def __init__(self, path=None, max_entries=VALIDATOR_MAX_ENTRIES, ttl=VALIDATOR_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # url -> [etag, last_modified, tijd], oudste eerst
+        self._entries = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        now = time.time()
+        for url, entry in sorted(data.items(), key=lambda item: item[1][2]):
+            if now - entry[2] <= self.ttl:
+                self._entries[url] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url):
+        """(etag, last_modified) voor url, of None."""
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None or time.time() - entry[2] > self.ttl:
+            return None
+        return entry[0], entry[1]
+
+    def put(self, url, etag, last_modified):
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if etag or last_modified:
+                self._entries[url] = [etag, last_modified, time.time()]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            elif old is None:
+                return
+            self._dirty = True
+
+    def flush(self):
+        """Schrijf de validators naar schijf als er iets veranderd is."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = dict(self._entries)
+            self._dirty = False
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp_path, self.path)
+
+
+def default_validator_store():
+    return ValidatorStore(os.path.join(default_cache_dir('http_validators'), VALIDATOR_NAME))
+
+
+class PooledTransport(object):
+    """Keep-alive verbindingen per (schema, host) via httplib/http.client.
+
+    Een verbinding wordt na een volledig gelezen response teruggelegd in de
+    pool van zijn host. Mislukt een request op een hergebruikte verbinding
+    (door de server gesloten), dan wordt het een keer op een nieuwe
+    verbinding herhaald.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_idle=DEFAULT_MAX_PER_HOST):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, netloc):
+        if scheme == 'https':
+            return httplib.HTTPSConnection(netloc, timeout=self.timeout)
+        return httplib.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _acquire(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        return self._connect(scheme, netloc), False
+
+    def _release(self, scheme, netloc, connection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, url, headers, context=None):
+        """Verstuur een GET.
+
+        Args:
+            url: Absolute http(s) URL
+            headers: Dict met request headers
+            context: Optionele dict; bevat tijdens het request de verbinding
+                (voor abort vanuit een andere thread)
+
+        Returns:
+            Tuple (status, response headers met kleine letters, ruwe body,
+            verbinding hergebruikt; None als het transport dat niet weet)
+        """
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        connection, reused = self._acquire(parsed.scheme, parsed.netloc)
+        while True:
+            if context is not None:
+                context['connection'] = connection
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+                break
+            except (httplib.HTTPException, IOError, OSError):
+                connection.close()
+                if not reused or (context is not None and context.get('aborted')):
+                    raise
+                connection, reused = self._connect(parsed.scheme, parsed.netloc), False
+        response_headers = dict((name.lower(), value) for name, value in response.getheaders())
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(parsed.scheme, parsed.netloc, connection)
+        return response.status, response_headers, body, reused
+
+    def abort(self, context):
+        context['aborted'] = True
+        connection = context.get('connection')
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        with self._lock:
+            pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            for connection in idle:
+                connection.close()
+
+
+class HttpClient(object):
+    """Gedeelde HTTP client met compressie, revalidatie en limieten per host.
+
+    Args:
+        transport: Object met request(url, headers, context) en
+            abort(context), zie PooledTransport (standaard)
+        validators: ValidatorStore voor ETag/Last-Modified (None = uit)
+        max_per_host: Maximaal aantal gelijktijdige requests per host
+        host_limits: Optioneel dict host -> limiet (overschrijft max_per_host)
+    """
+
+    def __init__(self, transport=None, validators=None, max_per_host=DEFAULT_MAX_PER_HOST, host_limits=None,
+                 user_agent=USER_AGENT):
+        self.transport = transport or PooledTransport(max_idle=max_per_host)
+        self.validators = validators
+        self.max_per_host = max_per_host
+        self.host_limits = dict(host_limits or {})
+        self.user_agent = user_agent
+        self.stats = HttpStats()
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, host):
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(self.host_limits.get(host, self.max_per_host))
+            return slot
+
+    def _headers(self, url, cached):
+        headers = {'User-Agent': self.user_agent, 'Accept-Encoding': 'gzip, deflate'}
+        stored = None
+        if cached is not None and self.validators is not None:
+            stored = self.validators.get(url)
+        if stored is not None:
+            etag, last_modified = stored
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers, stored
+
+    def fetch_bytes(self, url, context=None, cached=None):
+        """Download een URL en geef de (uitgepakte) body als bytes.
+
+        Redirects worden gevolgd; een status >= 400 geeft een HttpError.
+
+        Args:
+            url: Absolute http(s) URL
+            context: Zie PooledTransport.request
+            cached: Optioneel een eerder gedownloade body van deze URL (bijv.
+                een verlopen cache entry); met bewaarde validators wordt dan
+                gerevalideerd en bij een 304 deze body teruggegeven
+        """
+        for _ in range(DEFAULT_MAX_REDIRECTS + 1):
+            headers, stored = self._headers(url, cached)
+            slot = self._slot(host_of(url))
+            start = time.time()
+            slot.acquire()
+            waited = time.time() - start
+            try:
+                status, response_headers, raw, reused = self.transport.request(url, headers, context)
+            except Exception:
+                self.stats.add(requests=1, errors=1, wait_seconds=waited)
+                raise
+            finally:
+                slot.release()
+            self.stats.add(requests=1, wait_seconds=waited, wire_bytes=len(raw),
+                           connections=1 if reused is False else 0, reused=1 if reused else 0)
+            if status == 304 and stored is not None:
+                self.stats.add(not_modified=1, saved_bytes=len(cached))
+                return cached
+            if status in REDIRECT_CODES and response_headers.get('location'):
+                self.stats.add(redirects=1)
+                url = urljoin(url, response_headers['location'])
+                continue
+            if status >= 400:
+                self.stats.add(errors=1)
+                raise HttpError(status, url, raw)
+            body = decode_body(raw, response_headers.get('content-encoding'))
+            self.stats.add(body_bytes=len(body))
+            if self.validators is not None and status == 200:
+                self.validators.put(url, response_headers.get('etag'), response_headers.get('last-modified'))
+            return body
+        raise HttpError(status, url)
+
+    def fetch_text(self, url, context=None, cached=None):
+        """Als fetch_bytes, als tekst; bij een 304 is het resultaat cached zelf."""
+        encoded = cached.encode('utf-8') if cached is not None else None
+        body = self.fetch_bytes(url, context, encoded)
+        if encoded is not None and body is encoded:
+            return cached
+        return body.decode('utf-8')
+
+    def open_request(self):
+        """(fetch_text, abort) voor een afbreekbaar request, zie geocoder.AutoComplete."""
+        context = {}
+
+        def fetch(url):
+            return self.fetch_text(url, context)
+
+        def abort():
+            self.transport.abort(context)
+        return fetch, abort
+
+    def close(self):
+        if self.validators is not None:
+            self.validators.flush()
+        close = getattr(self.transport, 'close', None)
+        if close is not None:
+            close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """De gedeelde client van dit proces (PooledTransport, revalidatie op schijf)."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient(validators=default_validator_store())
+        return _default_client
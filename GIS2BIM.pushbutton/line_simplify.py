@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Lijn vereenvoudiging voor GIS2BIM - voorbewerking voor detail lines
+Polygoonringen worden in bogen tussen knooppunten opgeknipt, zodat een rand
+die door twee percelen gedeeld wordt maar een keer getekend wordt. Elke boog
+wordt met Douglas-Peucker vereenvoudigd (begin- en eindpunt blijven staan),
+waarmee ook (bijna) collineaire segmenten samengevoegd worden en aangrenzende
+polygonen op dezelfde manier vereenvoudigd blijven.
+"""
+
+import math
+
+
+DEFAULT_TOLERANCE = 0.05
+DEFAULT_SNAP = 0.001
+COLLINEAR_EPSILON = 1e-6
+# Features per pagina bij stroomsgewijze verwerking
+DEFAULT_PAGE_SIZE = 1000
+
+
+class LineStats(object):
+    """Aantal segmenten voor en na vereenvoudiging."""
+
+    def __init__(self):
+        self.rings = 0
+        self.segments_in = 0
+        self.segments_out = 0
+        self.shared_segments = 0
+
+    @property
+    def reduction(self):
+        if not self.segments_in:
+            return 0.0
+        return 1.0 - float(self.segments_out) / self.segments_in
+
+    def summary(self):
+        return "{} ringen: {} -> {} segmenten ({} gedeelde segmenten overgeslagen, {:.0f}% minder)".format(
+            self.rings, self.segments_in, self.segments_out, self.shared_segments, self.reduction * 100.0)
+
+
+def extract_polygon_rings(geometry):
+    """Buitenringen van een GeoJSON (Multi)Polygon als lists van (x, y)."""
+    geom_type = geometry.get('type', '')
+    coords = geometry.get('coordinates', [])
+    rings = []
+    if geom_type == 'Polygon' and coords and coords[0]:
+        rings.append([(c[0], c[1]) for c in coords[0]])
+    elif geom_type == 'MultiPolygon' and coords:
+        for poly in coords:
+            if poly and poly[0]:
+                rings.append([(c[0], c[1]) for c in poly[0]])
+    return rings
+
+
+def douglas_peucker(points, tolerance):
+    """Vereenvoudig een open polyline; begin- en eindpunt blijven staan.
+
+    Args:
+        points: List van (x, y)
+        tolerance: Maximale afwijking in meters
+
+    Returns:
+        List van de overgebleven punten
+    """
+    count = len(points)
+    if count < 3:
+        return list(points)
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[first]
+        bx, by = points[last]
+        dx, dy = bx - ax, by - ay
+        length = math.sqrt(dx * dx + dy * dy)
+        best = -1.0
+        index = -1
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length == 0:
+                d = math.sqrt((px - ax) * (px - ax) + (py - ay) * (py - ay))
+            else:
+                d = abs(dx * (py - ay) - dy * (px - ax)) / length
+            if d > best:
+                best = d
+                index = i
+        if index >= 0 and best > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+class LineSimplifier(object):
+    """Vereenvoudigt polygoonranden pagina voor pagina (zie add).
+
+    Binnen een pagina worden de lijnen bij knooppunten (punten met meer of
+    minder dan twee buren) in bogen opgeknipt, zodat aangrenzende polygonen
+    dezelfde vereenvoudiging krijgen. Over pagina's heen wordt alleen de set
+    al getekende segmenten (gesnapt, richting-onafhankelijk) bewaard: een rand
+    die met een polygoon van een eerdere pagina gedeeld wordt, wordt
+    overgeslagen. Features en ringen van eerdere pagina's zijn niet meer
+    nodig. Een knooppunt met een buur op een latere pagina kan daarbij binnen
+    de tolerantie verschoven zijn.
+
+    Args:
+        tolerance: Douglas-Peucker tolerantie in meters (0 = alleen collineaire
+            punten samenvoegen)
+        snap: Afronding voor het herkennen van gedeelde punten
+        stats: Optioneel LineStats object
+    """
+
+    def __init__(self, tolerance=DEFAULT_TOLERANCE, snap=DEFAULT_SNAP, stats=None):
+        self.tolerance = max(tolerance, COLLINEAR_EPSILON)
+        self.snap = snap
+        self.stats = stats
+        self.drawn = set()
+
+    def _keyed(self, line):
+        points = []
+        for x, y in line:
+            key = (int(round(x / self.snap)), int(round(y / self.snap)))
+            if not points or points[-1][0] != key:
+                points.append((key, (x, y)))
+        closed = len(points) > 2 and points[0][0] == points[-1][0]
+        if closed:
+            points.pop()
+        return points, closed
+
+    def add(self, lines):
+        """Vereenvoudig een pagina lijnen.
+
+        Args:
+            lines: Iterable van ringen (gesloten: eerste punt = laatste punt) of
+                open polylines (bijv. op de bbox geclipte delen), lists van (x, y)
+
+        Returns:
+            List van polylines (lists van (x, y)) die nog niet getekend waren
+        """
+        keyed = []
+        neighbours = {}
+        for line in lines:
+            points, closed = self._keyed(line)
+            if len(points) < (3 if closed else 2):
+                continue
+            segments = len(points) if closed else len(points) - 1
+            if self.stats is not None:
+                self.stats.rings += 1
+                self.stats.segments_in += segments
+            keyed.append((points, closed))
+            for i in range(segments):
+                a, b = points[i][0], points[(i + 1) % len(points)][0]
+                neighbours.setdefault(a, set()).add(b)
+                neighbours.setdefault(b, set()).add(a)
+        polylines = []
+        for points, closed in keyed:
+            polylines.extend(self._arcs(points, closed, neighbours))
+        return polylines
+
+    def _arcs(self, points, closed, neighbours):
+        count = len(points)
+        segments = count if closed else count - 1
+        new = []
+        for i in range(segments):
+            a, b = points[i][0], points[(i + 1) % count][0]
+            segment = (a, b) if a < b else (b, a)
+            if segment in self.drawn:
+                new.append(False)
+            else:
+                self.drawn.add(segment)
+                new.append(True)
+        if self.stats is not None:
+            self.stats.shared_segments += segments - sum(new)
+
+        # Bogen beginnen bij een knooppunt of na een al getekend segment
+        if closed:
+            starts = [i for i in range(count) if len(neighbours[points[i][0]]) != 2 or not new[i - 1]]
+            if not starts:
+                starts = [min(range(count), key=lambda i: points[i][0])]
+            runs = [(start, (starts[(n + 1) % len(starts)] - start) % count or count)
+                    for n, start in enumerate(starts)]
+        else:
+            starts = [0] + [i for i in range(1, count - 1)
+                            if len(neighbours[points[i][0]]) != 2 or not new[i - 1]]
+            ends = starts[1:] + [count - 1]
+            runs = [(start, end - start) for start, end in zip(starts, ends)]
+
+        polylines = []
+        for start, length in runs:
+            arc = [points[start]]
+            for k in range(length):
+                if not new[(start + k) % segments]:
+                    break
+                arc.append(points[(start + k + 1) % count])
+            if len(arc) < 2:
+                continue
+            coords = [p for _, p in arc]
+            simplified = douglas_peucker(coords, self.tolerance)
+            if arc[0][0] == arc[-1][0] and len(simplified) < 4:
+                simplified = douglas_peucker(coords, COLLINEAR_EPSILON)
+            polylines.append(simplified)
+            if self.stats is not None:
+                self.stats.segments_out += len(simplified) - 1
+        return polylines
+
+
+def iter_pages(items, size):
+    """Groepeer een stroom in lists van maximaal size elementen."""
+    page = []
+    for item in items:
+        page.append(item)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def simplify_rings(rings, tolerance=DEFAULT_TOLERANCE, snap=DEFAULT_SNAP, stats=None):
+    """Zet polygoonringen in een keer om in vereenvoudigde, unieke polylines.
+
+    Zie LineSimplifier; alle ringen vormen hier een pagina.
+
+    Returns:
+        List van polylines (lists van (x, y))
+    """
+    return LineSimplifier(tolerance, snap, stats).add(rings)
+
+
+def simplify_features(features, tolerance=DEFAULT_TOLERANCE, stats=None, page_size=DEFAULT_PAGE_SIZE):
+    """Vereenvoudig de polygoonranden van een stroom GeoJSON features, per page_size features.
+
+    Yields:
+        Polylines, per pagina zodra die verwerkt is
+    """
+    simplifier = LineSimplifier(tolerance, stats=stats)
+    for page in iter_pages(features, page_size):
+        rings = []
+        for feature in page:
+            rings.extend(extract_polygon_rings(feature.get('geometry') or {}))
+        for polyline in simplifier.add(rings):
+            yield polyline
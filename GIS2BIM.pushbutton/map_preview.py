@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Map Preview voor GIS2BIM - WMTS tile piramide voor de locatiekiezer
+Kiest per zoomstand het passende WMTS niveau, houdt gedecodeerde tiles in een
+LRU geheugencache en downloadt bij pannen/zoomen alleen de ontbrekende tiles.
+In de UI worden tiles uit het geheugen of de schijfcache direct getekend
+(ontbrekende tiles met een grovere tile als voorlopig beeld); de downloads
+lopen via een TileLoader in een achtergrond thread.
+Het samenstellen van het beeld gebeurt door de aanroeper (System.Drawing).
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+from tile_fetcher import fetch_tiles, wmts_tile_url, DEFAULT_MAX_WORKERS
+
+
+DEFAULT_MAX_TILES = 256
+
+
+class TilePlacement(object):
+    """Een tile in het preview beeld: bron (zoom, rij, kolom) en doel in pixels."""
+
+    def __init__(self, zoom, row, col, x, y, size):
+        self.zoom = zoom
+        self.row = row
+        self.col = col
+        self.x = x
+        self.y = y
+        self.size = size
+
+    @property
+    def key(self):
+        return (self.zoom, self.row, self.col)
+
+
+class TilePyramid(object):
+    """Preview engine over een WMTS service in EPSG:28992.
+
+    Args:
+        base_url, layer_name: WMTS service en laag
+        resolutions: Dict zoomlevel -> meter per pixel
+        origin_x, origin_y: Linkerbovenhoek van de tile matrix set
+        fetch_func: Functie url -> bytes (bijv. TileCache.wrap(...))
+        decode_func: Functie bytes -> afbeelding (bijv. Bitmap)
+        tile_px: Tile grootte in pixels
+        max_tiles: Maximaal aantal gedecodeerde tiles in het geheugen
+        cached_func: Optionele functie url -> bytes of None die alleen een
+            lokale cache raadpleegt (geen netwerk), voor take_ready
+    """
+
+    def __init__(self, base_url, layer_name, resolutions, origin_x, origin_y,
+                 fetch_func, decode_func, tile_px=256, max_tiles=DEFAULT_MAX_TILES,
+                 max_workers=DEFAULT_MAX_WORKERS, dispose_func=None, cached_func=None):
+        self.base_url = base_url
+        self.layer_name = layer_name
+        self.resolutions = resolutions
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.fetch_func = fetch_func
+        self.decode_func = decode_func
+        self.tile_px = tile_px
+        self.max_tiles = max_tiles
+        self.max_workers = max_workers
+        self.dispose_func = dispose_func
+        self.cached_func = cached_func
+        self.tiles = OrderedDict()
+        self.failed = set()
+        self.fetched = 0
+        self.reused = 0
+
+    def choose_zoom(self, meters_per_pixel):
+        """Grofste zoomlevel dat minstens de gevraagde resolutie levert."""
+        best = max(self.resolutions)
+        for zoom in sorted(self.resolutions):
+            if self.resolutions[zoom] <= meters_per_pixel:
+                return zoom
+        return best
+
+    def layout(self, center_x, center_y, extent_m, image_px):
+        """Bepaal welke tiles het vierkante beeld rond het centrum bedekken.
+
+        Args:
+            center_x, center_y: Centrum in RD meters
+            extent_m: Zijde van het beeld in meters
+            image_px: Zijde van het beeld in pixels
+
+        Returns:
+            List van TilePlacement objecten
+        """
+        zoom = self.choose_zoom(extent_m / float(image_px))
+        tile_m = self.tile_px * self.resolutions[zoom]
+        px_per_m = image_px / float(extent_m)
+        min_x = center_x - extent_m / 2.0
+        max_y = center_y + extent_m / 2.0
+        col0 = int(math.floor((min_x - self.origin_x) / tile_m))
+        col1 = int(math.floor((min_x + extent_m - self.origin_x) / tile_m))
+        row0 = int(math.floor((self.origin_y - max_y) / tile_m))
+        row1 = int(math.floor((self.origin_y - max_y + extent_m) / tile_m))
+        placements = []
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                left = (self.origin_x + col * tile_m - min_x) * px_per_m
+                top = (max_y - (self.origin_y - row * tile_m)) * px_per_m
+                placements.append(TilePlacement(zoom, row, col, left, top, tile_m * px_per_m))
+        return placements
+
+    def _remember(self, key, image):
+        self.tiles[key] = image
+        while len(self.tiles) > self.max_tiles:
+            _, old = self.tiles.popitem(last=False)
+            if self.dispose_func and old is not None:
+                self.dispose_func(old)
+
+    def tile_url(self, placement):
+        return wmts_tile_url(self.base_url, self.layer_name, placement.zoom, placement.row, placement.col)
+
+    def _decode(self, payload):
+        if payload is None:
+            return None
+        try:
+            return self.decode_func(payload)
+        except Exception:
+            return None
+
+    def take_ready(self, placements):
+        """Tiles die zonder netwerk beschikbaar zijn (geheugen of cached_func).
+
+        Tiles die eerder mislukten komen als None terug en niet bij de
+        ontbrekende, tot retry_failed().
+
+        Returns:
+            Tuple (dict (zoom, row, col) -> afbeelding of None, ontbrekende
+            placements)
+        """
+        result = {}
+        missing = []
+        for p in placements:
+            if p.key in self.tiles:
+                image = self.tiles.pop(p.key)
+                self.tiles[p.key] = image
+                result[p.key] = image
+                self.reused += 1
+                continue
+            if p.key in self.failed:
+                result[p.key] = None
+                continue
+            image = self._decode(self.cached_func(self.tile_url(p))) if self.cached_func else None
+            if image is None:
+                missing.append(p)
+            else:
+                self._remember(p.key, image)
+                result[p.key] = image
+        return result, missing
+
+    def download(self, placements):
+        """Download en decodeer tiles (parallel).
+
+        Raakt de geheugencache niet aan en mag dus in een achtergrond thread
+        draaien; geef het resultaat daarna op de UI thread aan store().
+
+        Returns:
+            Dict (zoom, row, col) -> afbeelding of None
+        """
+        if not placements:
+            return {}
+        urls = [self.tile_url(p) for p in placements]
+        payloads, _ = fetch_tiles(urls, self.fetch_func, max_workers=self.max_workers, retries=1)
+        return dict((p.key, self._decode(payload)) for p, payload in zip(placements, payloads))
+
+    def store(self, images):
+        """Zet gedownloade tiles (zie download) in de geheugencache."""
+        for key, image in images.items():
+            self.fetched += 1
+            if image is None:
+                self.failed.add(key)
+            else:
+                self.failed.discard(key)
+                self._remember(key, image)
+
+    def retry_failed(self):
+        self.failed.clear()
+
+    def tile(self, key):
+        return self.tiles.get(key)
+
+    def fallback(self, placement):
+        """Grovere tile uit het geheugen die placement bedekt, als voorlopig beeld.
+
+        Returns:
+            Tuple (afbeelding, x, y, zijde) met het bronvierkant in pixels van
+            die afbeelding, of None
+        """
+        resolution = self.resolutions[placement.zoom]
+        tile_m = self.tile_px * resolution
+        x0 = self.origin_x + placement.col * tile_m
+        y0 = self.origin_y - placement.row * tile_m
+        cx, cy = x0 + tile_m / 2.0, y0 - tile_m / 2.0
+        coarser = sorted((z for z in self.resolutions if self.resolutions[z] > resolution),
+                         key=lambda z: self.resolutions[z])
+        for zoom in coarser:
+            parent_m = self.tile_px * self.resolutions[zoom]
+            col = int(math.floor((cx - self.origin_x) / parent_m))
+            row = int(math.floor((self.origin_y - cy) / parent_m))
+            image = self.tiles.get((zoom, row, col))
+            if image is None:
+                continue
+            px_per_m = self.tile_px / parent_m
+            return (image, (x0 - (self.origin_x + col * parent_m)) * px_per_m,
+                    ((self.origin_y - row * parent_m) - y0) * px_per_m, tile_m * px_per_m)
+        return None
+
+    def ensure_tiles(self, placements):
+        """Zorg dat alle tiles van de layout gedecodeerd in het geheugen staan.
+
+        Alleen ontbrekende tiles worden (parallel) gedownload; bestaande tiles
+        worden hergebruikt en als recent gebruikt gemarkeerd. Blokkeert tot de
+        downloads klaar zijn; de UI gebruikt take_ready en een TileLoader.
+
+        Returns:
+            Dict (zoom, row, col) -> afbeelding of None
+        """
+        result, missing = self.take_ready(placements)
+        images = self.download(missing)
+        self.store(images)
+        result.update(images)
+        return result
+
+
+class TileLoader(object):
+    """Downloadt ontbrekende tiles van een TilePyramid in een achtergrond thread.
+
+    request(placements) vervangt een aanvraag die nog niet gestart is; tiles
+    die al onderweg zijn worden niet nogmaals gevraagd. Na elke aanvraag wordt
+    on_loaded(images, latest) vanuit de thread aangeroepen (in WinForms via
+    BeginInvoke naar de UI thread, die pyramid.store(images) doet en opnieuw
+    tekent); latest is False als er intussen een nieuwere aanvraag is.
+    """
+
+    def __init__(self, pyramid, on_loaded):
+        self.pyramid = pyramid
+        self.on_loaded = on_loaded
+        self.requested = 0
+        self._generation = 0
+        self._pending = None
+        self._in_flight = set()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, placements):
+        with self._cond:
+            self._generation += 1
+            todo = [p for p in placements if p.key not in self._in_flight]
+            self._pending = (self._generation, todo)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                generation, placements = self._pending
+                self._pending = None
+                self._in_flight.update(p.key for p in placements)
+                self.requested += len(placements)
+            try:
+                images = self.pyramid.download(placements)
+            except Exception:
+                images = dict((p.key, None) for p in placements)
+            with self._cond:
+                self._in_flight.difference_update(p.key for p in placements)
+                latest = generation == self._generation
+                if self._closed:
+                    return
+            self.on_loaded(images, latest)
@@ -0,0 +1,540 @@
+# -*- coding: utf-8 -*-
+"""
+Mesh vereenvoudiging voor GIS2BIM - LOD keuze en decimatie voor 3D BAG
+Gebouwen dicht bij het project centrum houden hun detail (LOD 2.2); verder
+weg wordt een lagere LOD gekozen en kunnen coplanaire driehoeken tot een vlak
+worden samengevoegd en vertices op een raster worden geclusterd.
+Gebouwen met dezelfde vorm (op een verschuiving na, zoals rijtjeshuizen)
+krijgen dezelfde vingerafdruk, zodat de mesh maar een keer gebouwd hoeft te
+worden. Als alternatief kunnen alle gebouwen in een vierkante tegel tot een
+mesh samengevoegd worden (een DirectShape per tegel).
+"""
+
+import hashlib
+import math
+import time
+
+from cityjson_parser import polygon_normal, triangulate_surface
+
+
+DEFAULT_NEAR_RADIUS = 250.0
+NEAR_LODS = ('2.2', '1.3', '1.2')
+FAR_LODS = ('1.2', '1.3', '2.2')
+DEFAULT_ANGLE_TOLERANCE = 1.0
+DEFAULT_DISTANCE_TOLERANCE = 0.02
+FINGERPRINT_PRECISION = 0.01
+
+
+class LodSelector(object):
+    """Kiest per CityObject een LOD op basis van de afstand tot het centrum.
+
+    Args:
+        near_radius: Binnen deze afstand (meters) gelden near_lods
+        near_lods, far_lods: LODs in volgorde van voorkeur
+        merge_planar: Coplanaire driehoeken samenvoegen buiten de radius
+        cluster_size: Rastergrootte (m) voor vertex clustering buiten de
+            radius (0 = uit)
+    """
+
+    def __init__(self, near_radius=DEFAULT_NEAR_RADIUS, near_lods=NEAR_LODS, far_lods=FAR_LODS,
+                 merge_planar=True, cluster_size=0.0):
+        self.near_radius = near_radius
+        self.near_lods = tuple(near_lods)
+        self.far_lods = tuple(far_lods)
+        self.merge_planar = merge_planar
+        self.cluster_size = cluster_size
+
+    def is_far(self, distance):
+        return self.near_radius is not None and distance > self.near_radius
+
+    def choose(self, available, distance):
+        """Eerste LOD uit de voorkeurslijst die beschikbaar is, anders None."""
+        for lod in (self.far_lods if self.is_far(distance) else self.near_lods):
+            if lod in available:
+                return lod
+        return None
+
+
+class MeshStats(object):
+    """Aantal driehoeken voor en na vereenvoudiging, per gekozen LOD."""
+
+    def __init__(self):
+        self.buildings = 0
+        self.simplified = 0
+        self.faces_in = 0
+        self.faces_out = 0
+        self.lods = {}
+        self.seconds = 0.0
+
+    def add(self, lod, faces_in, faces_out):
+        self.buildings += 1
+        self.faces_in += faces_in
+        self.faces_out += faces_out
+        self.lods[lod] = self.lods.get(lod, 0) + 1
+
+    @property
+    def reduction(self):
+        if not self.faces_in:
+            return 0.0
+        return 1.0 - float(self.faces_out) / self.faces_in
+
+    def summary(self):
+        lods = ", ".join("LOD {}: {}".format(lod, n) for lod, n in sorted(self.lods.items()))
+        return "{} gebouwen ({}), {} vereenvoudigd, {} -> {} driehoeken ({:.0f}% minder, {:.2f}s)".format(
+            self.buildings, lods or "-", self.simplified, self.faces_in, self.faces_out,
+            self.reduction * 100.0, self.seconds)
+
+
+def _sub(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+
+def _cross(u, v):
+    return (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+
+
+def _length(v):
+    return math.sqrt(v[0] * v[0] + v[1] * v[1] + v[2] * v[2])
+
+
+def _triangle_plane(vertices, triangle):
+    """Eenheidsnormaal, vlak offset en oppervlakte van een driehoek."""
+    pa, pb, pc = vertices[triangle[0]], vertices[triangle[1]], vertices[triangle[2]]
+    n = _cross(_sub(pb, pa), _sub(pc, pa))
+    length = _length(n)
+    if length == 0:
+        return None, 0.0, 0.0
+    n = (n[0] / length, n[1] / length, n[2] / length)
+    return n, n[0] * pa[0] + n[1] * pa[1] + n[2] * pa[2], length / 2.0
+
+
+def _triangles_area(vertices, triangles):
+    return sum(_triangle_plane(vertices, t)[2] for t in triangles)
+
+
+def _boundary_loops(triangles):
+    """Randlussen van een groep driehoeken, of None bij een knooppunt (pinch)."""
+    edges = set()
+    for a, b, c in triangles:
+        edges.update(((a, b), (b, c), (c, a)))
+    following = {}
+    for a, b in edges:
+        if (b, a) in edges:
+            continue
+        if a in following:
+            return None
+        following[a] = b
+    loops = []
+    while following:
+        start, current = following.popitem()
+        loop = [start]
+        while current != start:
+            loop.append(current)
+            current = following.pop(current, None)
+            if current is None:
+                return None
+        loops.append(loop)
+    return loops
+
+
+def _collinear_flags(loop, vertices, tolerance):
+    """Per lus vertex: True als die op de rechte lijn tussen zijn buren ligt."""
+    flags = []
+    count = len(loop)
+    for i in range(count):
+        prev_pt = vertices[loop[i - 1]]
+        pt = vertices[loop[i]]
+        next_pt = vertices[loop[(i + 1) % count]]
+        span = _sub(next_pt, prev_pt)
+        span_length = _length(span)
+        if span_length == 0:
+            flags.append(False)
+            continue
+        offset = _length(_cross(span, _sub(pt, prev_pt))) / span_length
+        flags.append(offset <= tolerance)
+    return flags
+
+
+def _compact(vertices, triangles):
+    """Houd alleen gebruikte vertices over en nummer de driehoeken om."""
+    mapping = {}
+    out_vertices = []
+    out_triangles = []
+    for triangle in triangles:
+        mapped = []
+        for vi in triangle:
+            ni = mapping.get(vi)
+            if ni is None:
+                ni = len(out_vertices)
+                mapping[vi] = ni
+                out_vertices.append(tuple(vertices[vi]))
+            mapped.append(ni)
+        out_triangles.append(tuple(mapped))
+    return out_vertices, out_triangles
+
+
+def merge_planar_faces(vertices, triangles, angle_tolerance=DEFAULT_ANGLE_TOLERANCE,
+                       distance_tolerance=DEFAULT_DISTANCE_TOLERANCE):
+    """Voeg aan elkaar grenzende coplanaire driehoeken samen tot een vlak.
+
+    Per vlak worden de randlussen opnieuw getrianguleerd zonder de vertices
+    die alleen op een rechte rand of binnen het vlak liggen. Een vertex
+    vervalt alleen als hij in alle lussen waarin hij voorkomt overbodig is,
+    zodat aangrenzende vlakken gesloten blijven. Vlakken waarvan de nieuwe
+    triangulatie niet dezelfde oppervlakte heeft, blijven ongewijzigd.
+
+    Args:
+        vertices: Indexeerbare (x, y, z) coordinaten
+        triangles: List van (i, j, k) tuples
+        angle_tolerance: Maximale hoek (graden) tussen normalen in een vlak
+        distance_tolerance: Maximale afstand (m) tot het vlak / de rechte rand
+
+    Returns:
+        Tuple (vertices, triangles) met alleen de gebruikte vertices
+    """
+    cos_tolerance = math.cos(math.radians(angle_tolerance))
+    planes = [_triangle_plane(vertices, t) for t in triangles]
+    parent = list(range(len(triangles)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    edge_faces = {}
+    for ti, (a, b, c) in enumerate(triangles):
+        if planes[ti][0] is None:
+            continue
+        for edge in ((a, b), (b, c), (c, a)):
+            edge_faces.setdefault((min(edge), max(edge)), []).append(ti)
+    for edge, faces in edge_faces.items():
+        if len(faces) != 2:
+            continue
+        t1, t2 = faces
+        n1, d1 = planes[t1][0], planes[t1][1]
+        n2 = planes[t2][0]
+        if n1[0] * n2[0] + n1[1] * n2[1] + n1[2] * n2[2] < cos_tolerance:
+            continue
+        apex = [vi for vi in triangles[t2] if vi not in edge][0]
+        p = vertices[apex]
+        if abs(n1[0] * p[0] + n1[1] * p[1] + n1[2] * p[2] - d1) > distance_tolerance:
+            continue
+        parent[find(t1)] = find(t2)
+
+    regions = {}
+    for ti in range(len(triangles)):
+        if planes[ti][0] is not None:
+            regions.setdefault(find(ti), []).append(ti)
+
+    loops_by_region = {}
+    keep = set()
+    removable = set()
+    for root, members in regions.items():
+        region_triangles = [triangles[ti] for ti in members]
+        loops = _boundary_loops(region_triangles) if len(members) > 1 else None
+        if loops is None:
+            for triangle in region_triangles:
+                keep.update(triangle)
+            continue
+        loops_by_region[root] = loops
+        for loop in loops:
+            for vi, collinear in zip(loop, _collinear_flags(loop, vertices, distance_tolerance)):
+                (removable if collinear else keep).add(vi)
+    removable -= keep
+
+    result = []
+    for root, members in regions.items():
+        region_triangles = [triangles[ti] for ti in members]
+        loops = loops_by_region.get(root)
+        if loops is None:
+            result.extend(region_triangles)
+            continue
+        rings = [[vi for vi in loop if vi not in removable] for loop in loops]
+        rings = [ring for ring in rings if len(ring) >= 3]
+        if not rings:
+            result.extend(region_triangles)
+            continue
+        rings.sort(key=lambda ring: -_length(polygon_normal([vertices[vi] for vi in ring])))
+        merged = triangulate_surface(rings, vertices)
+        area = sum(planes[ti][2] for ti in members)
+        if merged and abs(_triangles_area(vertices, merged) - area) <= 1e-6 + area * 1e-4:
+            result.extend(merged)
+        else:
+            result.extend(region_triangles)
+    return _compact(vertices, result)
+
+
+def cluster_vertices(vertices, triangles, cell_size):
+    """Decimeer een mesh door vertices per rastercel samen te voegen.
+
+    Vertices in dezelfde cel worden vervangen door hun gemiddelde;
+    driehoeken die daardoor degenereren of dubbel worden vervallen.
+
+    Returns:
+        Tuple (vertices, triangles) met alleen de gebruikte vertices
+    """
+    if cell_size <= 0:
+        return _compact(vertices, triangles)
+    cells = {}
+    cell_of = {}
+    for triangle in triangles:
+        for vi in triangle:
+            if vi in cell_of:
+                continue
+            v = vertices[vi]
+            key = (int(math.floor(v[0] / cell_size)), int(math.floor(v[1] / cell_size)),
+                   int(math.floor(v[2] / cell_size)))
+            cell_of[vi] = key
+            cells.setdefault(key, []).append(v)
+    index = {}
+    out_vertices = []
+    for key, members in cells.items():
+        count = float(len(members))
+        index[key] = len(out_vertices)
+        out_vertices.append((sum(v[0] for v in members) / count, sum(v[1] for v in members) / count,
+                             sum(v[2] for v in members) / count))
+    seen = set()
+    out_triangles = []
+    for triangle in triangles:
+        mapped = tuple(index[cell_of[vi]] for vi in triangle)
+        if len(set(mapped)) < 3:
+            continue
+        key = tuple(sorted(mapped))
+        if key in seen:
+            continue
+        seen.add(key)
+        out_triangles.append(mapped)
+    return _compact(out_vertices, out_triangles)
+
+
+def simplify_building(building, selector):
+    """Vereenvoudig een gebouw (dict uit cityjson_parser) buiten de radius.
+
+    Returns:
+        Het gebouw; vereenvoudigde gebouwen krijgen nieuwe 'vertices' en
+        'triangles' en 'simplified' = True
+    """
+    triangles = building.get('triangles')
+    if not triangles or not selector.is_far(building.get('distance', 0.0)):
+        return building
+    if not selector.merge_planar and selector.cluster_size <= 0:
+        return building
+    vertices, out = building['vertices'], triangles
+    if selector.cluster_size > 0:
+        vertices, out = cluster_vertices(vertices, out, selector.cluster_size)
+    if selector.merge_planar:
+        vertices, out = merge_planar_faces(vertices, out)
+    if not out:
+        return building
+    simplified = dict(building)
+    simplified['vertices'] = vertices
+    simplified['triangles'] = out
+    simplified['polygon_faces'] = list(out)
+    simplified['simplified'] = True
+    return simplified
+
+
+def simplify_buildings(buildings, selector, stats=None):
+    """Generator: vereenvoudig een stroom gebouwen en tel de driehoeken.
+
+    Args:
+        buildings: Iterable van gebouw dicts (zie cityjson_parser.iter_buildings)
+        selector: LodSelector (dezelfde als bij het parsen)
+        stats: Optioneel MeshStats object
+    """
+    for building in buildings:
+        t0 = time.time()
+        result = simplify_building(building, selector)
+        if stats is not None:
+            stats.seconds += time.time() - t0
+            stats.add(building.get('lod'), len(building.get('triangles') or building.get('polygon_faces') or []),
+                      len(result.get('triangles') or result.get('polygon_faces') or []))
+            if result is not building:
+                stats.simplified += 1
+        yield result
+
+
+def building_faces(building):
+    """Driehoeken van een gebouw, of de polygoonvlakken als die er niet zijn."""
+    return building.get('triangles') or building.get('polygon_faces') or []
+
+
+def mesh_fingerprint(vertices, faces, precision=FINGERPRINT_PRECISION):
+    """Vingerafdruk van een mesh, onafhankelijk van positie en volgorde.
+
+    De vertices worden t.o.v. het minimum van de bounding box op precision
+    (meters) afgerond. Elk vlak wordt een tuple van afgeronde punten, gestart
+    bij het kleinste punt met behoud van omloopzin; de vlakken worden
+    gesorteerd voor het hashen.
+
+    Returns:
+        Tuple (hex digest, origin (x, y, z))
+    """
+    points = [tuple(v) for v in vertices]
+    if not points:
+        return None, (0.0, 0.0, 0.0)
+    origin = tuple(min(p[axis] for p in points) for axis in range(3))
+    keys = [tuple(int(round((p[axis] - origin[axis]) / precision)) for axis in range(3)) for p in points]
+    shape = []
+    for face in faces:
+        loop = [keys[i] for i in face]
+        start = loop.index(min(loop))
+        shape.append(tuple(loop[start:] + loop[:start]))
+    shape.sort()
+    return hashlib.sha1(repr(shape).encode('utf-8')).hexdigest(), origin
+
+
+class ShapeGroup(object):
+    """Gebouwen met dezelfde vorm: een definitie en de instanties.
+
+    De definitie is het eerste gebouw, met vertices t.o.v. zijn origin;
+    elke instantie is (gebouw, origin), te plaatsen met een verschuiving.
+    """
+
+    def __init__(self, key, building, origin):
+        self.key = key
+        self.building = building
+        self.origin = origin
+        self.members = [(building, origin)]
+
+    def local_vertices(self):
+        ox, oy, oz = self.origin
+        return [(v[0] - ox, v[1] - oy, v[2] - oz) for v in self.building['vertices']]
+
+
+class InstanceStats(object):
+    """Aantal unieke vormen en te bouwen driehoeken met en zonder instancing."""
+
+    def __init__(self):
+        self.buildings = 0
+        self.shapes = 0
+        self.faces = 0
+        self.unique_faces = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        return "{} gebouwen, {} unieke vormen: {} -> {} vlakken te bouwen ({:.1f}s)".format(
+            self.buildings, self.shapes, self.faces, self.unique_faces, self.seconds)
+
+
+def group_identical_buildings(buildings, precision=FINGERPRINT_PRECISION, stats=None):
+    """Groepeer gebouwen op vingerafdruk, in volgorde van eerste voorkomen.
+
+    Args:
+        buildings: Iterable van gebouw dicts (zie cityjson_parser.iter_buildings)
+        precision: Afronding in meters voor het vergelijken van vertices
+        stats: Optioneel InstanceStats object
+
+    Returns:
+        List van ShapeGroup
+    """
+    groups = []
+    by_key = {}
+    for building in buildings:
+        t0 = time.time()
+        faces = building_faces(building)
+        key, origin = mesh_fingerprint(building['vertices'], faces, precision)
+        if key is not None and key in by_key:
+            by_key[key].members.append((building, origin))
+        else:
+            group = ShapeGroup(key, building, origin)
+            groups.append(group)
+            if key is not None:
+                by_key[key] = group
+            if stats is not None:
+                stats.shapes += 1
+                stats.unique_faces += len(faces)
+        if stats is not None:
+            stats.buildings += 1
+            stats.faces += len(faces)
+            stats.seconds += time.time() - t0
+    return groups
+
+
+class TileMesh(object):
+    """Samengevoegde mesh van de gebouwen in een tegel.
+
+    ranges houdt per gebouw (id, eerste vlak, aantal vlakken) bij, in de
+    volgorde waarin de vlakken in faces staan.
+    """
+
+    def __init__(self, key, bounds):
+        self.key = key
+        self.bounds = bounds
+        self.vertices = []
+        self.faces = []
+        self.triangles = True
+        self.ranges = []
+
+    def add(self, building):
+        faces = building_faces(building)
+        offset = len(self.vertices)
+        self.vertices.extend((v[0], v[1], v[2]) for v in building['vertices'])
+        self.ranges.append((building.get('id'), len(self.faces), len(faces)))
+        self.faces.extend([i + offset for i in face] for face in faces)
+        self.triangles = self.triangles and bool(building.get('triangles'))
+
+    def face_ranges(self):
+        """Dict gebouw id -> [eerste vlak, aantal vlakken]."""
+        return dict((building_id, [first, count]) for building_id, first, count in self.ranges)
+
+
+class MergeStats(object):
+    """Aantal tegels en vlakken bij het samenvoegen per tegel."""
+
+    def __init__(self):
+        self.buildings = 0
+        self.tiles = 0
+        self.faces = 0
+        self.max_tile_faces = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        return "{} gebouwen in {} tegels, {} vlakken (max {} per tegel, {:.1f}s)".format(
+            self.buildings, self.tiles, self.faces, self.max_tile_faces, self.seconds)
+
+
+def merge_buildings_by_tile(buildings, tile_size, origin=(0.0, 0.0), stats=None):
+    """Voeg gebouwen samen per vierkante tegel van het RD raster.
+
+    Een gebouw hoort bij de tegel van het midden van zijn bounding box, zodat
+    het nooit over tegels verdeeld wordt. De tegels liggen op een vast raster
+    (veelvouden van tile_size in RD), dus een volgende import van een
+    overlappend gebied geeft dezelfde indeling.
+
+    Args:
+        buildings: Iterable van gebouw dicts, vertices t.o.v. origin
+        tile_size: Zijde van een tegel in meters
+        origin: (rd_x, rd_y) van het project centrum
+        stats: Optioneel MergeStats object
+
+    Returns:
+        List van TileMesh, gesorteerd op tegel (kolom, rij)
+    """
+    t0 = time.time()
+    ox, oy = origin
+    tiles = {}
+    for building in buildings:
+        vertices = building['vertices']
+        if not len(vertices) or not building_faces(building):
+            continue
+        xs = [v[0] for v in vertices]
+        ys = [v[1] for v in vertices]
+        key = (int(math.floor((ox + (min(xs) + max(xs)) / 2.0) / tile_size)),
+               int(math.floor((oy + (min(ys) + max(ys)) / 2.0) / tile_size)))
+        tile = tiles.get(key)
+        if tile is None:
+            bounds = (key[0] * tile_size, key[1] * tile_size, (key[0] + 1) * tile_size, (key[1] + 1) * tile_size)
+            tile = tiles[key] = TileMesh(key, bounds)
+        tile.add(building)
+        if stats is not None:
+            stats.buildings += 1
+    result = [tiles[key] for key in sorted(tiles)]
+    if stats is not None:
+        stats.tiles += len(result)
+        for tile in result:
+            stats.faces += len(tile.faces)
+            stats.max_tile_faces = max(stats.max_tile_faces, len(tile.faces))
+        stats.seconds += time.time() - t0
+    return result
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+OGC API Features client voor GIS2BIM - paginering via 'next' links
+Features worden als generator teruggegeven, zodat de verwerking kan starten
+terwijl de volgende pagina's nog gedownload moeten worden.
+"""
+
+import json
+import time
+
+
+DEFAULT_PAGE_SIZE = 1000
+RD_CRS = 'http://www.opengis.net/def/crs/EPSG/0/28992'
+CRS84 = 'http://www.opengis.net/def/crs/OGC/1.3/CRS84'
+
+
+class PageStats(object):
+    """Timing per opgehaalde pagina: (features, seconden, bytes)."""
+
+    def __init__(self):
+        self.pages = []
+        self.truncated = False
+
+    def add(self, features, seconds, size):
+        self.pages.append((features, seconds, size))
+
+    @property
+    def feature_count(self):
+        return sum(p[0] for p in self.pages)
+
+    @property
+    def total_seconds(self):
+        return sum(p[1] for p in self.pages)
+
+    @property
+    def total_bytes(self):
+        return sum(p[2] for p in self.pages)
+
+    def summary(self):
+        return "{} features in {} pagina's, {:.1f}s, {:.0f} kB{}".format(
+            self.feature_count, len(self.pages), self.total_seconds, self.total_bytes / 1024.0,
+            " (afgekapt)" if self.truncated else "")
+
+
+def ogcapi_items_url(base_url, collection, bbox, limit=DEFAULT_PAGE_SIZE, crs=RD_CRS):
+    """URL voor de eerste pagina van /collections/{collection}/items binnen bbox."""
+    return "{base}/collections/{collection}/items?bbox={minx},{miny},{maxx},{maxy}&bbox-crs={crs}&crs={crs}&limit={limit}&f=json".format(
+        base=base_url, collection=collection, minx=bbox[0], miny=bbox[1], maxx=bbox[2], maxy=bbox[3],
+        crs=crs, limit=limit)
+
+
+def next_link(data):
+    """Geef de href van de 'next' link van een GeoJSON pagina, of None."""
+    for link in data.get('links', []) or []:
+        if link.get('rel') == 'next' and link.get('href'):
+            link_type = link.get('type', '')
+            if not link_type or 'json' in link_type:
+                return link['href']
+    return None
+
+
+def iter_ogcapi_pages(url, fetch_text, stats=None):
+    """Loop de pagina's van een OGC API items response af via 'next' links.
+
+    Args:
+        url: URL van de eerste pagina
+        fetch_text: Functie url -> response tekst
+        stats: Optioneel PageStats object dat per pagina bijgewerkt wordt
+
+    Yields:
+        Geparste pagina dicts (met o.a. 'features' en 'links')
+    """
+    seen_urls = set()
+    while url and url not in seen_urls:
+        seen_urls.add(url)
+        start = time.time()
+        text = fetch_text(url)
+        data = json.loads(text)
+        if stats is not None:
+            stats.add(len(data.get('features', []) or []), time.time() - start, len(text))
+        yield data
+        url = next_link(data)
+
+
+def iter_ogcapi_features(base_url, collection, bbox, fetch_text, page_size=DEFAULT_PAGE_SIZE,
+                         max_features=None, stats=None, crs=RD_CRS):
+    """Loop alle features van een OGC API collectie binnen bbox af.
+
+    Args:
+        base_url: OGC API landing page (bijv. https://api.pdok.nl/lv/bgt/ogc/v1)
+        collection: Collectie naam (bijv. 'wegdeel')
+        bbox: (minx, miny, maxx, maxy) in crs
+        fetch_text: Functie url -> response tekst
+        page_size: 'limit' per pagina
+        max_features: Optioneel maximum over alle pagina's (None = alles)
+        stats: Optioneel PageStats object dat per pagina bijgewerkt wordt
+        crs: CRS van bbox en features (RD_CRS, of CRS84 voor services zonder RD)
+
+    Yields:
+        GeoJSON feature dicts
+    """
+    count = 0
+    for data in iter_ogcapi_pages(ogcapi_items_url(base_url, collection, bbox, page_size, crs), fetch_text, stats):
+        features = data.get('features', []) or []
+        if not features:
+            return
+        for index, feature in enumerate(features):
+            yield feature
+            count += 1
+            if max_features is not None and count >= max_features:
+                if stats is not None:
+                    stats.truncated = index < len(features) - 1 or next_link(data) is not None
+                return
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+PNG codec voor GIS2BIM - decoderen van tiles en regel voor regel schrijven
+Pure Python (zlib), zodat kaarten ook buiten Revit (zonder System.Drawing)
+samengevoegd kunnen worden. Pillow wordt gebruikt als het beschikbaar is,
+ook voor JPEG tiles.
+"""
+
+import struct
+import zlib
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    from io import BytesIO
+except ImportError:
+    from StringIO import StringIO as BytesIO
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def is_png(data):
+    return data[:8] == PNG_SIGNATURE
+
+
+def _chunks(data):
+    pos = 8
+    while pos + 8 <= len(data):
+        length, tag = struct.unpack('>I4s', data[pos:pos + 8])
+        yield tag, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def _unfilter(filter_type, line, prev, bpp):
+    """Herstel een PNG scanline (filters 0-4) in place."""
+    count = len(line)
+    if filter_type == 1:
+        for i in range(bpp, count):
+            line[i] = (line[i] + line[i - bpp]) & 0xff
+    elif filter_type == 2:
+        for i in range(count):
+            line[i] = (line[i] + prev[i]) & 0xff
+    elif filter_type == 3:
+        for i in range(count):
+            left = line[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xff
+    elif filter_type == 4:
+        for i in range(count):
+            if i >= bpp:
+                line[i] = (line[i] + _paeth(line[i - bpp], prev[i], prev[i - bpp])) & 0xff
+            else:
+                line[i] = (line[i] + prev[i]) & 0xff
+    elif filter_type != 0:
+        raise ValueError("Onbekend PNG filter {}".format(filter_type))
+    return line
+
+
+def _to_rgba(line, color_type, bit_depth, width, palette):
+    """Zet een herstelde scanline om naar RGBA bytes."""
+    if bit_depth == 16:
+        line = line[0::2]
+        bit_depth = 8
+    if bit_depth < 8:
+        per_byte = 8 // bit_depth
+        mask = (1 << bit_depth) - 1
+        values = bytearray(width)
+        for x in range(width):
+            shift = 8 - bit_depth * (x % per_byte + 1)
+            values[x] = (line[x // per_byte] >> shift) & mask
+        if color_type == 0:
+            values = bytearray(v * 255 // mask for v in values)
+        line = values
+    out = bytearray(width * 4)
+    if color_type == 6:
+        return line[:width * 4]
+    if color_type == 2:
+        out[0::4] = line[0::3]
+        out[1::4] = line[1::3]
+        out[2::4] = line[2::3]
+        out[3::4] = b'\xff' * width
+    elif color_type == 0:
+        out[0::4] = out[1::4] = out[2::4] = line[:width]
+        out[3::4] = b'\xff' * width
+    elif color_type == 4:
+        out[0::4] = out[1::4] = out[2::4] = line[0::2]
+        out[3::4] = line[1::2]
+    elif color_type == 3:
+        for x in range(width):
+            out[x * 4:x * 4 + 4] = palette[line[x]]
+    return out
+
+
+def decode_png(data):
+    """Decodeer een (niet-interlaced) PNG naar RGBA regels.
+
+    Returns:
+        Tuple (width, height, rows) met rows een list van bytearrays
+        (4 bytes per pixel)
+    """
+    if not is_png(data):
+        raise ValueError("Geen PNG")
+    idat = []
+    palette = []
+    transparency = b''
+    header = None
+    for tag, body in _chunks(data):
+        if tag == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif tag == b'PLTE':
+            palette = [bytearray(body[i:i + 3]) + b'\xff' for i in range(0, len(body), 3)]
+        elif tag == b'tRNS':
+            transparency = bytearray(body)
+        elif tag == b'IDAT':
+            idat.append(body)
+        elif tag == b'IEND':
+            break
+    if header is None:
+        raise ValueError("PNG zonder IHDR")
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if interlace:
+        raise ValueError("Interlaced PNG niet ondersteund")
+    for i, alpha in enumerate(transparency[:len(palette)] if color_type == 3 else b''):
+        palette[i][3] = alpha
+    raw = zlib.decompress(b''.join(idat))
+    bits = _CHANNELS[color_type] * bit_depth
+    stride = (width * bits + 7) // 8
+    bpp = max(1, bits // 8)
+    rows = []
+    prev = bytearray(stride)
+    pos = 0
+    for _ in range(height):
+        filter_type = bytearray(raw[pos:pos + 1])[0]
+        line = _unfilter(filter_type, bytearray(raw[pos + 1:pos + 1 + stride]), prev, bpp)
+        pos += 1 + stride
+        rows.append(_to_rgba(line, color_type, bit_depth, width, palette))
+        prev = line
+    return width, height, rows
+
+
+def decode_image(data):
+    """Decodeer een tile (PNG, of met Pillow ook JPEG) naar RGBA regels."""
+    if Image is not None:
+        image = Image.open(BytesIO(data)).convert('RGBA')
+        width, height = image.size
+        raw = image.tobytes()
+        return width, height, [bytearray(raw[y * width * 4:(y + 1) * width * 4]) for y in range(height)]
+    return decode_png(data)
+
+
+class PngWriter(object):
+    """Schrijft een RGBA PNG regel voor regel (constante geheugenbehoefte).
+
+    Gebruik:
+        with PngWriter(path, width, height) as writer:
+            for row in rows:
+                writer.write_row(row)
+    """
+
+    def __init__(self, path, width, height, level=6):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(level)
+        self._file.write(PNG_SIGNATURE)
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, tag, body):
+        self._file.write(struct.pack('>I', len(body)) + tag + body)
+        self._file.write(struct.pack('>I', zlib.crc32(tag + body) & 0xffffffff))
+
+    def write_row(self, row):
+        """Voeg een regel toe (width * 4 RGBA bytes)."""
+        if len(row) != self.width * 4:
+            raise ValueError("Regel van {} bytes, verwacht {}".format(len(row), self.width * 4))
+        data = self._compressor.compress(b'\x00' + bytes(row))
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows_written += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        blank = bytearray(self.width * 4)
+        while self.rows_written < self.height:
+            self.write_row(blank)
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
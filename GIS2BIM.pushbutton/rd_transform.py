@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Coordinaattransformatie voor GIS2BIM - RD New (EPSG:28992) <-> WGS84/ETRS89
+Benaderingspolynomen in de stijl van RDNAPTRANS (Schreutelkamp en Strang van
+Hees), rond het referentiepunt Amersfoort. Nauwkeurigheid binnen Nederland
+beter dan ongeveer een meter; geen NAP/hoogtetransformatie (z blijft staan).
+Voor een exacte transformatie is de officiele RDNAPTRANS(TM) procedure nodig.
+
+Alle functies werken op hele coordinaatreeksen tegelijk:
+- NumPy arrays (N x 2 of N x 3) en platte buffers (array('d') / ndarray met
+  dim waarden per punt, zoals de VertexArray van de CityJSON parser)
+- lists van (x, y[, z]) tuples, zoals de ringen van extract_polygon_rings
+Zonder NumPy wordt per punt met Horner-achtige sommen gerekend.
+"""
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+RD_X0 = 155000.0
+RD_Y0 = 463000.0
+PHI0 = 52.15517440
+LAM0 = 5.38720621
+
+# RD -> WGS84: (p, q, K) met dphi = sum(K * dx^p * dy^q) in boogseconden
+_PHI_TERMS = ((0, 1, 3235.65389), (2, 0, -32.58297), (0, 2, -0.24750), (2, 1, -0.84978),
+              (0, 3, -0.06550), (2, 2, -0.01709), (1, 0, -0.00738), (4, 0, 0.00530),
+              (2, 3, -0.00039), (4, 1, 0.00033), (1, 1, -0.00012))
+_LAM_TERMS = ((1, 0, 5260.52916), (1, 1, 105.94684), (1, 2, 2.45656), (3, 0, -0.81885),
+              (1, 3, 0.05594), (3, 1, -0.05607), (0, 1, 0.01199), (3, 2, -0.00256),
+              (1, 4, 0.00128), (0, 2, 0.00022), (2, 0, -0.00022), (5, 0, 0.00026))
+
+# WGS84 -> RD: (p, q, R) met x = sum(R * dphi^p * dlam^q) in meters
+_X_TERMS = ((0, 1, 190094.945), (1, 1, -11832.228), (2, 1, -114.221), (0, 3, -32.391),
+            (1, 0, -0.705), (3, 1, -2.340), (1, 3, -0.608), (0, 2, -0.008), (2, 3, 0.148))
+_Y_TERMS = ((1, 0, 309056.544), (0, 2, 3638.893), (2, 0, 73.077), (1, 2, -157.984),
+            (3, 0, 59.788), (0, 1, 0.433), (2, 2, -6.439), (1, 1, -0.032), (0, 4, 0.092),
+            (1, 4, -0.054))
+
+
+def _polynomial(terms, u, v):
+    """Som van c * u^p * v^q; werkt op floats en op NumPy arrays."""
+    max_p = max(t[0] for t in terms)
+    max_q = max(t[1] for t in terms)
+    u_pow = [1.0, u]
+    v_pow = [1.0, v]
+    for _ in range(2, max_p + 1):
+        u_pow.append(u_pow[-1] * u)
+    for _ in range(2, max_q + 1):
+        v_pow.append(v_pow[-1] * v)
+    total = 0.0
+    for p, q, c in terms:
+        total = total + c * u_pow[p] * v_pow[q]
+    return total
+
+
+def _rd_to_wgs84_xy(x, y):
+    dx = (x - RD_X0) * 1e-5
+    dy = (y - RD_Y0) * 1e-5
+    lat = PHI0 + _polynomial(_PHI_TERMS, dx, dy) / 3600.0
+    lon = LAM0 + _polynomial(_LAM_TERMS, dx, dy) / 3600.0
+    return lon, lat
+
+
+def _wgs84_to_rd_xy(lon, lat):
+    dphi = 0.36 * (lat - PHI0)
+    dlam = 0.36 * (lon - LAM0)
+    return RD_X0 + _polynomial(_X_TERMS, dphi, dlam), RD_Y0 + _polynomial(_Y_TERMS, dphi, dlam)
+
+
+def _transform_buffer(func, data, dim, offset):
+    """Transformeer een platte buffer (dim waarden per punt) in-place."""
+    ox, oy = offset
+    if np is not None and isinstance(data, np.ndarray):
+        block = data.reshape(-1, dim)
+        a, b = func(block[:, 0] + ox, block[:, 1] + oy)
+        block[:, 0] = a
+        block[:, 1] = b
+        return data
+    for j in range(0, len(data) - dim + 1, dim):
+        data[j], data[j + 1] = func(data[j] + ox, data[j + 1] + oy)
+    return data
+
+
+def _transform(func, coords, dim, offset):
+    if np is not None and isinstance(coords, np.ndarray):
+        if coords.ndim == 2:
+            out = np.array(coords, dtype=float)
+            return _transform_buffer(func, out.reshape(-1), out.shape[1], offset).reshape(out.shape)
+        return _transform_buffer(func, np.array(coords, dtype=float), dim, offset)
+    if isinstance(coords, array):
+        return _transform_buffer(func, array('d', coords), dim, offset)
+    points = list(coords)
+    if not points:
+        return []
+    if np is not None and len(points) > 16:
+        block = np.array([(p[0], p[1]) for p in points], dtype=float)
+        a, b = func(block[:, 0] + offset[0], block[:, 1] + offset[1])
+        xy = zip(a.tolist(), b.tolist())
+    else:
+        xy = (func(p[0] + offset[0], p[1] + offset[1]) for p in points)
+    return [(a, b) + tuple(p[2:]) for (a, b), p in zip(xy, points)]
+
+
+def rd_to_wgs84(coords, dim=2, offset=(0.0, 0.0)):
+    """RD (x, y) -> WGS84 (lon, lat) in graden, voor een hele reeks punten.
+
+    Args:
+        coords: List van (x, y[, z]) tuples, N x dim NumPy array of platte
+            buffer (array('d') / 1D ndarray) met dim waarden per punt
+        dim: Waarden per punt voor platte buffers (2, of 3 met z)
+        offset: (dx, dy) die eerst opgeteld wordt, bijv. het projectcentrum
+            voor vertices relatief t.o.v. (rd_x, rd_y)
+
+    Returns:
+        Zelfde soort reeks (kopie) met (lon, lat[, z])
+    """
+    return _transform(_rd_to_wgs84_xy, coords, dim, offset)
+
+
+def wgs84_to_rd(coords, dim=2, offset=(0.0, 0.0)):
+    """WGS84 (lon, lat) in graden -> RD (x, y), voor een hele reeks punten.
+
+    Zie rd_to_wgs84 voor de ondersteunde invoer. GeoJSON volgorde (lon, lat).
+    """
+    return _transform(_wgs84_to_rd_xy, coords, dim, offset)
+
+
+_XY_FUNCS = {rd_to_wgs84: _rd_to_wgs84_xy, wgs84_to_rd: _wgs84_to_rd_xy}
+
+
+def rd_point_to_wgs84(x, y):
+    return _rd_to_wgs84_xy(x, y)
+
+
+def wgs84_point_to_rd(lon, lat):
+    return _wgs84_to_rd_xy(lon, lat)
+
+
+def transform_rings(rings, func=wgs84_to_rd):
+    """Transformeer ringen (zoals van extract_polygon_rings) in een batch."""
+    rings = [list(ring) for ring in rings]
+    flat = func([p for ring in rings for p in ring])
+    result = []
+    pos = 0
+    for ring in rings:
+        result.append(flat[pos:pos + len(ring)])
+        pos += len(ring)
+    return result
+
+
+def transform_vertex_array(vertices, func=rd_to_wgs84, rd_x=0.0, rd_y=0.0):
+    """Transformeer de buffer van een VertexArray/VertexRange (x, y, z) in-place.
+
+    Vertices uit de CityJSON parser zijn relatief t.o.v. (rd_x, rd_y); die
+    offset wordt voor de transformatie opgeteld.
+    """
+    xy_func = _XY_FUNCS[func]
+    start = getattr(vertices, 'start', 0) * 3
+    stop = start + len(vertices) * 3
+    data = vertices.data
+    if np is not None and isinstance(data, np.ndarray):
+        _transform_buffer(xy_func, data[start:stop], 3, (rd_x, rd_y))
+    else:
+        part = _transform_buffer(xy_func, array('d', data[start:stop]), 3, (rd_x, rd_y))
+        data[start:stop] = part
+    return vertices
+
+
+def _geometry_points(coords, depth, out):
+    if depth == 0:
+        out.append(coords)
+    else:
+        for c in coords:
+            _geometry_points(c, depth - 1, out)
+
+
+def _geometry_rebuild(coords, depth, it):
+    if depth == 0:
+        return list(next(it))
+    return [_geometry_rebuild(c, depth - 1, it) for c in coords]
+
+
+_GEOMETRY_DEPTH = {'Point': 0, 'LineString': 1, 'MultiPoint': 1, 'Polygon': 2,
+                   'MultiLineString': 2, 'MultiPolygon': 3}
+
+
+def transform_features(features, func=wgs84_to_rd):
+    """Transformeer de geometrieen van GeoJSON features (generator).
+
+    Per feature worden alle punten in een batch omgerekend; features worden
+    in-place aangepast en doorgegeven.
+    """
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        depth = _GEOMETRY_DEPTH.get(geometry.get('type'))
+        if depth is not None and geometry.get('coordinates'):
+            points = []
+            _geometry_points(geometry['coordinates'], depth, points)
+            it = iter(func([tuple(p) for p in points]))
+            geometry['coordinates'] = _geometry_rebuild(geometry['coordinates'], depth, it)
+        yield feature
+
+
+def rd_bbox_to_wgs84(bbox):
+    """RD bbox -> omhullende WGS84 bbox (lon/lat), via hoeken en middens van de randen."""
+    minx, miny, maxx, maxy = bbox
+    cx, cy = (minx + maxx) / 2.0, (miny + maxy) / 2.0
+    points = rd_to_wgs84([(minx, miny), (cx, miny), (maxx, miny), (maxx, cy),
+                          (maxx, maxy), (cx, maxy), (minx, maxy), (minx, cy)])
+    lons = [p[0] for p in points]
+    lats = [p[1] for p in points]
+    return min(lons), min(lats), max(lons), max(lats)
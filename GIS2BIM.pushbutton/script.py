@@ -8,8 +8,8 @@ __author__ = "3BM / JMK"
 __doc__ = "Nederlandse GIS data workflow - Locatie, Selectie, Import"
 
 import clr
+import System
 import os
-import math
 import json
 import tempfile
 import time
@@ -21,13 +21,15 @@ clr.AddReference('System.Windows.Forms')
 clr.AddReference('RevitAPI')
 clr.AddReference('RevitAPIUI')
 
-from System.Net import WebClient, WebRequest
-from System.Text import Encoding
+from System.Net import ServicePointManager, WebException, WebRequest
+from System import DateTime
+from System.IO import MemoryStream
 import System.Drawing as Drawing
-from System.Drawing import Bitmap, Graphics, Pen, SolidBrush, Rectangle, Font, FontStyle
+from System.Drawing import Bitmap, Graphics, GraphicsUnit, Pen, SolidBrush, Rectangle, Font, FontStyle
 from System.Drawing import Color as DrawingColor
 from System.Drawing.Drawing2D import SmoothingMode, DashStyle
-from System.Drawing.Imaging import ImageFormat
+from System.Drawing.Imaging import ImageFormat, ImageLockMode, PixelFormat
+from System.Runtime.InteropServices import Marshal
 from System.Collections.Generic import List
 
 import System.Windows.Forms as WinForms
@@ -61,8 +63,21 @@ def set_bounds(control, x, y, width, height):
 
 from pyrevit import revit
 from Autodesk.Revit.DB import *
+from Autodesk.Revit.DB.ExtensibleStorage import AccessLevel, Entity, Schema, SchemaBuilder
 from Autodesk.Revit.UI import TaskDialog
 
+from tile_cache import TileCache, wmts_url_key
+from vector_cache import VectorCache
+from http_client import DEFAULT_MAX_PER_HOST, DEFAULT_TIMEOUT, HttpClient, default_validator_store
+from map_preview import TileLoader, TilePyramid
+from geocoder import AutoComplete, Geocoder, default_geocode_cache
+from mesh_tools import building_faces, group_identical_buildings
+from span_tracer import TRACE_NAME, Tracer, trace_path
+from gis_pipeline import (GIS_LAYERS, ZOOMLEVEL_RESOLUTIONS, WMTS_XCORNER, WMTS_YCORNER, WMTS_PIXEL_WIDTH,
+                          OGCAPI_MAX_FEATURES, LAYER_WORKERS, prepare_layer, iter_prepared_layers,
+                          write_tile_ranges)
+from spatial_index import GeometryDedup
+
 
 # =============================================================================
 # UI STYLING (gebruik System.Drawing.Color)
@@ -233,42 +248,16 @@ def show_question(message, title="Bevestigen"):
 
 FEET_TO_METERS = 0.3048
 METERS_TO_FEET = 1 / FEET_TO_METERS
-WMTS_XCORNER = -285401.92
-WMTS_YCORNER = 903402.0
-WMTS_PIXEL_WIDTH = 256
 
-ZOOMLEVEL_RESOLUTIONS = {
-    0: 3440.640, 1: 1720.320, 2: 860.160, 3: 430.080,
-    4: 215.040, 5: 107.520, 6: 53.720, 7: 26.880,
-    8: 13.440, 9: 6.720, 10: 3.360, 11: 1.680,
-    12: 0.840, 13: 0.420, 14: 0.210, 15: 0.105, 16: 0.0575
-}
+MAP_PREVIEW_URL = 'https://service.pdok.nl/hwh/luchtfotorgb/wmts/v1_0'
+MAP_PREVIEW_LAYER = 'Actueel_orthoHR'
+MAP_PREVIEW_PX = 512
 
 DEFAULT_RD_X = 99628
 DEFAULT_RD_Y = 424889
 DEFAULT_ADDRESS = "Burgemeester de Raadtsingel 31, Dordrecht"
-
-
-# =============================================================================
-# GIS DATA LAGEN
-# =============================================================================
-
-GIS_LAYERS = {
-    'luchtfoto_actueel': {'name': 'Luchtfoto Actueel', 'category': 'Rasterkaarten', 'type': 'wmts', 'url': 'https://service.pdok.nl/hwh/luchtfotorgb/wmts/v1_0', 'layer': 'Actueel_orthoHR', 'zoom': 14, 'sheet_name': 'GIS - Luchtfoto Actueel'},
-    'luchtfoto_2023': {'name': 'Luchtfoto 2023', 'category': 'Rasterkaarten', 'type': 'wmts', 'url': 'https://service.pdok.nl/hwh/luchtfotorgb/wmts/v1_0', 'layer': '2023_orthoHR', 'zoom': 14, 'sheet_name': 'GIS - Luchtfoto 2023'},
-    'top10nl': {'name': 'Top10NL Achtergrond', 'category': 'Rasterkaarten', 'type': 'wmts', 'url': 'https://service.pdok.nl/brt/achtergrondkaart/wmts/v2_0', 'layer': 'standaard', 'zoom': 11, 'sheet_name': 'GIS - Top10NL'},
-    'bestemmingsplan': {'name': 'Bestemmingsplan', 'category': 'Rasterkaarten', 'type': 'wms', 'url': 'https://service.pdok.nl/kadaster/plu/wms/v1_0', 'layer': 'Bestemmingsplangebied', 'sheet_name': 'GIS - Bestemmingsplan'},
-    'bouwvlak_wms': {'name': 'Bouwvlak (kaart)', 'category': 'Rasterkaarten', 'type': 'wms', 'url': 'https://service.pdok.nl/kadaster/plu/wms/v1_0', 'layer': 'Bouwvlak', 'sheet_name': 'GIS - Bouwvlak'},
-    'bgt_achtergrond': {'name': 'BGT Achtergrondkaart', 'category': 'Rasterkaarten', 'type': 'wmts', 'url': 'https://service.pdok.nl/lv/bgt/wmts/v1_0', 'layer': 'standaardvisualisatie', 'zoom': 14, 'sheet_name': 'GIS - BGT'},
-    'kadaster_kaart': {'name': 'Kadastrale Kaart', 'category': 'Rasterkaarten', 'type': 'wms', 'url': 'https://service.pdok.nl/kadaster/kadastralekaart/wms/v5_0', 'layer': 'Kadastralekaart', 'sheet_name': 'GIS - Kadaster Kaart'},
-    'natura2000': {'name': 'Natura2000', 'category': 'Rasterkaarten', 'type': 'wms', 'url': 'https://service.pdok.nl/rvo/natura2000/wms/v1_0', 'layer': 'natura2000', 'sheet_name': 'GIS - Natura2000'},
-    'bag_panden_2d': {'name': 'BAG Panden 2D', 'category': '2D Vectordata', 'type': 'wfs', 'url': 'https://service.pdok.nl/lv/bag/wfs/v2_0', 'layer': 'bag:pand', 'sheet_name': 'GIS - BAG 2D'},
-    'bgt_wegdelen': {'name': 'BGT Wegdelen', 'category': '2D Vectordata', 'type': 'ogcapi', 'url': 'https://api.pdok.nl/lv/bgt/ogc/v1', 'collection': 'wegdeel', 'sheet_name': 'GIS - BGT Wegdelen'},
-    'bgt_waterdelen': {'name': 'BGT Waterdelen', 'category': '2D Vectordata', 'type': 'ogcapi', 'url': 'https://api.pdok.nl/lv/bgt/ogc/v1', 'collection': 'waterdeel', 'sheet_name': 'GIS - BGT Waterdelen'},
-    'bgt_panden': {'name': 'BGT Panden', 'category': '2D Vectordata', 'type': 'ogcapi', 'url': 'https://api.pdok.nl/lv/bgt/ogc/v1', 'collection': 'pand', 'sheet_name': 'GIS - BGT Panden'},
-    'kadaster_percelen': {'name': 'Kadaster Percelen', 'category': '2D Vectordata', 'type': 'wfs', 'url': 'https://service.pdok.nl/kadaster/kadastralekaart/wfs/v5_0', 'layer': 'kadastralekaart:Perceel', 'sheet_name': 'GIS - Percelen'},
-    'bag_3d_cityjson': {'name': '3D BAG LOD2.2 (CityJSON)', 'category': '3D Data', 'type': '3dbag_cityjson', 'url': 'https://api.3dbag.nl', 'sheet_name': 'GIS - 3D BAG'},
-}
+# Suggesties (PDOK suggest) tijdens het typen in het adresveld
+GEOCODE_AUTOCOMPLETE = True
 
 
 # =============================================================================
@@ -281,22 +270,114 @@ def meters_to_internal(meters):
 def internal_to_meters(internal):
     return internal * FEET_TO_METERS
 
-def web_request(url):
-    client = WebClient()
-    client.Headers.Add("User-Agent", "Mozilla/5.0 GIS2BIM/PyRevit")
-    client.Encoding = Encoding.UTF8
-    return client.DownloadString(url)
-
-def download_image(url):
-    request = WebRequest.Create(url)
-    request.Accept = "image/png,image/*"
-    request.UserAgent = "Mozilla/5.0 GIS2BIM/PyRevit"
-    request.Timeout = 60000
-    response = request.GetResponse()
-    bitmap = Bitmap(response.GetResponseStream())
-    response.Close()
+class DotNetTransport(object):
+    """HttpWebRequest transport voor HttpClient.
+
+    .NET houdt per host een pool van keep-alive verbindingen bij (ServicePoint);
+    het standaard maximum van 2 verbindingen per host wordt opgehoogd tot de
+    limiet van de client. Compressie en revalidatie doet HttpClient zelf.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_per_host=DEFAULT_MAX_PER_HOST):
+        self.timeout_ms = int(timeout * 1000)
+        if ServicePointManager.DefaultConnectionLimit < max_per_host:
+            ServicePointManager.DefaultConnectionLimit = max_per_host
+
+    def request(self, url, headers, context=None):
+        request = WebRequest.Create(url)
+        request.KeepAlive = True
+        request.Timeout = self.timeout_ms
+        request.ReadWriteTimeout = self.timeout_ms
+        for name, value in headers.items():
+            if name == 'User-Agent':
+                request.UserAgent = value
+            elif name == 'If-Modified-Since':
+                request.IfModifiedSince = DateTime.Parse(value)
+            else:
+                request.Headers.Add(name, value)
+        if context is not None:
+            context['request'] = request
+        try:
+            response = request.GetResponse()
+        except WebException as e:
+            # 304 en foutstatussen komen als WebException met een response
+            response = e.Response
+            if response is None:
+                raise
+        try:
+            response_headers = dict((name.lower(), response.Headers[name]) for name in response.Headers.AllKeys)
+            stream = MemoryStream()
+            response.GetResponseStream().CopyTo(stream)
+            body = bytes(bytearray(stream.ToArray()))
+            # Hergebruik van de verbinding is in .NET niet per request zichtbaar
+            return int(response.StatusCode), response_headers, body, None
+        finally:
+            response.Close()
+
+    def abort(self, context):
+        context['aborted'] = True
+        if 'request' in context:
+            context['request'].Abort()
+
+
+_http_client = None
+
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = HttpClient(DotNetTransport(), default_validator_store())
+    return _http_client
+
+def web_request(url, cached=None):
+    return get_http_client().fetch_text(url, cached=cached)
+
+def fetch_bytes(url, cached=None):
+    return get_http_client().fetch_bytes(url, cached=cached)
+
+def bitmap_from_bytes(data):
+    stream = MemoryStream(System.Array[System.Byte](bytearray(data)))
+    decoded = Bitmap(stream)
+    bitmap = Bitmap(decoded)
+    decoded.Dispose()
+    stream.Close()
     return bitmap
 
+def decode_rgba_rows(data):
+    # Tile decoderen met System.Drawing voor de WMS mosaic; GDI+ levert BGRA, de PNG writer wil RGBA
+    bitmap = bitmap_from_bytes(data)
+    try:
+        width, height = bitmap.Width, bitmap.Height
+        locked = bitmap.LockBits(Rectangle(0, 0, width, height), ImageLockMode.ReadOnly, PixelFormat.Format32bppArgb)
+        try:
+            buffer = System.Array.CreateInstance(System.Byte, width * 4)
+            rows = []
+            for y in range(height):
+                Marshal.Copy(System.IntPtr.Add(locked.Scan0, y * locked.Stride), buffer, 0, width * 4)
+                row = bytearray(buffer)
+                row[0::4], row[2::4] = row[2::4], row[0::4]
+                rows.append(row)
+        finally:
+            bitmap.UnlockBits(locked)
+    finally:
+        bitmap.Dispose()
+    return width, height, rows
+
+_tile_cache = None
+
+def get_tile_cache():
+    global _tile_cache
+    if _tile_cache is None:
+        _tile_cache = TileCache()
+    return _tile_cache
+
+_vector_cache = None
+
+def get_vector_cache():
+    global _vector_cache
+    if _vector_cache is None:
+        _vector_cache = VectorCache()
+    return _vector_cache
+
 
 # =============================================================================
 # REVIT FUNCTIES
@@ -387,114 +468,55 @@ def import_image_to_view(doc, view, image_path, width_m):
 # GEOCODING
 # =============================================================================
 
+_geocoder = None
+
+def get_geocoder():
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = Geocoder(web_request, default_geocode_cache())
+    return _geocoder
+
+def open_geocode_request():
+    # Eigen request context per suggestie, zodat een verouderde request afgebroken kan worden
+    return get_http_client().open_request()
+
 def geocode_address(address):
-    encoded = address.replace(' ', '%20').replace(',', '%2C')
-    url = "https://api.pdok.nl/bzk/locatieserver/search/v3_1/free?q={}&rows=5".format(encoded)
-    data = json.loads(web_request(url))
-    results = []
-    if data.get('response', {}).get('numFound', 0) > 0:
-        for d in data['response']['docs']:
-            centroid = d.get('centroide_rd', '')
-            if centroid:
-                coords = centroid.replace('POINT(', '').replace(')', '').split()
-                results.append((float(coords[0]), float(coords[1]), d.get('weergavenaam', address)))
-    return results
+    return get_geocoder().search(address)
 
 
 # =============================================================================
 # DATA DOWNLOAD FUNCTIES
 # =============================================================================
 
-def download_wmts_tiles(layer_config, rd_x, rd_y, bbox_size):
-    zoomlevel = layer_config.get('zoom', 12)
-    base_url = layer_config['url']
-    layer_name = layer_config['layer']
-    resolution = ZOOMLEVEL_RESOLUTIONS.get(zoomlevel, ZOOMLEVEL_RESOLUTIONS[12])
-    tile_width_m = WMTS_PIXEL_WIDTH * resolution
-    center_col = int((rd_x - WMTS_XCORNER) / tile_width_m)
-    center_row = int((WMTS_YCORNER - rd_y) / tile_width_m)
-    tiles_needed = int(math.ceil(bbox_size / tile_width_m))
-    if tiles_needed % 2 == 1:
-        tiles_needed += 1
-    half = tiles_needed // 2
-    cols = range(center_col - half, center_col + half + 1)
-    rows = range(center_row - half, center_row + half + 1)
-    tiles = []
-    for row in rows:
-        row_tiles = []
-        for col in cols:
-            url = "{base}?SERVICE=WMTS&REQUEST=GetTile&VERSION=1.0.0&LAYER={layer}&STYLE=default&FORMAT=image/png&TILEMATRIXSET=EPSG:28992&TILEMATRIX={zoom}&TILEROW={row}&TILECOL={col}".format(base=base_url, layer=layer_name, zoom=zoomlevel, row=row, col=col)
+def stitch_wmts_tiles(payloads, n_rows, n_cols):
+    combined = Bitmap(n_cols * WMTS_PIXEL_WIDTH, n_rows * WMTS_PIXEL_WIDTH)
+    graphics = Graphics.FromImage(combined)
+    for ri in range(n_rows):
+        for ci in range(n_cols):
+            payload = payloads[ri * n_cols + ci]
             try:
-                tile = download_image(url)
+                tile = bitmap_from_bytes(payload) if payload is not None else None
             except:
-                tile = Bitmap(WMTS_PIXEL_WIDTH, WMTS_PIXEL_WIDTH)
-            row_tiles.append(tile)
-        tiles.append(row_tiles)
-    total_w = len(cols) * WMTS_PIXEL_WIDTH
-    total_h = len(rows) * WMTS_PIXEL_WIDTH
-    combined = Bitmap(total_w, total_h)
-    graphics = Graphics.FromImage(combined)
-    for ri, row_tiles in enumerate(tiles):
-        for ci, tile in enumerate(row_tiles):
-            graphics.DrawImage(tile, ci * WMTS_PIXEL_WIDTH, ri * WMTS_PIXEL_WIDTH)
+                tile = None
+            if tile is not None:
+                graphics.DrawImage(tile, ci * WMTS_PIXEL_WIDTH, ri * WMTS_PIXEL_WIDTH)
+                tile.Dispose()
     graphics.Dispose()
-    return combined, len(cols) * tile_width_m, len(rows) * tile_width_m
-
-def download_wms_image(layer_config, rd_x, rd_y, bbox_size, image_size=2048):
-    base_url = layer_config['url']
-    layer_name = layer_config['layer']
-    half = bbox_size / 2
-    bbox = "{},{},{},{}".format(rd_x - half, rd_y - half, rd_x + half, rd_y + half)
-    url = "{base}?SERVICE=WMS&VERSION=1.3.0&REQUEST=GetMap&LAYERS={layer}&STYLES=&CRS=EPSG:28992&BBOX={bbox}&WIDTH={size}&HEIGHT={size}&FORMAT=image/png&TRANSPARENT=true".format(base=base_url, layer=layer_name, bbox=bbox, size=image_size)
-    return download_image(url), bbox_size, bbox_size
-
-def get_wfs_features(layer_config, rd_x, rd_y, bbox_size, max_features=500):
-    base_url = layer_config['url']
-    layer_name = layer_config['layer']
-    half = bbox_size / 2
-    bbox = (rd_x - half, rd_y - half, rd_x + half, rd_y + half)
-    url = "{base}?SERVICE=WFS&VERSION=2.0.0&REQUEST=GetFeature&TYPENAMES={layer}&BBOX={minx},{miny},{maxx},{maxy},urn:ogc:def:crs:EPSG::28992&COUNT={count}&OUTPUTFORMAT=application/json".format(base=base_url, layer=layer_name, minx=bbox[0], miny=bbox[1], maxx=bbox[2], maxy=bbox[3], count=max_features)
-    return json.loads(web_request(url)).get('features', [])
-
-def get_ogcapi_features(layer_config, rd_x, rd_y, bbox_size, max_features=500):
-    base_url = layer_config['url']
-    collection = layer_config['collection']
-    half = bbox_size / 2
-    url = "{base}/collections/{collection}/items?bbox={minx},{miny},{maxx},{maxy}&bbox-crs=http://www.opengis.net/def/crs/EPSG/0/28992&crs=http://www.opengis.net/def/crs/EPSG/0/28992&limit={limit}&f=json".format(base=base_url, collection=collection, minx=rd_x-half, miny=rd_y-half, maxx=rd_x+half, maxy=rd_y+half, limit=max_features)
-    return json.loads(web_request(url)).get('features', [])
-
-def extract_polygon_rings(geometry):
-    geom_type = geometry.get('type', '')
-    coords = geometry.get('coordinates', [])
-    rings = []
-    if geom_type == 'Polygon' and coords and coords[0]:
-        rings.append([(c[0], c[1]) for c in coords[0]])
-    elif geom_type == 'MultiPolygon' and coords:
-        for poly in coords:
-            if poly and poly[0]:
-                rings.append([(c[0], c[1]) for c in poly[0]])
-    return rings
-
-def create_detail_lines_in_view(doc, view, features, rd_x, rd_y):
+    return combined
+
+def create_detail_lines_in_view(doc, view, polylines, rd_x, rd_y):
+    # Polylines zijn al vereenvoudigd en ontdubbeld (zie line_simplify)
     lines_created = 0
-    offset_value = 0.0001
-    for feat_idx, feature in enumerate(features):
-        rings = extract_polygon_rings(feature.get('geometry', {}))
-        for ring_idx, ring in enumerate(rings):
-            if len(ring) < 3:
-                continue
-            poly_offset = (feat_idx * 100 + ring_idx) * offset_value
-            for i in range(len(ring)):
-                x1, y1 = ring[i]
-                x2, y2 = ring[(i + 1) % len(ring)]
-                p1 = XYZ(meters_to_internal(x1 - rd_x) + poly_offset, meters_to_internal(y1 - rd_y) + poly_offset, 0)
-                p2 = XYZ(meters_to_internal(x2 - rd_x) + poly_offset, meters_to_internal(y2 - rd_y) + poly_offset, 0)
-                if p1.DistanceTo(p2) > 0.01:
-                    try:
-                        doc.Create.NewDetailCurve(view, Line.CreateBound(p1, p2))
-                        lines_created += 1
-                    except:
-                        pass
+    for polyline in polylines:
+        for (x1, y1), (x2, y2) in zip(polyline, polyline[1:]):
+            p1 = XYZ(meters_to_internal(x1 - rd_x), meters_to_internal(y1 - rd_y), 0)
+            p2 = XYZ(meters_to_internal(x2 - rd_x), meters_to_internal(y2 - rd_y), 0)
+            if p1.DistanceTo(p2) > 0.01:
+                try:
+                    doc.Create.NewDetailCurve(view, Line.CreateBound(p1, p2))
+                    lines_created += 1
+                except:
+                    pass
     return lines_created
 
 
@@ -502,152 +524,364 @@ def create_detail_lines_in_view(doc, view, features, rd_x, rd_y):
 # 3D BAG CITYJSON
 # =============================================================================
 
-def get_3dbag_cityjson_bbox(rd_x, rd_y, bbox_size):
-    half = bbox_size / 2.0
-    api_url = "https://api.3dbag.nl/collections/pand/items?bbox={},{},{},{}".format(rd_x-half, rd_y-half, rd_x+half, rd_y+half)
-    print("3D BAG API URL: {}".format(api_url))
-    try:
-        data = json.loads(web_request(api_url))
-        metadata = data.get('metadata', {})
-        features = data.get('features', [])
-        if 'feature' in data and not features:
-            features = [data['feature']]
-        if not features:
-            return None, "Geen gebouwen gevonden"
-        print("Gevonden: {} gebouwen".format(len(features)))
-        return {'metadata': metadata, 'features': features}, None
-    except Exception as e:
-        return None, str(e)
-
-def parse_cityjson_lod22_geometry(cityjson_data, rd_x, rd_y):
-    metadata = cityjson_data.get('metadata', {})
-    features = cityjson_data.get('features', [])
-    transform = metadata.get('transform', {})
-    scale_raw = transform.get('scale', [1.0, 1.0, 1.0])
-    translate_raw = transform.get('translate', [0.0, 0.0, 0.0])
-    scale = [float(x) for x in scale_raw.split()] if isinstance(scale_raw, str) else list(scale_raw) if scale_raw else [1.0, 1.0, 1.0]
-    translate = [float(x) for x in translate_raw.split()] if isinstance(translate_raw, str) else list(translate_raw) if translate_raw else [0.0, 0.0, 0.0]
-    print("Transform - scale: {}, translate: {}".format(scale, translate))
-    buildings = []
-    for feature in features:
+def add_connected_face_set(builder, xyz_verts, polygon_faces):
+    """Voeg vlakken (indices in xyz_verts) als een connected face set toe.
+
+    Returns:
+        Aantal toegevoegde vlakken
+    """
+    faces_added = 0
+    opened = False
+    for poly_indices in polygon_faces:
+        if len(poly_indices) < 3:
+            continue
+        if any(idx >= len(xyz_verts) for idx in poly_indices):
+            continue
+        face_verts = List[XYZ]()
+        prev_pt = None
+        for idx in poly_indices:
+            pt = xyz_verts[idx]
+            if prev_pt is None or pt.DistanceTo(prev_pt) >= 0.0001:
+                face_verts.Add(pt)
+                prev_pt = pt
+        if face_verts.Count >= 3:
+            if face_verts[0].DistanceTo(face_verts[face_verts.Count - 1]) < 0.0001:
+                new_verts = List[XYZ]()
+                for i in range(face_verts.Count - 1):
+                    new_verts.Add(face_verts[i])
+                face_verts = new_verts
+            if face_verts.Count >= 3:
+                if not opened:
+                    builder.OpenConnectedFaceSet(False)
+                    opened = True
+                try:
+                    builder.AddFace(TessellatedFace(face_verts, ElementId.InvalidElementId))
+                    faces_added += 1
+                except:
+                    pass
+    if opened:
+        builder.CloseConnectedFaceSet()
+    return faces_added
+
+
+def finish_tessellated_shape(builder, triangles):
+    """Bouw de shape van een gevulde TessellatedShapeBuilder.
+
+    Returns:
+        Tuple (geometrische objecten of None, foutmelding)
+    """
+    builder.Target = TessellatedShapeBuilderTarget.AnyGeometry
+    # Geldige driehoeken (earcut) hebben de trage Salvage reparatie niet nodig
+    builder.Fallback = TessellatedShapeBuilderFallback.Mesh if triangles else TessellatedShapeBuilderFallback.Salvage
+    builder.Build()
+    result = builder.GetBuildResult()
+    print("  Outcome: {}".format(result.Outcome))
+    if result.Outcome == TessellatedShapeBuilderOutcome.Nothing:
+        return None, "TessellatedShapeBuilder returned Nothing"
+    geom_objects = result.GetGeometricalObjects()
+    if geom_objects.Count == 0:
+        return None, "Geen geometrie"
+    return geom_objects, None
+
+
+def to_xyz(vertices):
+    return [XYZ(meters_to_internal(v[0]), meters_to_internal(v[1]), meters_to_internal(v[2])) for v in vertices]
+
+
+def build_tessellated_geometry(vertices, polygon_faces, triangles):
+    """Bouw de Revit geometrie van een gebouw mesh (vertices in meters).
+
+    Returns:
+        Tuple (geometrische objecten of None, foutmelding)
+    """
+    builder = TessellatedShapeBuilder()
+    faces_added = add_connected_face_set(builder, to_xyz(vertices), polygon_faces)
+    print("  Faces: {}".format(faces_added))
+    if faces_added == 0:
+        return None, "Geen geldige vlakken"
+    return finish_tessellated_shape(builder, triangles)
+
+
+def directshape_name(building):
+    return "3DBAG_{}".format(building.get('id', 'unknown').replace('NL.IMBAG.Pand.', ''))
+
+
+def find_definition_type(doc, library, definition_id, existing):
+    """Id van een bestaand DirectShapeType voor definition_id, of None.
+
+    Eerst in de DirectShapeLibrary (deze Revit sessie); na heropenen van het
+    model via de typen in het document (existing: naam -> ElementId), die dan
+    weer aan de library toegevoegd worden.
+    """
+    type_id = library.FindDefinitionType(definition_id)
+    if type_id is not None and type_id != ElementId.InvalidElementId and doc.GetElement(type_id) is not None:
+        return type_id
+    type_id = existing.get(definition_id)
+    if type_id is not None:
+        library.AddDefinitionType(definition_id, type_id)
+    return type_id
+
+
+def create_directshapes_from_groups(doc, groups, span=None):
+    """Maak DirectShapes per vormgroep (zie mesh_tools.group_identical_buildings).
+
+    Een unieke vorm wordt een gewone DirectShape. Vormen die vaker voorkomen
+    worden een keer als DirectShapeType in de DirectShapeLibrary gebouwd en
+    als verschoven instanties geplaatst; een type van een eerdere import met
+    dezelfde vorm wordt hergebruikt. Met een span worden de tijd in de
+    TessellatedShapeBuilder en de aantallen bijgehouden.
+    """
+    def build(vertices, polygon_faces, triangles):
+        t0 = time.time()
+        result = build_tessellated_geometry(vertices, polygon_faces, triangles)
+        if span is not None:
+            span.add('tessellate_s', time.time() - t0)
+            span.add('shapes')
+            span.add('faces', len(polygon_faces))
+        return result
+
+    count = 0
+    seen = 0
+    last_error = ""
+    category_id = ElementId(BuiltInCategory.OST_GenericModel)
+    library = DirectShapeLibrary.GetDirectShapeLibrary(doc)
+    existing = None
+    for group in groups:
+        seen += len(group.members)
+        building = group.building
         try:
-            city_objects = feature.get('CityObjects', {})
-            vertices = feature.get('vertices', [])
-            if not vertices:
+            triangles = building.get('triangles')
+            polygon_faces = building_faces(building)
+            if not polygon_faces or not building['vertices']:
+                continue
+            if len(group.members) == 1:
+                geom_objects, error = build(building['vertices'], polygon_faces, triangles)
+                if geom_objects is None:
+                    last_error = error
+                    continue
+                ds = DirectShape.CreateElement(doc, category_id)
+                ds.SetShape(geom_objects)
+                try:
+                    ds.Name = directshape_name(building)
+                except:
+                    pass
+                count += 1
+                print("DirectShape: {}".format(building.get('id', 'unknown')))
                 continue
-            converted_verts = [(v[0]*scale[0]+translate[0]-rd_x, v[1]*scale[1]+translate[1]-rd_y, v[2]*scale[2]+translate[2]) for v in vertices]
-            for obj_id, obj in city_objects.items():
-                if obj.get('type', '') not in ['BuildingPart', 'Building']:
+
+            # De sleutel is een hash van de vorm: zelfde id = zelfde geometrie
+            definition_id = "3DBAG_{}".format(group.key[:16])
+            if existing is None:
+                existing = dict((t.Name, t.Id) for t in FilteredElementCollector(doc).OfClass(DirectShapeType))
+            type_id = find_definition_type(doc, library, definition_id, existing)
+            if type_id is None:
+                geom_objects, error = build(group.local_vertices(), polygon_faces, triangles)
+                if geom_objects is None:
+                    last_error = error
                     continue
-                for geom in obj.get('geometry', []):
-                    if str(geom.get('lod', '')) != '2.2':
-                        continue
-                    geom_type = geom.get('type', '')
-                    boundaries = geom.get('boundaries', [])
-                    if not boundaries:
-                        continue
-                    polygon_faces = []
-                    if geom_type == 'Solid':
-                        for shell in boundaries:
-                            for surface in shell:
-                                if surface and len(surface) > 0:
-                                    outer_ring = surface[0] if isinstance(surface[0], list) else surface
-                                    if len(outer_ring) >= 3:
-                                        polygon_faces.append(list(outer_ring))
-                    elif geom_type == 'MultiSurface':
-                        for surface in boundaries:
-                            if surface and len(surface) > 0:
-                                outer_ring = surface[0] if isinstance(surface[0], list) else surface
-                                if len(outer_ring) >= 3:
-                                    polygon_faces.append(list(outer_ring))
-                    if polygon_faces:
-                        buildings.append({'id': obj_id, 'vertices': converted_verts, 'polygon_faces': polygon_faces})
-                        print("Building {} - {} faces".format(obj_id, len(polygon_faces)))
+                shape_type = DirectShapeType.Create(doc, definition_id, category_id)
+                shape_type.SetShape(geom_objects)
+                type_id = shape_type.Id
+                library.AddDefinitionType(definition_id, type_id)
+                existing[definition_id] = type_id
+            elif span is not None:
+                span.add('reused_types')
+            for member, origin in group.members:
+                translation = XYZ(meters_to_internal(origin[0]), meters_to_internal(origin[1]),
+                                  meters_to_internal(origin[2]))
+                ds = DirectShape.CreateElementInstance(doc, type_id, category_id, definition_id,
+                                                       Transform.CreateTranslation(translation))
+                ds.SetTypeId(type_id)
+                try:
+                    ds.Name = directshape_name(member)
+                except:
+                    pass
+                count += 1
+            print("DirectShapeType: {} x{}".format(definition_id, len(group.members)))
         except Exception as e:
-            print("Parse error: {}".format(str(e)))
-    return buildings
+            last_error = str(e)
+            print("Error: {}".format(str(e)))
+    if span is not None:
+        span.set(buildings=seen, directshapes=count)
+    if seen == 0:
+        return 0, "Geen LOD 2.2 / 1.2 geometrie gevonden"
+    return (count, None) if count > 0 else (0, "Geen DirectShapes. Fout: {}".format(last_error))
 
-def create_directshapes_from_buildings(doc, buildings):
-    if not buildings:
-        return 0, "Geen gebouwen"
-    count = 0
+
+# Extensible Storage op 3D BAG tegel DirectShapes: gebouw id -> [eerste vlak, aantal vlakken]
+TILE_RANGES_SCHEMA_GUID = System.Guid("5b8f3c2e-6d41-4c7a-9e0b-2f1a7d4c9e63")
+TILE_RANGES_FIELD = "FaceRanges"
+
+
+def tile_ranges_schema():
+    """Het schema voor de vlakbereiken per gebouw (een JSON string), zo nodig aangemaakt."""
+    schema = Schema.Lookup(TILE_RANGES_SCHEMA_GUID)
+    if schema is None:
+        builder = SchemaBuilder(TILE_RANGES_SCHEMA_GUID)
+        builder.SetSchemaName("GIS2BIM_TileFaceRanges")
+        builder.SetDocumentation("3D BAG gebouw id -> [eerste vlak, aantal vlakken] in deze tegel (JSON)")
+        builder.SetReadAccessLevel(AccessLevel.Public)
+        builder.SetWriteAccessLevel(AccessLevel.Public)
+        builder.AddSimpleField(TILE_RANGES_FIELD, System.String)
+        schema = builder.Finish()
+    return schema
+
+
+def store_tile_ranges(element, tile):
+    """Bewaar de vlakbereiken van een tegel op zijn DirectShape."""
+    entity = Entity(tile_ranges_schema())
+    entity.Set[System.String](TILE_RANGES_FIELD, json.dumps(tile.face_ranges(), sort_keys=True))
+    element.SetEntity(entity)
+
+
+def create_directshapes_from_tiles(doc, tile_meshes, span=None, ranges_path=None):
+    """Maak een DirectShape per tegel (zie mesh_tools.merge_buildings_by_tile).
+
+    Elk gebouw wordt een eigen connected face set in de builder van zijn
+    tegel. De vlakbereiken per gebouw worden bijgewerkt naar de vlakken die
+    werkelijk in de builder kwamen (ongeldige vlakken vallen af) en via
+    Extensible Storage op de DirectShape bewaard (schema TILE_RANGES_SCHEMA_GUID); het
+    commentaar verwijst naar ranges_path (het JSON bestand van alle tegels).
+
+    Returns:
+        Tuple (aantal DirectShapes, dict tegel key -> element id,
+        dict tegel key -> foutmelding van niet geplaatste tegels, foutmelding of None)
+    """
+    category_id = ElementId(BuiltInCategory.OST_GenericModel)
+    element_ids = {}
+    errors = {}
     last_error = ""
-    for building in buildings:
+    for tile in tile_meshes:
         try:
-            vertices = building['vertices']
-            polygon_faces = building.get('polygon_faces', [])
-            obj_id = building.get('id', 'unknown')
-            if not polygon_faces or not vertices:
-                continue
-            xyz_verts = [XYZ(meters_to_internal(v[0]), meters_to_internal(v[1]), meters_to_internal(v[2])) for v in vertices]
+            t0 = time.time()
+            xyz_verts = to_xyz(tile.vertices)
             builder = TessellatedShapeBuilder()
-            builder.OpenConnectedFaceSet(False)
+            ranges = []
             faces_added = 0
-            for poly_indices in polygon_faces:
-                if len(poly_indices) < 3:
-                    continue
-                if any(idx >= len(xyz_verts) for idx in poly_indices):
-                    continue
-                face_verts = List[XYZ]()
-                prev_pt = None
-                for idx in poly_indices:
-                    pt = xyz_verts[idx]
-                    if prev_pt is None or pt.DistanceTo(prev_pt) >= 0.0001:
-                        face_verts.Add(pt)
-                        prev_pt = pt
-                if face_verts.Count >= 3:
-                    if face_verts[0].DistanceTo(face_verts[face_verts.Count - 1]) < 0.0001:
-                        new_verts = List[XYZ]()
-                        for i in range(face_verts.Count - 1):
-                            new_verts.Add(face_verts[i])
-                        face_verts = new_verts
-                    if face_verts.Count >= 3:
-                        try:
-                            builder.AddFace(TessellatedFace(face_verts, ElementId.InvalidElementId))
-                            faces_added += 1
-                        except:
-                            pass
-            print("  Faces: {}".format(faces_added))
+            for building_id, first, count in tile.ranges:
+                added = add_connected_face_set(builder, xyz_verts, tile.faces[first:first + count])
+                ranges.append((building_id, faces_added, added))
+                faces_added += added
             if faces_added == 0:
+                last_error = errors[tile.key] = "Geen geldige vlakken"
                 continue
-            builder.CloseConnectedFaceSet()
-            builder.Target = TessellatedShapeBuilderTarget.AnyGeometry
-            builder.Fallback = TessellatedShapeBuilderFallback.Salvage
-            builder.Build()
-            result = builder.GetBuildResult()
-            print("  Outcome: {}".format(result.Outcome))
-            if result.Outcome != TessellatedShapeBuilderOutcome.Nothing:
-                geom_objects = result.GetGeometricalObjects()
-                if geom_objects.Count > 0:
-                    ds = DirectShape.CreateElement(doc, ElementId(BuiltInCategory.OST_GenericModel))
-                    ds.SetShape(geom_objects)
-                    try:
-                        ds.Name = "3DBAG_{}".format(obj_id.replace('NL.IMBAG.Pand.', ''))
-                    except:
-                        pass
-                    count += 1
-                    print("DirectShape: {}".format(obj_id))
-            else:
-                last_error = "TessellatedShapeBuilder returned Nothing"
+            geom_objects, error = finish_tessellated_shape(builder, tile.triangles)
+            if span is not None:
+                span.add('tessellate_s', time.time() - t0)
+                span.add('shapes')
+                span.add('faces', faces_added)
+            if geom_objects is None:
+                last_error = errors[tile.key] = error
+                continue
+            tile.ranges = ranges
+            ds = DirectShape.CreateElement(doc, category_id)
+            ds.SetShape(geom_objects)
+            element_ids[tile.key] = ds.Id.IntegerValue
+            name = "3DBAG_tegel_{}_{}".format(int(tile.bounds[0]), int(tile.bounds[1]))
+            try:
+                ds.Name = name
+                comments = ds.get_Parameter(BuiltInParameter.ALL_MODEL_INSTANCE_COMMENTS)
+                if comments is not None and not comments.IsReadOnly:
+                    text = "{} gebouwen, {} vlakken".format(len(ranges), faces_added)
+                    if ranges_path:
+                        text += "; vlakken per gebouw: {}".format(ranges_path)
+                    comments.Set(text)
+            except:
+                pass
+            try:
+                store_tile_ranges(ds, tile)
+            except Exception as e:
+                print("Vlakbereiken niet op {} bewaard: {}".format(name, str(e)))
+            print("DirectShape: {} ({} gebouwen, {} vlakken)".format(name, len(ranges), faces_added))
         except Exception as e:
-            last_error = str(e)
+            last_error = errors[tile.key] = str(e)
             print("Error: {}".format(str(e)))
-    return (count, None) if count > 0 else (0, "Geen DirectShapes. Fout: {}".format(last_error))
+    if span is not None:
+        span.set(buildings=sum(len(tile.ranges) for tile in tile_meshes if tile.key in element_ids),
+                 directshapes=len(element_ids))
+    if not element_ids:
+        return 0, element_ids, errors, "Geen DirectShapes. Fout: {}".format(last_error or "geen gebouwen")
+    return len(element_ids), element_ids, errors, None
+
 
-def import_3dbag_cityjson(doc, rd_x, rd_y, bbox_size):
+def import_3dbag_cityjson(doc, prepared, tracer=None, output_folder=None):
     print("=" * 50)
-    print("3D BAG CityJSON Import - RD {}, {} - {}m".format(int(rd_x), int(rd_y), bbox_size))
-    cityjson_data, error = get_3dbag_cityjson_bbox(rd_x, rd_y, bbox_size)
-    if error:
-        return False, "Download mislukt: {}".format(error)
-    buildings = parse_cityjson_lod22_geometry(cityjson_data, rd_x, rd_y)
-    if not buildings:
-        return False, "Geen LOD 2.2 geometrie gevonden"
-    print("Parsed: {} gebouwen".format(len(buildings)))
-    count, error = create_directshapes_from_buildings(doc, buildings)
+    print("3D BAG CityJSON Import - RD {}, {} - {}m".format(int(prepared.rd_x), int(prepared.rd_y), prepared.bbox_size))
+    tile_meshes = prepared.data.get('tile_meshes')
+    if tile_meshes is not None:
+        # Gebouw id -> vlakbereik per tegel element: op het element zelf en alle
+        # tegels samen naast de andere GIS2BIM bestanden
+        path = os.path.join(output_folder or tempfile.gettempdir(), "GIS2BIM_{}.tiles.json".format(prepared.key))
+        with (tracer or Tracer()).span('directshapes', prepared.key) as span:
+            count, element_ids, errors, error = create_directshapes_from_tiles(doc, tile_meshes, span, path)
+        if error:
+            return False, error
+        write_tile_ranges(path, tile_meshes, element_ids, errors)
+        message = "{} gebouwen in {} tegels geimporteerd ({})".format(
+            sum(len(tile.ranges) for tile in tile_meshes if tile.key in element_ids), count, os.path.basename(path))
+        if errors:
+            message += ", {} tegels mislukt".format(len(errors))
+        return True, message
+    groups = prepared.data.get('shape_groups')
+    if groups is None:
+        groups = group_identical_buildings(prepared.data['buildings'])
+    with (tracer or Tracer()).span('directshapes', prepared.key) as span:
+        count, error = create_directshapes_from_groups(doc, groups, span)
     if error:
         return False, error
-    return True, "{} gebouwen geimporteerd".format(count)
+    return True, "{} gebouwen geimporteerd ({} unieke vormen)".format(count, len(groups))
+
+
+# =============================================================================
+# AHN MAAIVELD
+# =============================================================================
+
+def terrain_category_id(doc):
+    """Toposolid (Revit 2024+) of Topografie als DirectShape categorie, anders Generic Model."""
+    for name in ('OST_Toposolid', 'OST_Topography'):
+        category = getattr(BuiltInCategory, name, None)
+        if category is None:
+            continue
+        category_id = ElementId(category)
+        try:
+            if DirectShape.IsValidCategoryId(category_id, doc):
+                return category_id
+        except:
+            pass
+    return ElementId(BuiltInCategory.OST_GenericModel)
+
+
+def import_ahn_terrain(doc, prepared, tracer=None):
+    """Plaats het AHN maaiveld (terrain_tin mesh) als een DirectShape."""
+    print("=" * 50)
+    print("AHN Maaiveld Import - RD {}, {} - {}m".format(int(prepared.rd_x), int(prepared.rd_y), prepared.bbox_size))
+    terrain = prepared.data['terrain']
+    with (tracer or Tracer()).span('directshapes', prepared.key) as span:
+        t0 = time.time()
+        builder = TessellatedShapeBuilder()
+        faces_added = add_connected_face_set(builder, to_xyz(terrain['vertices']), terrain['polygon_faces'])
+        print("  Faces: {}".format(faces_added))
+        if faces_added == 0:
+            return False, "Geen geldige vlakken"
+        # Alle maaiveld vlakken zijn driehoeken; Mesh als fallback in plaats van Salvage
+        geom_objects, error = finish_tessellated_shape(builder, True)
+        span.set(tessellate_s=time.time() - t0, faces=faces_added)
+        if geom_objects is None:
+            return False, error
+        ds = DirectShape.CreateElement(doc, terrain_category_id(doc))
+        ds.SetShape(geom_objects)
+        try:
+            ds.Name = "AHN_maaiveld_{}_{}".format(int(prepared.rd_x), int(prepared.rd_y))
+            comments = ds.get_Parameter(BuiltInParameter.ALL_MODEL_INSTANCE_COMMENTS)
+            if comments is not None and not comments.IsReadOnly:
+                comments.Set("AHN {}, {:.2f} m grid, {}".format(prepared.layer.get('layer'),
+                                                                prepared.data['resolution'],
+                                                                prepared.stats['tin'].summary()))
+        except:
+            pass
+        span.set(directshapes=1)
+    return True, "{} driehoeken, {:.1f} tot {:.1f} m NAP".format(
+        terrain['surface_triangles'], terrain['min_z'], terrain['max_z'])
 
 
 # =============================================================================
@@ -668,8 +902,12 @@ def create_gis2bim_dialog(doc):
         'layer_bbox_sizes': {key: 500 for key in GIS_LAYERS},
         'map_image': None,
         'map_bbox_size': 500,
-        'map_width_px': 0,
-        'map_height_px': 0,
+        'map_pyramid': None,
+        'map_loader': None,
+        'map_placements': [],
+        'tracer': None,
+        'dedup': None,
+        'busy': False,
     }
 
     # Get project location
@@ -718,8 +956,6 @@ def create_gis2bim_dialog(doc):
     form.Controls.Add(map_picture)
     controls['map_picture'] = map_picture
 
-    state['map_width_px'] = width
-    state['map_height_px'] = map_height
 
     zoom_y = map_top + map_height + scale(5)
     zoom_slider = WinForms.TrackBar()
@@ -828,7 +1064,7 @@ def create_gis2bim_dialog(doc):
     # Populate layers
     for key, layer in GIS_LAYERS.items():
         item = ListViewItem(layer['name'])
-        item.SubItems.Add({'wmts': 'Kaart', 'wms': 'Kaart', 'wfs': 'Lijnen', 'ogcapi': 'Lijnen', '3dbag_cityjson': 'LOD2.2'}.get(layer['type'], layer['type']))
+        item.SubItems.Add({'wmts': 'Kaart', 'wms': 'Kaart', 'wfs': 'Lijnen', 'ogcapi': 'Lijnen', '3dbag_cityjson': 'LOD2.2', 'ahn_dtm': 'TIN'}.get(layer['type'], layer['type']))
         item.SubItems.Add("500m")
         item.SubItems.Add("Gereed")
         item.Tag = key
@@ -905,19 +1141,78 @@ def create_gis2bim_dialog(doc):
     controls['btn_close'] = btn_close
 
     # === EVENT HANDLERS ===
-    def load_map():
+    def get_map_pyramid():
+        if state['map_pyramid'] is None:
+            # Luchtfoto WMTS tiles, gedeeld met de tile cache van de import. De
+            # UI thread leest alleen de cache; downloads lopen via de TileLoader
+            cache = get_tile_cache()
+
+            def cached(url):
+                return cache.get(wmts_url_key(url))
+
+            def download(url):
+                data = fetch_bytes(url, cached=cache.get_stale(wmts_url_key(url)))
+                cache.put(wmts_url_key(url), data)
+                return data
+            state['map_pyramid'] = TilePyramid(
+                MAP_PREVIEW_URL, MAP_PREVIEW_LAYER, ZOOMLEVEL_RESOLUTIONS, WMTS_XCORNER, WMTS_YCORNER,
+                download, bitmap_from_bytes, tile_px=WMTS_PIXEL_WIDTH, dispose_func=lambda img: img.Dispose(),
+                cached_func=cached)
+            state['map_loader'] = TileLoader(state['map_pyramid'], on_tiles_loaded)
+        return state['map_pyramid']
+
+    def on_tiles_loaded(images, latest):
+        # Achtergrond thread: tiles op de UI thread opslaan en opnieuw tekenen
+        def apply():
+            get_map_pyramid().store(images)
+            get_tile_cache().flush()
+            if latest:
+                render_map()
         try:
-            half = state['map_bbox_size'] / 2.0
-            # Use luchtfoto RGB service (publicly available aerial imagery)
-            url = "https://service.pdok.nl/hwh/luchtfotorgb/wms/v1_0?SERVICE=WMS&VERSION=1.3.0&REQUEST=GetMap&LAYERS=Actueel_orthoHR&STYLES=&CRS=EPSG:28992&BBOX={},{},{},{}&WIDTH={}&HEIGHT={}&FORMAT=image/png".format(
-                state['rd_x']-half, state['rd_y']-half, state['rd_x']+half, state['rd_y']+half,
-                int(state['map_width_px']), int(state['map_height_px']))
-            state['map_image'] = download_image(url)
-            draw_marker()
+            form.BeginInvoke(System.Action(apply))
+        except:
+            pass
+
+    def load_map(retry=False):
+        try:
+            pyramid = get_map_pyramid()
+            if retry:
+                pyramid.retry_failed()
+            placements = pyramid.layout(state['rd_x'], state['rd_y'], state['map_bbox_size'], MAP_PREVIEW_PX)
+            state['map_placements'] = placements
+            _, missing = pyramid.take_ready(placements)
+            render_map()
+            if missing:
+                state['map_loader'].request(missing)
         except Exception as e:
             print("Map error: {}".format(str(e)))
             controls['map_picture'].Image = None
 
+    def render_map():
+        """Teken de huidige layout uit de geheugencache; ontbrekende tiles met een grovere tile."""
+        pyramid = get_map_pyramid()
+        size = MAP_PREVIEW_PX
+        img = Bitmap(size, size)
+        g = Graphics.FromImage(img)
+        g.Clear(DrawingColor.FromArgb(240, 240, 240))
+        for p in state['map_placements']:
+            left, top = int(round(p.x)), int(round(p.y))
+            dest = Rectangle(left, top, int(round(p.x + p.size)) - left, int(round(p.y + p.size)) - top)
+            tile = pyramid.tile(p.key)
+            if tile is not None:
+                g.DrawImage(tile, dest)
+                continue
+            coarse = pyramid.fallback(p)
+            if coarse is not None:
+                image, sx, sy, side = coarse
+                source = Rectangle(int(round(sx)), int(round(sy)), max(1, int(round(side))), max(1, int(round(side))))
+                g.DrawImage(image, dest, source, GraphicsUnit.Pixel)
+        g.Dispose()
+        if state['map_image'] is not None:
+            state['map_image'].Dispose()
+        state['map_image'] = img
+        draw_marker()
+
     def draw_marker():
         if state['map_image'] is None:
             return
@@ -964,29 +1259,59 @@ def create_gis2bim_dialog(doc):
         except:
             show_warning("Ongeldige coordinaten")
 
+    def show_address_results(results):
+        state['address_results'] = results
+        controls['lst_address'].Items.Clear()
+        for result in results:
+            item = ListViewItem(result['name'])
+            item.SubItems.Add(str(int(result['x'])) if result['x'] is not None else "")
+            item.SubItems.Add(str(int(result['y'])) if result['y'] is not None else "")
+            controls['lst_address'].Items.Add(item)
+
     def on_search(sender, args):
         address = controls['txt_address'].Text.strip()
         if not address:
             return
         try:
+            autocomplete.cancel()
             controls['lbl_status'].Text = "Zoeken..."
             Application.DoEvents()
-            state['address_results'] = geocode_address(address)
-            controls['lst_address'].Items.Clear()
-            for rx, ry, name in state['address_results']:
-                item = ListViewItem(name)
-                item.SubItems.Add(str(int(rx)))
-                item.SubItems.Add(str(int(ry)))
-                controls['lst_address'].Items.Add(item)
+            show_address_results(geocode_address(address))
             controls['lbl_status'].Text = "{} resultaten".format(len(state['address_results']))
         except Exception as e:
             show_error(str(e))
 
+    def on_suggestions(text, results):
+        # Achtergrond thread: resultaat naar de UI thread sturen
+        def apply():
+            if controls['txt_address'].Text == text:
+                show_address_results(results)
+        try:
+            form.BeginInvoke(System.Action(apply))
+        except:
+            pass
+
+    autocomplete = AutoComplete(get_geocoder(), on_suggestions, open_request=open_geocode_request)
+
+    def on_address_text_changed(sender, args):
+        if GEOCODE_AUTOCOMPLETE:
+            autocomplete.update(controls['txt_address'].Text)
+
     def on_address_select(sender, args):
         if controls['lst_address'].SelectedIndices.Count > 0:
             idx = controls['lst_address'].SelectedIndices[0]
             if idx < len(state['address_results']):
-                state['rd_x'], state['rd_y'], _ = state['address_results'][idx]
+                result = state['address_results'][idx]
+                if result['x'] is None:
+                    try:
+                        result = get_geocoder().resolve(result)
+                    except Exception as e:
+                        show_error(str(e))
+                        return
+                    if result['x'] is None:
+                        return
+                    state['address_results'][idx] = result
+                state['rd_x'], state['rd_y'] = result['x'], result['y']
                 controls['txt_rd_x'].Text = str(int(state['rd_x']))
                 controls['txt_rd_y'].Text = str(int(state['rd_y']))
                 controls['lbl_location'].Text = "Locatie: RD X {} | RD Y {}".format(int(state['rd_x']), int(state['rd_y']))
@@ -1027,49 +1352,84 @@ def create_gis2bim_dialog(doc):
 
     def select_3d(sender, args):
         for item in controls['lst_layers'].Items:
-            item.Checked = GIS_LAYERS.get(item.Tag, {}).get('type') == '3dbag_cityjson'
-
-    def import_layer(key, layer, sheet_num, bbox, output_folder):
+            item.Checked = GIS_LAYERS.get(item.Tag, {}).get('type') in ['3dbag_cityjson', 'ahn_dtm']
+
+    def prepare(key, bbox, output_folder):
+        # Achtergrond thread: alleen downloaden en verwerken, geen Revit API
+        return prepare_layer(key, GIS_LAYERS[key], state['rd_x'], state['rd_y'], bbox,
+                             fetch_bytes, web_request, get_tile_cache(), output_folder, decode_rgba_rows,
+                             dedup=state['dedup'], tracer=state['tracer'], vector_cache=get_vector_cache())
+
+    def import_layer(prepared, sheet_num, output_folder):
+        key, layer, data = prepared.key, prepared.layer, prepared.data
+        tracer = state['tracer']
+        if prepared.error:
+            raise Exception(prepared.error)
+        for line in prepared.summaries():
+            print(line)
         if layer['type'] == '3dbag_cityjson':
-            success, msg = import_3dbag_cityjson(state['doc'], state['rd_x'], state['rd_y'], bbox)
+            success, msg = import_3dbag_cityjson(state['doc'], prepared, tracer, output_folder)
             if not success:
                 raise Exception(msg)
             return msg
-        sheet, _ = get_or_create_sheet(state['doc'], layer['sheet_name'], sheet_num)
-        view = None
-        for v in FilteredElementCollector(state['doc']).OfClass(ViewDrafting).ToElements():
-            if v.Name == "GIS_{}".format(key):
-                view = v
-                break
-        if view is None:
-            view = create_drafting_view(state['doc'], "GIS_{}".format(key))
-        if layer['type'] == 'wmts':
-            bitmap, width_m, _ = download_wmts_tiles(layer, state['rd_x'], state['rd_y'], bbox)
-            path = os.path.join(output_folder, "GIS2BIM_{}.png".format(key))
-            bitmap.Save(path, ImageFormat.Png)
-            import_image_to_view(state['doc'], view, path, width_m)
-            place_view_on_sheet(state['doc'], sheet, view)
-            return "OK"
-        elif layer['type'] == 'wms':
-            bitmap, width_m, _ = download_wms_image(layer, state['rd_x'], state['rd_y'], bbox)
-            path = os.path.join(output_folder, "GIS2BIM_{}.png".format(key))
-            bitmap.Save(path, ImageFormat.Png)
-            import_image_to_view(state['doc'], view, path, width_m)
-            place_view_on_sheet(state['doc'], sheet, view)
-            return "OK"
-        elif layer['type'] == 'wfs':
-            features = get_wfs_features(layer, state['rd_x'], state['rd_y'], bbox)
-            lines = create_detail_lines_in_view(state['doc'], view, features, state['rd_x'], state['rd_y']) if features else 0
-            place_view_on_sheet(state['doc'], sheet, view)
-            return "{} lijnen".format(lines)
-        elif layer['type'] == 'ogcapi':
-            features = get_ogcapi_features(layer, state['rd_x'], state['rd_y'], bbox)
-            lines = create_detail_lines_in_view(state['doc'], view, features, state['rd_x'], state['rd_y']) if features else 0
-            place_view_on_sheet(state['doc'], sheet, view)
+        if layer['type'] == 'ahn_dtm':
+            success, msg = import_ahn_terrain(state['doc'], prepared, tracer)
+            if not success:
+                raise Exception(msg)
+            return msg
+        with tracer.span('view', key):
+            sheet, _ = get_or_create_sheet(state['doc'], layer['sheet_name'], sheet_num)
+            view = None
+            for v in FilteredElementCollector(state['doc']).OfClass(ViewDrafting).ToElements():
+                if v.Name == "GIS_{}".format(key):
+                    view = v
+                    break
+            if view is None:
+                view = create_drafting_view(state['doc'], "GIS_{}".format(key))
+        if layer['type'] in ('wmts', 'wms'):
+            if layer['type'] == 'wmts':
+                with tracer.span('png_encode', key) as span:
+                    bitmap = stitch_wmts_tiles(data['payloads'], len(data['rows']), len(data['cols']))
+                    path = os.path.join(output_folder, "GIS2BIM_{}.png".format(key))
+                    bitmap.Save(path, ImageFormat.Png)
+                    span.set(pixels=bitmap.Width * bitmap.Height, png_bytes=os.path.getsize(path))
+                    bitmap.Dispose()
+                message = "OK"
+            else:
+                # Mosaic staat al als PNG in de output map (zie wms_tiler)
+                path = data['path']
+                message = "OK ({:.2f} m/px)".format(data['resolution'])
+            with tracer.span('image_create', key) as span:
+                import_image_to_view(state['doc'], view, path, data['width_m'])
+                span.set(png_bytes=os.path.getsize(path))
+            with tracer.span('sheet', key):
+                place_view_on_sheet(state['doc'], sheet, view)
+            return message
+        elif layer['type'] in ('wfs', 'ogcapi'):
+            with tracer.span('detail_curves', key) as span:
+                lines = create_detail_lines_in_view(state['doc'], view, data['polylines'], state['rd_x'], state['rd_y'])
+                span.set(polylines=len(data['polylines']), curves=lines)
+            with tracer.span('sheet', key):
+                place_view_on_sheet(state['doc'], sheet, view)
+            if data['truncated']:
+                return "{} lijnen (max {} features)".format(lines, OGCAPI_MAX_FEATURES)
             return "{} lijnen".format(lines)
         return "Onbekend"
 
+    def set_busy(busy):
+        # Tijdens een import pompt DoEvents de message loop binnen een open
+        # Transaction: geen tweede import starten en de form niet sluiten
+        state['busy'] = busy
+        controls['btn_execute'].Enabled = not busy
+        controls['btn_close'].Enabled = not busy
+
+    def on_form_closing(sender, args):
+        if state['busy']:
+            args.Cancel = True
+
     def on_execute(sender, args):
+        if state['busy']:
+            return
         selected = [item.Tag for item in controls['lst_layers'].Items if item.Checked]
         if not selected:
             show_warning("Selecteer minimaal één laag")
@@ -1079,27 +1439,43 @@ def create_gis2bim_dialog(doc):
         output_folder = os.path.join(os.path.dirname(state['doc'].PathName), "GIS2BIM") if state['doc'].PathName else tempfile.gettempdir()
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
-        results = []
+        # Trace naast de GIS2BIM map; zonder opgeslagen project in de temp map
+        state['tracer'] = Tracer(trace_path(output_folder) if state['doc'].PathName else os.path.join(output_folder, TRACE_NAME))
+        # Identieke geometrie in meerdere vectorlagen maar een keer tekenen
+        state['dedup'] = GeometryDedup()
+        results = [None] * len(selected)
+        set_busy(True)
         try:
+            # Alle lagen downloaden op de achtergrond; hier alleen Revit elementen maken
+            jobs = [(key, state['layer_bbox_sizes'].get(key, 500), output_folder) for key in selected]
+            controls['lbl_status'].Text = "Downloaden: {} lagen...".format(len(selected))
             with Transaction(state['doc'], "GIS2BIM - Import") as t:
                 t.Start()
-                for i, key in enumerate(selected):
-                    layer = GIS_LAYERS[key]
-                    bbox = state['layer_bbox_sizes'].get(key, 500)
+                ready = iter_prepared_layers(jobs, prepare, LAYER_WORKERS, idle=Application.DoEvents)
+                for done, (i, prepared) in enumerate(ready):
+                    layer = GIS_LAYERS[selected[i]]
                     controls['lbl_status'].Text = "Importeren: {}...".format(layer['name'])
-                    controls['progress'].Value = int((i / float(len(selected))) * 100)
+                    controls['progress'].Value = int((done / float(len(selected))) * 100)
                     Application.DoEvents()
                     try:
-                        result = import_layer(key, layer, "GIS-{:02d}".format(i+1), bbox, output_folder)
-                        results.append("{}: {}".format(layer['name'], result))
+                        if isinstance(prepared, Exception):
+                            raise prepared
+                        result = import_layer(prepared, "GIS-{:02d}".format(i+1), output_folder)
+                        results[i] = "{}: {}".format(layer['name'], result)
                     except Exception as e:
-                        results.append("{}: FOUT - {}".format(layer['name'], str(e)))
+                        results[i] = "{}: FOUT - {}".format(layer['name'], str(e))
                 t.Commit()
+            print(state['tracer'].summary_table())
+            print("Trace: {}".format(state['tracer'].path))
+            print("HTTP: {}".format(get_http_client().stats.summary()))
+            get_http_client().validators.flush()
             controls['progress'].Value = 100
             controls['lbl_status'].Text = "Voltooid!"
             show_info("Import voltooid!\n\n" + "\n".join(["- " + r for r in results]))
         except Exception as e:
             show_error(str(e))
+        finally:
+            set_busy(False)
 
     def on_close(sender, args):
         form.Close()
@@ -1108,8 +1484,12 @@ def create_gis2bim_dialog(doc):
     controls['zoom_slider'].ValueChanged += on_zoom_changed
     controls['map_picture'].MouseClick += on_map_click
     controls['btn_goto'].Click += on_goto_coords
-    controls['btn_refresh'].Click += lambda s, e: load_map()
+    controls['btn_refresh'].Click += lambda s, e: load_map(retry=True)
     controls['btn_search'].Click += on_search
+    controls['txt_address'].TextChanged += on_address_text_changed
+    form.FormClosing += on_form_closing
+    form.FormClosed += lambda s, e: autocomplete.close()
+    form.FormClosed += lambda s, e: state['map_loader'] and state['map_loader'].close()
     controls['lst_address'].SelectedIndexChanged += on_address_select
     controls['btn_apply_loc'].Click += on_apply_location
     controls['lst_layers'].SelectedIndexChanged += on_layer_select
@@ -1121,8 +1501,8 @@ def create_gis2bim_dialog(doc):
     controls['btn_execute'].Click += on_execute
     controls['btn_close'].Click += on_close
 
-    # Initial map load
-    load_map()
+    # Initial map load zodra de form een handle heeft (nodig voor BeginInvoke)
+    form.Shown += lambda s, e: load_map()
 
     return form
 
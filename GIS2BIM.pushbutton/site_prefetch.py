@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Prefetch voor GIS2BIM - caches vullen voor komende projectlocaties
+Leest een lijst met adressen of RD coordinaten, geocodeert de adressen en
+downloadt per locatie en laag alvast de data in dezelfde caches die de
+Revit import gebruikt (tile cache voor WMTS/WMS, 3D BAG pagina's en AHN
+grids, vector cache voor WFS/OGC API, geocode cache voor de adressen). De eerste
+interactieve import van die locaties is dan cache-warm.
+
+Invoerbestand (UTF-8, een locatie per regel, # is commentaar). Na '|' kunnen
+per laag bbox groottes volgen die de standaard van --layers aanvullen of
+overschrijven:
+
+    Burgemeester de Raadtsingel 93, Dordrecht
+    99628 424889
+    Stationsplein 1, Utrecht | top10nl=1000, bag_3d_cityjson=250
+
+Voortgang wordt per (locatie, laag, bbox) in <invoer>.progress.jsonl
+bijgehouden; een afgebroken run gaat bij een herstart verder waar hij was
+(mislukte stappen worden opnieuw geprobeerd).
+
+    python site_prefetch.py projecten.txt --layers top10nl=500,bgt_wegdelen,bag_3d_cityjson=300
+"""
+
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from gis_pipeline import (GIS_LAYERS, LAYER_WORKERS, WMTS_MAX_WORKERS, WMTS_RETRIES, THREEDBAG_URL,
+                          fetch_ahn_grid, fetch_wmts_tiles, get_3dbag_cityjson_pages, http_fetch_bytes,
+                          http_fetch_text, iter_prepared_layers, prepare_layer, wms_tile_plan)
+from geocoder import Geocoder, default_geocode_cache
+from http_client import default_client
+from span_tracer import Tracer
+from tile_cache import TileCache, url_key
+from tile_fetcher import fetch_tiles
+from vector_cache import VectorCache
+from wms_tiler import wms_getmap_tile_url
+
+
+DEFAULT_BBOX_SIZE = 500
+PROGRESS_SUFFIX = '.progress.jsonl'
+
+_RD_LINE = re.compile(r'^\s*(-?\d+(?:[.,]\d+)?)[\s;,]+(-?\d+(?:[.,]\d+)?)\s*$')
+
+
+def parse_layer_sizes(text, default_size=DEFAULT_BBOX_SIZE):
+    """'top10nl=500, bag_3d_cityjson' -> {'top10nl': 500.0, 'bag_3d_cityjson': default_size}."""
+    sizes = {}
+    for part in text.split(','):
+        key, _, size = part.strip().partition('=')
+        key = key.strip()
+        if not key:
+            continue
+        if key not in GIS_LAYERS:
+            raise ValueError("Onbekende laag '{}'".format(key))
+        sizes[key] = float(size) if size.strip() else float(default_size)
+    return sizes
+
+
+class Site(object):
+    """Een projectlocatie: adres of RD coordinaten, met bbox groottes per laag."""
+
+    def __init__(self, text, bbox_sizes, rd=None):
+        self.text = text
+        self.bbox_sizes = bbox_sizes
+        self.rd = rd
+        self.name = text
+
+    @property
+    def key(self):
+        return self.text.strip().lower()
+
+
+def parse_site_line(line, default_sizes):
+    """Een regel van het invoerbestand -> Site, of None voor lege/commentaar regels."""
+    line = line.split('#', 1)[0].strip()
+    if not line:
+        return None
+    text, _, extra = line.partition('|')
+    text = text.strip()
+    sizes = dict(default_sizes)
+    if extra.strip():
+        sizes.update(parse_layer_sizes(extra))
+    match = _RD_LINE.match(text)
+    rd = None
+    if match:
+        rd = (float(match.group(1).replace(',', '.')), float(match.group(2).replace(',', '.')))
+    return Site(text, sizes, rd)
+
+
+def read_sites(path, default_sizes):
+    sites = []
+    with io.open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            site = parse_site_line(line, default_sizes)
+            if site is not None:
+                sites.append(site)
+    return sites
+
+
+def progress_path(sites_path):
+    return sites_path + PROGRESS_SUFFIX
+
+
+class PrefetchProgress(object):
+    """Voortgang als JSON regels; de laatste regel per stap telt.
+
+    Stappen: ('geocode', locatie) met de gevonden coordinaten en
+    ('layer', locatie, laag, bbox) per gevulde laag. Thread-safe.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with io.open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Half geschreven laatste regel van een afgebroken run
+                        continue
+                    self.entries[self._key(entry)] = entry
+
+    @staticmethod
+    def _key(entry):
+        return (entry.get('step'), entry.get('site'), entry.get('layer'), entry.get('bbox'))
+
+    def get(self, step, site, layer=None, bbox=None):
+        with self._lock:
+            return self.entries.get((step, site, layer, bbox))
+
+    def done(self, step, site, layer=None, bbox=None):
+        entry = self.get(step, site, layer, bbox)
+        return entry is not None and entry.get('ok', False)
+
+    def record(self, step, site, layer=None, bbox=None, **values):
+        entry = dict(values, step=step, site=site, layer=layer, bbox=bbox, time=round(time.time(), 1))
+        line = json.dumps(entry, sort_keys=True)
+        with self._lock:
+            self.entries[self._key(entry)] = entry
+            if self.path:
+                with io.open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(u"{}\n".format(line))
+        return entry
+
+
+class PrefetchStats(object):
+    """Tellers van een prefetch run."""
+
+    def __init__(self):
+        self.sites = 0
+        self.geocoded = 0
+        self.not_found = 0
+        self.layers = 0
+        self.skipped = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        return "{} locaties ({} gegeocodeerd, {} niet gevonden), {} lagen gevuld, {} al klaar, {} mislukt in {:.1f}s".format(
+            self.sites, self.geocoded, self.not_found, self.layers, self.skipped, self.failed, self.seconds)
+
+
+def warm_layer(key, layer_config, rd_x, rd_y, bbox_size, fetch_bytes, fetch_text, cache, vector_cache):
+    """Download een laag alleen naar de caches (zonder PNG of geometrie te maken).
+
+    Returns:
+        Korte melding; gooit een exception als de laag niet gevuld kon worden
+    """
+    layer_type = layer_config['type']
+    if layer_type == 'wmts':
+        payloads = fetch_wmts_tiles(layer_config, rd_x, rd_y, bbox_size, fetch_bytes, cache)[0]
+        failed = payloads.count(None)
+        if failed:
+            raise IOError("{} van {} tiles mislukt".format(failed, len(payloads)))
+        return "{} tiles".format(len(payloads))
+    if layer_type == 'wms':
+        plan = wms_tile_plan(layer_config, rd_x, rd_y, bbox_size)
+        urls = [wms_getmap_tile_url(layer_config['url'], layer_config['layer'], t.bbox, t.width, t.height)
+                for t in plan.tiles()]
+        payloads, stats = fetch_tiles(urls, cache.wrap(fetch_bytes, url_key),
+                                      max_workers=layer_config.get('max_workers', WMTS_MAX_WORKERS),
+                                      retries=layer_config.get('retries', WMTS_RETRIES))
+        cache.flush()
+        if stats.failed:
+            raise IOError("{} van {} tiles mislukt".format(stats.failed, len(urls)))
+        return "{} tiles".format(len(urls))
+    if layer_type == '3dbag_cityjson':
+        pages = get_3dbag_cityjson_pages(rd_x, rd_y, bbox_size, cache.wrap_text(fetch_text, url_key),
+                                         base_url=layer_config.get('url', THREEDBAG_URL))
+        count = sum(len(page.get('features', []) or []) for page in pages)
+        cache.flush()
+        return "{} gebouwen".format(count)
+    if layer_type == 'ahn_dtm':
+        plan = fetch_ahn_grid(layer_config, rd_x, rd_y, bbox_size, fetch_bytes, cache)[0]
+        return "{}x{} hoogtepunten".format(plan.width, plan.height)
+    # WFS / OGC API: via prepare_layer, dat de geparste ringen in de vector cache zet
+    prepared = prepare_layer(key, layer_config, rd_x, rd_y, bbox_size, fetch_bytes, fetch_text, cache,
+                             tracer=Tracer(), vector_cache=vector_cache)
+    if prepared.error:
+        raise IOError(prepared.error)
+    return "{} ringen".format(prepared.stats['clip'].rings)
+
+
+def prefetch_sites(sites, geocoder, cache, vector_cache, progress=None, fetch_bytes=http_fetch_bytes,
+                   fetch_text=http_fetch_text, max_workers=LAYER_WORKERS, on_result=None, layers=None):
+    """Geocodeer de locaties en vul de caches per (locatie, laag).
+
+    Args:
+        sites: List van Site
+        geocoder: geocoder.Geocoder (met de gedeelde geocode cache)
+        cache: TileCache; vector_cache: VectorCache
+        progress: PrefetchProgress (None = niet hervatbaar)
+        max_workers: Aantal lagen dat tegelijk gevuld wordt; per host begrenst
+            de HTTP client het aantal gelijktijdige requests
+        on_result: Optionele functie(site, key, ok, message) per laag
+        layers: Laagdefinities (standaard GIS_LAYERS)
+
+    Returns:
+        PrefetchStats
+    """
+    progress = progress or PrefetchProgress()
+    layers = layers or GIS_LAYERS
+    stats = PrefetchStats()
+    stats.sites = len(sites)
+    start = time.time()
+    jobs = []
+    for site in sites:
+        if site.rd is None:
+            entry = progress.get('geocode', site.key)
+            if entry is not None and entry.get('ok'):
+                site.rd, site.name = tuple(entry['rd']), entry.get('name', site.text)
+            else:
+                try:
+                    results = geocoder.search(site.text)
+                except Exception as e:
+                    results = []
+                    progress.record('geocode', site.key, ok=False, error=str(e))
+                if results:
+                    site.rd, site.name = (results[0]['x'], results[0]['y']), results[0]['name']
+                    progress.record('geocode', site.key, ok=True, rd=list(site.rd), name=site.name)
+                    stats.geocoded += 1
+        if site.rd is None:
+            stats.not_found += 1
+            if on_result is not None:
+                on_result(site, None, False, "adres niet gevonden")
+            continue
+        for key, size in sorted(site.bbox_sizes.items()):
+            if progress.done('layer', site.key, key, size):
+                stats.skipped += 1
+            else:
+                jobs.append((site, key, size))
+
+    def warm(site, key, size):
+        try:
+            message = warm_layer(key, layers[key], site.rd[0], site.rd[1], size, fetch_bytes, fetch_text,
+                                 cache, vector_cache)
+            ok = True
+        except Exception as e:
+            message, ok = str(e), False
+        progress.record('layer', site.key, key, size, ok=ok, message=message)
+        return ok, message
+
+    for index, (ok, message) in iter_prepared_layers(jobs, warm, max_workers):
+        site, key, _ = jobs[index]
+        if ok:
+            stats.layers += 1
+        else:
+            stats.failed += 1
+        if on_result is not None:
+            on_result(site, key, ok, message)
+    cache.flush()
+    stats.seconds = time.time() - start
+    return stats
+
+
+def main(argv=None):
+    import argparse
+    from tile_cache import default_cache_dir
+
+    parser = argparse.ArgumentParser(description="GIS2BIM caches vullen voor een lijst projectlocaties")
+    parser.add_argument('sites', help="Bestand met adressen of RD coordinaten (een per regel)")
+    parser.add_argument('--layers', required=True,
+                        help="Komma gescheiden laag sleutels met optionele bbox, bijv. top10nl=500,bgt_wegdelen")
+    parser.add_argument('--bbox', type=float, default=DEFAULT_BBOX_SIZE, help="Standaard bbox in meters")
+    parser.add_argument('--cache', default=default_cache_dir(), help="Tile cache map")
+    parser.add_argument('--workers', type=int, default=LAYER_WORKERS, help="Lagen tegelijk")
+    parser.add_argument('--restart', action='store_true', help="Voortgang negeren en alles opnieuw vullen")
+    args = parser.parse_args(argv)
+
+    try:
+        sites = read_sites(args.sites, parse_layer_sizes(args.layers, args.bbox))
+    except ValueError as e:
+        print(str(e))
+        return 1
+    path = progress_path(args.sites)
+    if args.restart and os.path.exists(path):
+        os.remove(path)
+    progress = PrefetchProgress(path)
+    geocoder = Geocoder(http_fetch_text, default_geocode_cache())
+
+    def on_result(site, key, ok, message):
+        print("- {}{}: {}{}".format(site.name, " / " + key if key else "", "" if ok else "FOUT - ", message))
+
+    stats = prefetch_sites(sites, geocoder, TileCache(args.cache), VectorCache(), progress,
+                           max_workers=args.workers, on_result=on_result)
+    print(stats.summary())
+    print("HTTP: " + default_client().stats.summary())
+    default_client().close()
+    print("Voortgang: {}".format(path))
+    return 1 if stats.failed or stats.not_found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Span tracer voor GIS2BIM - tijd, bytes en aantallen per laag en stap
+Elke stap van een import (download, parsen, clippen, PNG schrijven,
+ImageType.Create, detail lines, DirectShapes, ...) is een span met wandtijd
+en tellers. Afgeronde spans worden als JSON regels naar een tracebestand
+geschreven (een regel per span, runs achter elkaar) en aan het eind als
+tabel samengevat. Is het bestand bij het begin van een run groter dan
+MAX_TRACE_BYTES, dan schuift het door naar <bestand>.1 (een eerdere .1
+vervalt), zodat er nooit meer dan twee bestanden zijn. Werkt ook vanuit
+achtergrond threads.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+TRACE_NAME = 'GIS2BIM_trace.jsonl'
+MAX_TRACE_BYTES = 5 * 1024 * 1024
+
+
+def trace_path(output_folder):
+    """Tracebestand naast de output map: <map>_trace.jsonl (GIS2BIM -> GIS2BIM_trace.jsonl)."""
+    folder = os.path.abspath(output_folder).rstrip('\\/')
+    return folder + '_trace.jsonl'
+
+
+def rotate_trace(path, max_bytes=MAX_TRACE_BYTES):
+    """Schuif path door naar path + '.1' als het max_bytes of groter is.
+
+    Returns:
+        True als het bestand doorgeschoven is
+    """
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return False
+        old_path = path + '.1'
+        if os.path.exists(old_path):
+            os.remove(old_path)
+        os.rename(path, old_path)
+        return True
+    except OSError:
+        return False
+
+
+class Span(object):
+    """Een gemeten stap; tellers kunnen ook vanuit worker threads opgehoogd worden."""
+
+    def __init__(self, tracer, name, layer, parent, counts):
+        self.tracer = tracer
+        self.name = name
+        self.layer = layer
+        self.parent = parent
+        self.counts = dict(counts)
+        self.start = time.time()
+        self.seconds = 0.0
+        self.error = None
+        self.thread = threading.current_thread().name
+        self._lock = threading.Lock()
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def set(self, **counts):
+        with self._lock:
+            self.counts.update(counts)
+
+    def counting(self, fetch, requests='requests', size='bytes', not_modified='not_modified'):
+        """Wrap een fetch functie (url -> bytes/tekst) die requests en bytes telt.
+
+        Geeft fetch bij revalidatie (cached=...) diezelfde body terug (304),
+        dan telt dat als not_modified en niet als gedownloade bytes.
+        """
+        def counted(url, **kwargs):
+            data = fetch(url, **kwargs)
+            self.add(requests)
+            cached = kwargs.get('cached')
+            if cached is not None and data is cached:
+                self.add(not_modified)
+            else:
+                self.add(size, len(data) if data is not None else 0)
+            return data
+        return counted
+
+    def record(self):
+        record = {'run': self.tracer.run_id, 'layer': self.layer, 'span': self.name,
+                  'parent': self.parent.name if self.parent is not None else None,
+                  'start': round(self.start, 3), 'seconds': round(self.seconds, 4), 'thread': self.thread}
+        record.update(self.counts)
+        if self.error:
+            record['error'] = self.error
+        return record
+
+    def __enter__(self):
+        self.tracer._push(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.time() - self.start
+        if exc_type is not None:
+            self.error = "{}: {}".format(exc_type.__name__, exc)
+        self.tracer._pop(self)
+        return False
+
+
+class Tracer(object):
+    """Verzamelt spans en schrijft ze optioneel als JSON regels naar path.
+
+    Gebruik:
+        tracer = Tracer(trace_path(output_folder))
+        with tracer.span('download', layer='luchtfoto') as span:
+            fetch = span.counting(fetch_bytes)
+            ...
+            span.set(tiles=len(urls))
+        print(tracer.summary_table())
+    """
+
+    def __init__(self, path=None, run_id=None, max_bytes=MAX_TRACE_BYTES):
+        self.path = path
+        if path:
+            rotate_trace(path, max_bytes)
+        self.run_id = run_id or time.strftime('%Y%m%dT%H%M%S')
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def span(self, name, layer=None, **counts):
+        stack = getattr(self._local, 'stack', None)
+        parent = stack[-1] if stack else None
+        if layer is None and parent is not None:
+            layer = parent.layer
+        return Span(self, name, layer, parent, counts)
+
+    def _push(self, span):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        self._local.stack.append(span)
+
+    def _pop(self, span):
+        stack = getattr(self._local, 'stack', [])
+        if span in stack:
+            stack.remove(span)
+        line = json.dumps(span.record(), sort_keys=True)
+        with self._lock:
+            self.spans.append(span)
+            if self.path:
+                try:
+                    with open(self.path, 'a') as f:
+                        f.write(line + '\n')
+                except (IOError, OSError):
+                    self.path = None
+
+    def summary(self):
+        """Totalen per (laag, stap), per laag gegroepeerd in volgorde van eerste voorkomen.
+
+        Returns:
+            List van dicts met layer, span, calls, seconds en opgetelde tellers
+        """
+        rows = []
+        by_key = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in sorted(spans, key=lambda s: s.start):
+            key = (span.layer, span.name)
+            row = by_key.get(key)
+            if row is None:
+                row = by_key[key] = {'layer': span.layer, 'span': span.name, 'calls': 0, 'seconds': 0.0,
+                                     'counts': {}, 'errors': 0}
+                rows.append(row)
+            row['calls'] += 1
+            row['seconds'] += span.seconds
+            row['errors'] += 1 if span.error else 0
+            for name, value in span.counts.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    row['counts'][name] = row['counts'].get(name, 0) + value
+        layer_order = {}
+        for row in rows:
+            layer_order.setdefault(row['layer'], len(layer_order))
+        rows.sort(key=lambda r: layer_order[r['layer']])
+        return rows
+
+    def summary_table(self):
+        """Samenvatting als tekst tabel (laag, stap, tijd, kB, overige tellers)."""
+        rows = self.summary()
+        if not rows:
+            return "Geen spans"
+        width = max([len(u"{}".format(r['layer'] or '-')) for r in rows] + [4])
+        lines = [u"{:<{w}}  {:<14} {:>8} {:>10}  {}".format("Laag", "Stap", "s", "kB", "Tellers", w=width)]
+        for row in rows:
+            counts = dict(row['counts'])
+            size = counts.pop('bytes', None)
+            extra = ", ".join("{}={}".format(k, _format_count(v)) for k, v in sorted(counts.items()))
+            if row['calls'] > 1:
+                extra = "{}x{}".format(row['calls'], (", " + extra) if extra else "")
+            if row['errors']:
+                extra += " ({} fout)".format(row['errors'])
+            lines.append(u"{:<{w}}  {:<14} {:>8.2f} {:>10}  {}".format(
+                row['layer'] or '-', row['span'], row['seconds'],
+                "{:.0f}".format(size / 1024.0) if size is not None else "", extra, w=width))
+        return "\n".join(lines)
+
+
+def _format_count(value):
+    if isinstance(value, float):
+        return "{:.2f}".format(value)
+    return str(value)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Ruimtelijke selectie voor GIS2BIM - selectie, clipping en ontdubbeling van features
+Per polygoonring wordt de bounding box met het projectgebied vergeleken
+(een zoekvraag per laag, dus zonder index). Ringen die buiten het
+projectgebied vallen worden niet meer getekend, van ringen die de rand kruisen blijven alleen de delen
+binnen de bbox over (open polylines, zonder lijnen langs de bbox) en
+identieke geometrieen (dubbel in pagina's of lagen) worden maar een keer
+doorgegeven.
+"""
+
+import threading
+
+from line_simplify import extract_polygon_rings
+
+
+DEFAULT_SNAP = 0.001
+
+
+def ring_bounds(ring):
+    xs = [p[0] for p in ring]
+    ys = [p[1] for p in ring]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def bbox_intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def bbox_contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def _clip_segment(a, b, bbox):
+    """Parameters (t0, t1) van het deel van segment a-b binnen bbox (Liang-Barsky), of None."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, a[0] - bbox[0]), (dx, bbox[2] - a[0]), (-dy, a[1] - bbox[1]), (dy, bbox[3] - a[1])):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / float(p)
+        if p < 0:
+            if t > t1:
+                return None
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return None
+            t1 = min(t1, t)
+    if t0 >= t1 and (dx or dy):
+        return None
+    return t0, t1
+
+
+def _point_at(a, b, t):
+    return (a[0] + t * (b[0] - a[0]), a[1] + t * (b[1] - a[1]))
+
+
+def clip_ring(ring, bbox):
+    """Clip de rand van een polygoon op een rechthoek tot polylines.
+
+    Alleen de delen van de rand binnen bbox blijven over; er worden geen
+    lijnen langs de bbox toegevoegd om de polygoon weer te sluiten, die
+    zouden als detail lines op de rand van het projectgebied komen.
+
+    Args:
+        ring: List van (x, y), open of gesloten
+        bbox: (minx, miny, maxx, maxy)
+
+    Returns:
+        List van open polylines (lists van (x, y)); een ring die helemaal
+        binnen bbox ligt komt ongewijzigd (gesloten) terug
+    """
+    points = list(ring)
+    parts = []
+    current = None
+    first_in = last_in = False
+    for i in range(len(points) - 1):
+        a, b = points[i], points[i + 1]
+        span = _clip_segment(a, b, bbox)
+        if span is None:
+            current = None
+            continue
+        t0, t1 = span
+        if current is None:
+            current = [a if t0 == 0.0 else _point_at(a, b, t0)]
+            parts.append(current)
+        current.append(b if t1 == 1.0 else _point_at(a, b, t1))
+        first_in = first_in or (i == 0 and t0 == 0.0)
+        last_in = i == len(points) - 2 and t1 == 1.0
+        if t1 < 1.0:
+            current = None
+    # Een gesloten ring die door zijn beginpunt doorloopt: eerste en laatste deel aan elkaar
+    if len(parts) > 1 and points[0] == points[-1] and first_in and last_in:
+        parts[0] = parts.pop() + parts[0][1:]
+    return parts
+
+
+def ring_key(ring, snap=DEFAULT_SNAP):
+    """Sleutel voor een ring, onafhankelijk van startpunt en omloopzin."""
+    points = [(int(round(x / snap)), int(round(y / snap))) for x, y in ring]
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    if not points:
+        return ()
+    candidates = []
+    for seq in (points, points[::-1]):
+        start = seq.index(min(seq))
+        candidates.append(tuple(seq[start:] + seq[:start]))
+    return min(candidates)
+
+
+class GeometryDedup(object):
+    """Thread-safe verzameling van al geziene ringen (over pagina's en lagen)."""
+
+    def __init__(self, snap=DEFAULT_SNAP):
+        self.snap = snap
+        self._keys = set()
+        self._lock = threading.Lock()
+
+    def add(self, ring):
+        """True als de ring nieuw is."""
+        key = ring_key(ring, self.snap)
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            return True
+
+
+class ClipStats(object):
+    """Tellers van selectie en clipping."""
+
+    def __init__(self):
+        self.rings = 0
+        self.duplicates = 0
+        self.outside = 0
+        self.clipped = 0
+        self.inside = 0
+
+    def summary(self):
+        return "{} ringen: {} binnen, {} geclipt, {} buiten, {} dubbel".format(
+            self.rings, self.inside, self.clipped, self.outside, self.duplicates)
+
+
+def clip_rings(rings, bbox, dedup=None, stats=None):
+    """Selecteer ringen binnen bbox, clip randgevallen en ontdubbel.
+
+    Er is maar een zoekvraag (de bbox), dus een lineaire toets op de bounding
+    box per ring (zie gis_bench.py index voor de vergelijking met een STR-tree).
+
+    Args:
+        rings: Iterable van ringen (lists van (x, y))
+        bbox: Projectgebied (minx, miny, maxx, maxy)
+        dedup: Optioneel GeometryDedup, te delen tussen lagen (None = alleen binnen deze aanroep)
+        stats: Optioneel ClipStats object
+
+    Returns:
+        List van ringen en (voor ringen die de rand kruisen) open polylines,
+        in de oorspronkelijke volgorde
+    """
+    if dedup is None:
+        dedup = GeometryDedup()
+    result = []
+    for ring in rings:
+        if len(ring) < 3:
+            continue
+        if stats is not None:
+            stats.rings += 1
+        bounds = ring_bounds(ring)
+        if not bbox_intersects(bounds, bbox):
+            if stats is not None:
+                stats.outside += 1
+            continue
+        if not dedup.add(ring):
+            if stats is not None:
+                stats.duplicates += 1
+            continue
+        if bbox_contains(bbox, bounds):
+            result.append(ring)
+            if stats is not None:
+                stats.inside += 1
+            continue
+        clipped = clip_ring(ring, bbox)
+        if clipped:
+            result.extend(clipped)
+            if stats is not None:
+                stats.clipped += 1
+        elif stats is not None:
+            stats.outside += 1
+    return result
+
+
+def feature_rings(features):
+    """Buitenringen van GeoJSON features (ongeclipt)."""
+    rings = []
+    for feature in features:
+        rings.extend(extract_polygon_rings(feature.get('geometry') or {}))
+    return rings
+
+
+def clip_features(features, bbox, dedup=None, stats=None):
+    """Buitenringen van GeoJSON features, geselecteerd en geclipt op bbox."""
+    return clip_rings(feature_rings(features), bbox, dedup, stats)
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Maaiveld TIN voor GIS2BIM - AHN hoogtegrid naar een beperkt aantal driehoeken
+Het hoogtegrid (DTM) wordt niet op volle resolutie als mesh geplaatst. Een
+quadtree begint met blokken van ROOT_BLOCK cellen, elk als waaier van vier
+driehoeken vanuit het middelpunt. Steeds wordt het blok met de grootste
+verticale afwijking tot het grid in vier gesplitst, tot alle blokken binnen
+de tolerantie vallen of het driehoekbudget op is. T-aansluitingen tussen een
+groot en een gesplitst buurblok worden gesloten doordat de waaier van het
+grote blok ook de tussenpunten op zijn randen meeneemt.
+
+Het resultaat is een vlak met (optioneel) zijwanden en een bodem, zodat een
+gesloten solid ontstaat, vergelijkbaar met een toposolid.
+"""
+
+import heapq
+import math
+import time
+from bisect import bisect_left, bisect_right
+
+
+DEFAULT_RESOLUTION = 1.0
+DEFAULT_TOLERANCE = 0.10
+DEFAULT_MAX_TRIANGLES = 20000
+ROOT_BLOCK = 32
+# Maximaal aantal hoogtepunten per zijde van het grid
+MAX_SAMPLES = 1025
+# Waarden hierboven zijn NoData, ook zonder GDAL_NODATA tag (AHN gebruikt float32 max)
+NODATA_LIMIT = 1e30
+
+
+class DemGridPlan(object):
+    """Hoogtegrid rond een bbox waarvan het aantal cellen per zijde een
+    veelvoud van block is, zodat de quadtree het grid precies vult.
+
+    Hoogtepunten liggen op de pixelmiddens; de request bbox (bbox) ligt een
+    halve pixel buiten de buitenste punten. Is het grid groter dan
+    max_samples, dan wordt de resolutie grover gemaakt.
+    """
+
+    def __init__(self, bbox, resolution=DEFAULT_RESOLUTION, block=ROOT_BLOCK, max_samples=MAX_SAMPLES):
+        minx, miny, maxx, maxy = bbox
+        extent = max(maxx - minx, maxy - miny)
+        max_cells = max(block, (max_samples - 1) // block * block)
+        if extent / resolution > max_cells:
+            resolution = extent / float(max_cells)
+        self.resolution = resolution
+        self.block = block
+        self.cells_x = max(1, int(math.ceil((maxx - minx) / resolution / block - 1e-9))) * block
+        self.cells_y = max(1, int(math.ceil((maxy - miny) / resolution / block - 1e-9))) * block
+        self.width = self.cells_x + 1
+        self.height = self.cells_y + 1
+        cx, cy = (minx + maxx) / 2.0, (miny + maxy) / 2.0
+        half_w, half_h = self.width * resolution / 2.0, self.height * resolution / 2.0
+        self.bbox = (cx - half_w, cy - half_h, cx + half_w, cy + half_h)
+        # RD van hoogtepunt (0, 0): noordwesthoek
+        self.origin = (self.bbox[0] + resolution / 2.0, self.bbox[3] - resolution / 2.0)
+
+    @property
+    def width_m(self):
+        return self.cells_x * self.resolution
+
+    @property
+    def height_m(self):
+        return self.cells_y * self.resolution
+
+    def point(self, i, j):
+        """RD coordinaat van hoogtepunt (kolom i, rij j)."""
+        return self.origin[0] + i * self.resolution, self.origin[1] - j * self.resolution
+
+
+def wcs_coverage_url(base_url, coverage, bbox, width, height, fmt='image/tiff'):
+    """WCS 2.0.1 GetCoverage voor een bbox in RD, geschaald naar width x height."""
+    return ("{}?SERVICE=WCS&VERSION=2.0.1&REQUEST=GetCoverage&COVERAGEID={}&FORMAT={}"
+            "&SUBSET=x({:.3f},{:.3f})&SUBSET=y({:.3f},{:.3f})&SCALESIZE=x({}),y({})").format(
+        base_url, coverage, fmt, bbox[0], bbox[2], bbox[1], bbox[3], width, height)
+
+
+def fill_nodata(values, width, height, nodata=None):
+    """Vul gaten (onder gebouwen, water) met het gemiddelde van de buren.
+
+    Werkt van de rand van een gat naar binnen; values wordt aangepast.
+
+    Returns:
+        Aantal gevulde punten
+    """
+    def missing(v):
+        return v != v or abs(v) > NODATA_LIMIT or (nodata is not None and v == nodata)
+
+    todo = [k for k in range(width * height) if missing(values[k])]
+    if len(todo) == width * height:
+        raise ValueError("Geen hoogtedata in het gebied")
+    filled = len(todo)
+    empty = set(todo)
+    while todo:
+        updates = []
+        for k in todo:
+            i, j = k % width, k // width
+            total, count = 0.0, 0
+            for n in (k - 1 if i > 0 else -1, k + 1 if i < width - 1 else -1,
+                      k - width if j > 0 else -1, k + width if j < height - 1 else -1):
+                if n >= 0 and n not in empty:
+                    total += values[n]
+                    count += 1
+            if count:
+                updates.append((k, total / count))
+        for k, value in updates:
+            values[k] = value
+            empty.discard(k)
+        todo = [k for k in todo if k in empty]
+    return filled
+
+
+class TinStats(object):
+    """Omvang van het grid en de TIN."""
+
+    def __init__(self):
+        self.samples = 0
+        self.filled = 0
+        self.blocks = 0
+        self.triangles = 0
+        self.grid_triangles = 0
+        self.max_error = 0.0
+        self.tolerance = 0.0
+        self.budget_hit = False
+        self.seconds = 0.0
+
+    def summary(self):
+        ratio = 100.0 * self.triangles / self.grid_triangles if self.grid_triangles else 0.0
+        return "{} driehoeken uit {} hoogtepunten ({:.1f}% van het volle grid, {} gevuld), max. afwijking {:.2f} m{} in {:.1f}s".format(
+            self.triangles, self.samples, ratio, self.filled, self.max_error,
+            " (budget bereikt)" if self.budget_hit else "", self.seconds)
+
+
+def _block_error(values, width, i0, j0, s):
+    """Grootste verticale afwijking van het grid tot de waaier van een blok."""
+    h = s // 2
+    ci, cj = i0 + h, j0 + h
+    zc = values[cj * width + ci]
+    z00, z10 = values[j0 * width + i0], values[j0 * width + i0 + s]
+    z01, z11 = values[(j0 + s) * width + i0], values[(j0 + s) * width + i0 + s]
+    # Vlakken z = zc + a*u + b*v met u, v in [-1, 1] (v naar het zuiden)
+    right = ((z10 + z11) / 2.0 - zc, (z11 - z10) / 2.0)
+    left = (zc - (z00 + z01) / 2.0, (z01 - z00) / 2.0)
+    south = ((z11 - z01) / 2.0, (z01 + z11) / 2.0 - zc)
+    north = ((z10 - z00) / 2.0, zc - (z00 + z10) / 2.0)
+    scale = 1.0 / h
+    worst = 0.0
+    for j in range(j0, j0 + s + 1):
+        v = (j - cj) * scale
+        av = abs(v)
+        row = j * width
+        for i in range(i0, i0 + s + 1):
+            u = (i - ci) * scale
+            if u >= av:
+                a, b = right
+            elif -u >= av:
+                a, b = left
+            elif v > 0:
+                a, b = south
+            else:
+                a, b = north
+            err = abs(values[row + i] - zc - a * u - b * v)
+            if err > worst:
+                worst = err
+    return worst
+
+
+def _root_block(cells_x, cells_y, block):
+    size = block
+    while size > 1 and (cells_x % size or cells_y % size):
+        size //= 2
+    return size
+
+
+def quadtree_blocks(values, width, height, tolerance=DEFAULT_TOLERANCE, max_triangles=DEFAULT_MAX_TRIANGLES,
+                    block=ROOT_BLOCK, stats=None):
+    """Verfijn de quadtree tot de tolerantie of het budget.
+
+    Het budget wordt behoudend geschat: een splitsing kost 12 driehoeken
+    plus maximaal 4 voor de tussenpunten bij de buren.
+
+    Returns:
+        List van blokken (i0, j0, size); size 1 is een cel van twee driehoeken
+    """
+    cells_x, cells_y = width - 1, height - 1
+    root = _root_block(cells_x, cells_y, block)
+    heap = []
+    cells = []
+    for j0 in range(0, cells_y, root):
+        for i0 in range(0, cells_x, root):
+            if root == 1:
+                cells.append((i0, j0, 1))
+            else:
+                heap.append((-_block_error(values, width, i0, j0, root), i0, j0, root))
+    heapq.heapify(heap)
+    estimate = 4 * len(heap) + 2 * len(cells)
+    budget_hit = False
+    while heap and -heap[0][0] > tolerance:
+        size = heap[0][3]
+        cost = 16 if size >= 4 else 8
+        if estimate + cost > max_triangles:
+            budget_hit = True
+            break
+        _, i0, j0, size = heapq.heappop(heap)
+        estimate += cost
+        half = size // 2
+        for ci, cj in ((i0, j0), (i0 + half, j0), (i0, j0 + half), (i0 + half, j0 + half)):
+            if half == 1:
+                cells.append((ci, cj, 1))
+            else:
+                heapq.heappush(heap, (-_block_error(values, width, ci, cj, half), ci, cj, half))
+    if stats is not None:
+        stats.max_error = -heap[0][0] if heap else 0.0
+        stats.budget_hit = budget_hit
+        stats.tolerance = tolerance
+    return [(i0, j0, size) for _, i0, j0, size in heap] + cells
+
+
+def triangulate_blocks(blocks):
+    """Driehoeken van de quadtree blokken, zonder T-aansluitingen.
+
+    Returns:
+        Tuple (punten als (i, j), driehoeken als index tuples, rand van het
+        grid als puntindices tegen de klok in gezien van boven)
+    """
+    rows, cols = {}, {}
+    for i0, j0, s in blocks:
+        for i, j in ((i0, j0), (i0 + s, j0), (i0, j0 + s), (i0 + s, j0 + s)):
+            rows.setdefault(j, set()).add(i)
+            cols.setdefault(i, set()).add(j)
+    rows = dict((j, sorted(v)) for j, v in rows.items())
+    cols = dict((i, sorted(v)) for i, v in cols.items())
+
+    points = []
+    index = {}
+
+    def point(i, j):
+        k = index.get((i, j))
+        if k is None:
+            k = index[(i, j)] = len(points)
+            points.append((i, j))
+        return k
+
+    def between(line, lo, hi):
+        return line[bisect_right(line, lo):bisect_left(line, hi)]
+
+    triangles = []
+    for i0, j0, s in blocks:
+        i1, j1 = i0 + s, j0 + s
+        if s == 1:
+            a, b, c, d = point(i0, j0), point(i1, j0), point(i1, j1), point(i0, j1)
+            triangles.append((a, d, c))
+            triangles.append((a, c, b))
+            continue
+        # Rand met de klok mee gezien van boven; waaier omgekeerd zodat de normalen omhoog wijzen
+        ring = [(i, j0) for i in [i0] + between(rows[j0], i0, i1)]
+        ring += [(i1, j) for j in [j0] + between(cols[i1], j0, j1)]
+        ring += [(i, j1) for i in [i1] + between(rows[j1], i0, i1)[::-1]]
+        ring += [(i0, j) for j in [j1] + between(cols[i0], j0, j1)[::-1]]
+        centre = point(i0 + s // 2, j0 + s // 2)
+        ring = [point(i, j) for i, j in ring]
+        for n in range(len(ring)):
+            triangles.append((centre, ring[(n + 1) % len(ring)], ring[n]))
+
+    max_i = max(cols)
+    max_j = max(rows)
+    boundary = [(i, max_j) for i in rows[max_j][:-1]]
+    boundary += [(max_i, j) for j in cols[max_i][::-1][:-1]]
+    boundary += [(i, 0) for i in rows[0][::-1][:-1]]
+    boundary += [(0, j) for j in cols[0][:-1]]
+    return points, triangles, [index[p] for p in boundary]
+
+
+def terrain_mesh(plan, values, rd_x, rd_y, tolerance=DEFAULT_TOLERANCE, max_triangles=DEFAULT_MAX_TRIANGLES,
+                 base_depth=None, nodata=None, stats=None):
+    """Bouw de maaiveld mesh uit een hoogtegrid volgens plan.
+
+    Args:
+        plan: DemGridPlan waarop values ingewonnen is
+        values: Hoogtes (m NAP) per punt, rij voor rij vanaf het noorden
+        rd_x, rd_y: Project centrum; vertices worden daar relatief aan
+        tolerance: Toegestane verticale afwijking (m)
+        max_triangles: Budget voor het maaiveld (zonder zijwanden en bodem)
+        base_depth: Bodem zoveel meter onder het laagste punt (None = alleen
+            het maaiveld, geen gesloten solid)
+        nodata: NoData waarde van het grid
+
+    Returns:
+        Dict met vertices (x, y, z), polygon_faces (eerst de maaiveld
+        driehoeken), surface_triangles (hun aantal), min_z en max_z
+    """
+    start = time.time()
+    stats = stats if stats is not None else TinStats()
+    stats.samples = plan.width * plan.height
+    stats.grid_triangles = 2 * plan.cells_x * plan.cells_y
+    stats.filled = fill_nodata(values, plan.width, plan.height, nodata)
+    blocks = quadtree_blocks(values, plan.width, plan.height, tolerance, max_triangles, plan.block, stats)
+    points, triangles, boundary = triangulate_blocks(blocks)
+
+    vertices = []
+    for i, j in points:
+        x, y = plan.point(i, j)
+        vertices.append((x - rd_x, y - rd_y, values[j * plan.width + i]))
+    faces = [list(t) for t in triangles]
+    zs = [v[2] for v in vertices]
+    min_z, max_z = min(zs), max(zs)
+    if base_depth is not None:
+        base_z = min_z - base_depth
+        first = len(vertices)
+        for k in boundary:
+            vertices.append((vertices[k][0], vertices[k][1], base_z))
+        count = len(boundary)
+        for n in range(count):
+            m = (n + 1) % count
+            faces.append([boundary[n], first + n, first + m, boundary[m]])
+        faces.append([first + n for n in range(count - 1, -1, -1)])
+    stats.blocks = len(blocks)
+    stats.triangles = len(triangles)
+    stats.seconds = time.time() - start
+    return {'vertices': vertices, 'polygon_faces': faces, 'surface_triangles': len(triangles),
+            'min_z': min_z, 'max_z': max_z}
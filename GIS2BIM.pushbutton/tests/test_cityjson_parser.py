@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Tests voor de triangulatie van 3D BAG surfaces (convexe fan vs earcut)
+Draaien vanuit GIS2BIM.pushbutton: python -m unittest discover tests
+"""
+
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cityjson_parser import _is_convex, triangulate_surface
+
+
+def flat(points):
+    """2D punten als vertices op z = 0, met een ring van indices."""
+    return [(x, y, 0.0) for x, y in points], list(range(len(points)))
+
+
+def star(count=5, step=2, radius=10.0):
+    return [(radius * math.cos(2 * math.pi * k * step / count), radius * math.sin(2 * math.pi * k * step / count))
+            for k in range(count)]
+
+
+def triangle_area(vertices, triangle):
+    (ax, ay, _), (bx, by, _), (cx, cy, _) = [vertices[i] for i in triangle]
+    return ((bx - ax) * (cy - ay) - (by - ay) * (cx - ax)) / 2.0
+
+
+class ConvexTest(unittest.TestCase):
+
+    def test_convex_rings(self):
+        self.assertTrue(_is_convex([(0, 0), (4, 0), (4, 3), (0, 3)]))
+        self.assertTrue(_is_convex([(0, 0), (0, 3), (4, 3), (4, 0)]))
+        self.assertTrue(_is_convex([(0, 0), (1, 0), (0, 1)]))
+
+    def test_concave_ring(self):
+        self.assertFalse(_is_convex([(0, 0), (4, 0), (4, 4), (2, 2), (0, 4)]))
+
+    def test_collinear_ring(self):
+        self.assertFalse(_is_convex([(0, 0), (2, 0), (4, 0), (4, 3), (0, 3)]))
+
+    def test_star_ring(self):
+        # Pentagram: alle bochten dezelfde kant op, maar twee omwentelingen
+        self.assertFalse(_is_convex(star()))
+
+    def test_double_wound_ring(self):
+        square = [(0, 0), (4, 0), (4, 4), (0, 4)]
+        self.assertFalse(_is_convex(square + square))
+
+
+class TriangulateSurfaceTest(unittest.TestCase):
+
+    def test_convex_fan(self):
+        vertices, ring = flat([(0, 0), (4, 0), (5, 2), (4, 4), (0, 4)])
+        triangles = triangulate_surface([ring], vertices)
+        self.assertEqual(len(triangles), 3)
+        self.assertAlmostEqual(sum(triangle_area(vertices, t) for t in triangles), 18.0)
+
+    def test_concave_keeps_area(self):
+        vertices, ring = flat([(0, 0), (4, 0), (4, 4), (2, 2), (0, 4)])
+        triangles = triangulate_surface([ring], vertices)
+        self.assertEqual(len(triangles), 3)
+        areas = [triangle_area(vertices, t) for t in triangles]
+        self.assertTrue(all(a > 0 for a in areas))
+        self.assertAlmostEqual(sum(areas), 12.0)
+
+    def test_star_is_not_fanned(self):
+        vertices, ring = flat(star())
+        fan = set(tuple(sorted((0, i, i + 1))) for i in range(1, len(ring) - 1))
+        triangles = triangulate_surface([ring], vertices)
+        self.assertNotEqual(set(tuple(sorted(t)) for t in triangles), fan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests voor het voorbereiden van lagen (ontdubbelen van vectorlagen, vlakbereiken per 3D BAG tegel)
+Draaien vanuit GIS2BIM.pushbutton: python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gis_pipeline
+from gis_pipeline import prepare_layer, write_tile_ranges
+from mesh_tools import TileMesh
+from spatial_index import GeometryDedup
+
+RD_X, RD_Y = 100000.0, 425000.0
+LAYER = {'type': 'ogcapi', 'url': 'http://example.test/ogc', 'collection': 'percelen'}
+RING = [[RD_X, RD_Y], [RD_X + 10, RD_Y], [RD_X + 10, RD_Y + 10], [RD_X, RD_Y + 10], [RD_X, RD_Y]]
+
+
+def fetch_text(url):
+    """Twee pagina's met dezelfde feature."""
+    feature = {'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [RING]}, 'properties': {}}
+    links = [] if 'page2' in url else [{'rel': 'next', 'href': 'http://example.test/ogc/page2'}]
+    return json.dumps({'type': 'FeatureCollection', 'features': [feature], 'links': links})
+
+
+class VectorDedupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.page_size = gis_pipeline.OGCAPI_PAGE_SIZE
+        gis_pipeline.OGCAPI_PAGE_SIZE = 1
+
+    def tearDown(self):
+        gis_pipeline.OGCAPI_PAGE_SIZE = self.page_size
+
+    def test_duplicate_across_pages(self):
+        prepared = prepare_layer('percelen', LAYER, RD_X, RD_Y, 500, fetch_text=fetch_text)
+        self.assertIsNone(prepared.error)
+        self.assertEqual(prepared.stats['clip'].rings, 2)
+        self.assertEqual(prepared.stats['clip'].duplicates, 1)
+        self.assertEqual(len(prepared.data['polylines']), 1)
+
+    def test_duplicate_across_layers(self):
+        dedup = GeometryDedup()
+        first = prepare_layer('a', LAYER, RD_X, RD_Y, 500, fetch_text=fetch_text, dedup=dedup)
+        second = prepare_layer('b', LAYER, RD_X, RD_Y, 500, fetch_text=fetch_text, dedup=dedup)
+        self.assertEqual(len(first.data['polylines']), 1)
+        self.assertEqual(second.stats['clip'].duplicates, 2)
+        self.assertEqual(second.data['polylines'], [])
+
+
+class TileRangesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def tile(self, key, building_ids):
+        tile = TileMesh(key, (key[0] * 100.0, key[1] * 100.0, key[0] * 100.0 + 100, key[1] * 100.0 + 100))
+        for n, building_id in enumerate(building_ids):
+            tile.ranges.append((building_id, n * 6, 6))
+            tile.faces.extend([[0, 1, 2]] * 6)
+        return tile
+
+    def test_failed_tiles_have_no_ranges(self):
+        placed, failed = self.tile((0, 0), ['a', 'b']), self.tile((1, 0), ['c'])
+        path = os.path.join(self.root, 'tiles.json')
+        write_tile_ranges(path, [placed, failed], {(0, 0): 123}, {(1, 0): "Geen geldige vlakken"})
+        with open(path) as f:
+            tiles = json.load(f)['tiles']
+        self.assertEqual(tiles[0]['element_id'], 123)
+        self.assertEqual(tiles[0]['buildings'], {'a': [0, 6], 'b': [6, 6]})
+        self.assertEqual(tiles[0]['faces'], 12)
+        self.assertEqual(tiles[1]['failed'], "Geen geldige vlakken")
+        self.assertNotIn('buildings', tiles[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Tests voor revalidatie met ETag: alleen validators bewaren, body van de aanroeper
+Draaien vanuit GIS2BIM.pushbutton: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import HttpClient, ValidatorStore
+from tile_cache import TileCache
+
+URL = 'http://example.test/tile.png'
+
+
+class FakeTransport(object):
+    """Geeft body met ETag, of 304 als If-None-Match klopt."""
+
+    def __init__(self, body=b'tegel', etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    def request(self, url, headers, context=None):
+        self.requests.append(dict(headers))
+        if headers.get('If-None-Match') == self.etag:
+            return 304, {}, b'', True
+        return 200, {'etag': self.etag}, self.body, True
+
+
+class RevalidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_stores_only_validators(self):
+        store = ValidatorStore(os.path.join(self.root, 'validators.json'))
+        client = HttpClient(FakeTransport(), store)
+        self.assertEqual(client.fetch_bytes(URL), b'tegel')
+        self.assertEqual(store.get(URL), ('"v1"', None))
+        client.close()
+        self.assertEqual(ValidatorStore(store.path).get(URL), ('"v1"', None))
+
+    def test_no_condition_without_cached_body(self):
+        transport = FakeTransport()
+        client = HttpClient(transport, ValidatorStore())
+        client.fetch_bytes(URL)
+        self.assertEqual(client.fetch_bytes(URL), b'tegel')
+        self.assertNotIn('If-None-Match', transport.requests[-1])
+
+    def test_not_modified_returns_cached_body(self):
+        transport = FakeTransport()
+        client = HttpClient(transport, ValidatorStore())
+        client.fetch_bytes(URL)
+        self.assertEqual(client.fetch_bytes(URL, cached=b'oud'), b'oud')
+        self.assertEqual(client.stats.not_modified, 1)
+
+    def test_expired_tile_cache_entry_is_revalidated(self):
+        transport = FakeTransport()
+        client = HttpClient(transport, ValidatorStore())
+        cache = TileCache(os.path.join(self.root, 'tiles'), ttl=0)
+        fetch = cache.wrap(client.fetch_bytes)
+        self.assertEqual(fetch(URL), b'tegel')
+        self.assertEqual(fetch(URL), b'tegel')
+        self.assertEqual(transport.requests[-1].get('If-None-Match'), '"v1"')
+        self.assertEqual(client.stats.not_modified, 1)
+        self.assertEqual(cache.stats()['entries'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Tests voor het per pagina vereenvoudigen van polygoonranden
+Draaien vanuit GIS2BIM.pushbutton: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from line_simplify import LineSimplifier, LineStats, iter_pages, simplify_rings
+
+
+def square(x, y, size=10.0):
+    return [(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)]
+
+
+def segments(polylines):
+    result = set()
+    for line in polylines:
+        for a, b in zip(line, line[1:]):
+            result.add((min(a, b), max(a, b)))
+    return result
+
+
+class LineSimplifierTest(unittest.TestCase):
+
+    def test_shared_edge_once_within_page(self):
+        stats = LineStats()
+        polylines = simplify_rings([square(0, 0), square(10, 0)], stats=stats)
+        self.assertEqual(stats.shared_segments, 1)
+        self.assertEqual(len(segments(polylines)), 7)
+
+    def test_shared_edge_once_across_pages(self):
+        stats = LineStats()
+        simplifier = LineSimplifier(stats=stats)
+        first = simplifier.add([square(0, 0)])
+        second = simplifier.add([square(10, 0)])
+        self.assertEqual(stats.shared_segments, 1)
+        self.assertFalse(segments(first) & segments(second))
+        self.assertEqual(len(segments(first + second)), 7)
+
+    def test_open_polyline(self):
+        polylines = simplify_rings([[(0, 0), (5, 0.01), (10, 0)]], tolerance=0.05)
+        self.assertEqual(polylines, [[(0, 0), (10, 0)]])
+
+    def test_iter_pages(self):
+        self.assertEqual(list(iter_pages(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+
+if __name__ == '__main__':
+    unittest.main()
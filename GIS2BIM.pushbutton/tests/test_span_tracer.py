@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Tests voor het doorschuiven van het tracebestand en het tellen van gedownloade bytes
+Draaien vanuit GIS2BIM.pushbutton: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import HttpClient, ValidatorStore
+from span_tracer import Tracer
+from test_http_client import URL, FakeTransport
+
+
+class TraceRotationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'GIS2BIM_trace.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_import(self, run_id, max_bytes):
+        tracer = Tracer(self.path, run_id=run_id, max_bytes=max_bytes)
+        for _ in range(10):
+            with tracer.span('download', layer='bgt'):
+                pass
+
+    def runs(self, path):
+        with open(path) as f:
+            return set(line.split('"run": "')[1].split('"')[0] for line in f)
+
+    def test_appends_below_limit(self):
+        self.run_import('a', 1 << 20)
+        self.run_import('b', 1 << 20)
+        self.assertEqual(self.runs(self.path), set(['a', 'b']))
+        self.assertFalse(os.path.exists(self.path + '.1'))
+
+    def test_rotates_above_limit(self):
+        for run_id in 'abc':
+            self.run_import(run_id, 100)
+        self.assertEqual(self.runs(self.path), set(['c']))
+        self.assertEqual(self.runs(self.path + '.1'), set(['b']))
+        self.assertEqual(sorted(os.listdir(self.root)), ['GIS2BIM_trace.jsonl', 'GIS2BIM_trace.jsonl.1'])
+
+
+class CountingTest(unittest.TestCase):
+
+    def test_not_modified_is_not_counted_as_bytes(self):
+        client = HttpClient(FakeTransport(), ValidatorStore())
+        tracer = Tracer()
+        with tracer.span('download', layer='luchtfoto') as span:
+            fetch = span.counting(client.fetch_bytes)
+            fetch(URL)
+            fetch(URL, cached=b'oude tegel')
+        self.assertEqual(span.counts, {'requests': 2, 'bytes': len(b'tegel'), 'not_modified': 1})
+
+    def test_not_modified_text(self):
+        client = HttpClient(FakeTransport(), ValidatorStore())
+        tracer = Tracer()
+        with tracer.span('download', layer='percelen') as span:
+            fetch = span.counting(client.fetch_text)
+            fetch(URL)
+            self.assertEqual(fetch(URL, cached=u'oude pagina'), u'oude pagina')
+        self.assertEqual(span.counts['not_modified'], 1)
+        self.assertEqual(span.counts['bytes'], len(u'tegel'))
+
+
+if __name__ == '__main__':
+    unittest.main()
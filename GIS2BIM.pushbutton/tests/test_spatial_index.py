@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Tests voor het clippen van polygoonranden op het projectgebied
+Draaien vanuit GIS2BIM.pushbutton: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial_index import ClipStats, clip_ring, clip_rings
+
+SITE = (0.0, 0.0, 10.0, 10.0)
+
+
+def on_site_edge(a, b):
+    """True als segment a-b over de rand van SITE loopt."""
+    return any(a[axis] == b[axis] == SITE[side] for axis, side in ((0, 0), (0, 2), (1, 1), (1, 3)))
+
+
+class ClipRingTest(unittest.TestCase):
+
+    def test_inside_ring_unchanged(self):
+        ring = [(2, 2), (8, 2), (8, 8), (2, 8), (2, 2)]
+        self.assertEqual(clip_ring(ring, SITE), [ring])
+
+    def test_crossing_ring_is_open(self):
+        parts = clip_ring([(-5, 2), (5, 2), (5, 8), (-5, 8), (-5, 2)], SITE)
+        self.assertEqual(parts, [[(0.0, 2.0), (5, 2), (5, 8), (0.0, 8.0)]])
+
+    def test_parts_joined_through_start(self):
+        parts = clip_ring([(5, 5), (15, 5), (15, 8), (5, 8), (5, 5)], SITE)
+        self.assertEqual(parts, [[(10.0, 8.0), (5, 8), (5, 5), (10.0, 5.0)]])
+
+    def test_enclosing_ring_draws_nothing(self):
+        self.assertEqual(clip_ring([(-5, -5), (15, -5), (15, 15), (-5, 15), (-5, -5)], SITE), [])
+
+    def test_no_lines_along_site_edge(self):
+        rings = [[(-5, 2), (5, 2), (5, 8), (-5, 8), (-5, 2)],
+                 [(5, 5), (5, 15), (6, 15), (6, 5), (8, 5), (8, 15), (9, 15), (9, 4), (5, 5)]]
+        stats = ClipStats()
+        lines = clip_rings(rings, SITE, stats=stats)
+        self.assertEqual(stats.clipped, 2)
+        self.assertEqual(len(lines), 3)
+        for line in lines:
+            for a, b in zip(line, line[1:]):
+                self.assertFalse(on_site_edge(a, b))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Tests voor de vector cache (.g2bv bestanden en de selectie op bbox)
+Draaien vanuit GIS2BIM.pushbutton: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_cache import RingBuffer, VectorCache, load_rings, read_header, write_rings
+
+LAYER = {'url': 'http://example.test/ogc', 'collection': 'percelen'}
+RINGS = [[(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 0.0)],
+         [(100.5, 200.25), (101.5, 200.25), (101.5, 201.25), (100.5, 201.25), (100.5, 200.25)]]
+
+
+class RingFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'percelen.g2bv')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_round_trip(self):
+        write_rings(self.path, RINGS, {'key': 'percelen', 'bbox': [0, 0, 200, 300]})
+        with load_rings(self.path) as ring_set:
+            self.assertEqual(len(ring_set), 2)
+            self.assertEqual(list(ring_set), RINGS)
+            self.assertEqual(ring_set.header['key'], 'percelen')
+        self.assertEqual(read_header(self.path)['points'], 9)
+
+    def test_ring_buffer(self):
+        buffer = RingBuffer(RINGS[:1])
+        buffer.extend(RINGS[1:])
+        write_rings(self.path, buffer, {})
+        with load_rings(self.path) as ring_set:
+            self.assertEqual(list(ring_set), RINGS)
+
+    def test_parallel_writers(self):
+        errors = []
+
+        def write():
+            try:
+                for _ in range(20):
+                    write_rings(self.path, RINGS, {})
+            except (IOError, OSError) as e:
+                errors.append(e)
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with load_rings(self.path) as ring_set:
+            self.assertEqual(list(ring_set), RINGS)
+        self.assertEqual(os.listdir(self.root), ['percelen.g2bv'])
+        # Alleen het vervangen kan mislukken (Windows); nooit een botsing op de tijdelijke naam
+        self.assertTrue(all(isinstance(e, OSError) for e in errors))
+
+
+class VectorCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = VectorCache(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_containing_bbox(self):
+        self.cache.put('percelen', LAYER, (0, 0, 1000, 1000), RINGS)
+        ring_set = self.cache.get('percelen', LAYER, (250, 250, 750, 750))
+        self.assertIsNotNone(ring_set)
+        with ring_set:
+            self.assertEqual(list(ring_set), RINGS)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 0, 'stores': 1})
+
+    def test_truncated_only_exact_bbox(self):
+        self.cache.put('percelen', LAYER, (0, 0, 1000, 1000), RINGS, truncated=True)
+        self.assertIsNone(self.cache.get('percelen', LAYER, (250, 250, 750, 750)))
+        ring_set = self.cache.get('percelen', LAYER, (0, 0, 1000, 1000))
+        self.assertIsNotNone(ring_set)
+        ring_set.close()
+
+    def test_other_source_misses(self):
+        self.cache.put('percelen', LAYER, (0, 0, 1000, 1000), RINGS)
+        self.assertIsNone(self.cache.get('percelen', dict(LAYER, collection='panden'), (0, 0, 1000, 1000)))
+
+    def test_failed_replace_is_a_miss(self):
+        path = self.cache.put('percelen', LAYER, (0, 0, 1000, 1000), RINGS)
+        # Doel dat niet vervangen kan worden (zoals een nog gemapt bestand op Windows)
+        os.remove(path)
+        os.makedirs(os.path.join(path, 'bezet'))
+        self.assertIsNone(self.cache.put('percelen', LAYER, (0, 0, 1000, 1000), RINGS))
+        self.assertEqual(self.cache.stats()['stores'], 1)
+        self.assertEqual(os.listdir(self.root), [os.path.basename(path)])
+        self.assertIsNone(self.cache.get('percelen', LAYER, (0, 0, 1000, 1000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
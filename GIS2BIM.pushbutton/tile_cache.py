@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Tile Cache voor GIS2BIM - persistente schijfcache voor WMTS/WMS downloads
+Bestanden worden opgeslagen onder de SHA1 van hun sleutel, met een TTL per
+entry en een maximale totale grootte die via LRU eviction bewaakt wordt.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_TTL = 30 * 24 * 3600
+INDEX_NAME = 'index.json'
+
+
+def default_cache_dir(name='tile_cache'):
+    """Cache map per gebruiker (LOCALAPPDATA op Windows, anders temp)."""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or tempfile.gettempdir()
+    return os.path.join(base, 'GIS2BIM', name)
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def tile_key(service_url, layer_name, tilematrix, row, col):
+    """Sleutel voor een WMTS tile: (service URL, laag, TILEMATRIX, rij, kolom)."""
+    return _hash("wmts|{}|{}|{}|{}|{}".format(service_url, layer_name, tilematrix, row, col))
+
+
+def wmts_url_key(url):
+    """Leid de tile_key af uit een WMTS GetTile URL (None voor andere URLs)."""
+    if '?' not in url:
+        return None
+    base, query = url.split('?', 1)
+    params = {}
+    for part in query.split('&'):
+        name, _, value = part.partition('=')
+        params[name.upper()] = value
+    if params.get('REQUEST', '').lower() != 'gettile':
+        return None
+    return tile_key(base, params.get('LAYER'), params.get('TILEMATRIX'),
+                    params.get('TILEROW'), params.get('TILECOL'))
+
+
+def url_key(url):
+    """Sleutel voor een willekeurige request (bijv. WMS GetMap)."""
+    return _hash("url|{}".format(url))
+
+
+class TileCache(object):
+    """Schijfcache met TTL, LRU eviction en hit/miss tellers.
+
+    De index (grootte, aanmaaktijd, laatste gebruik per sleutel) staat in
+    index.json in de cache map; ontbreekt die, dan wordt hij opnieuw
+    opgebouwd uit de bestanden.
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._index = {}
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _load_index(self):
+        index_path = os.path.join(self.root, INDEX_NAME)
+        try:
+            with open(index_path, 'r') as f:
+                self._index = json.load(f)
+            return
+        except (IOError, OSError, ValueError):
+            pass
+        self._index = {}
+        for sub in os.listdir(self.root):
+            sub_path = os.path.join(self.root, sub)
+            if not os.path.isdir(sub_path):
+                continue
+            for name in os.listdir(sub_path):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(sub_path, name)
+                mtime = os.path.getmtime(path)
+                self._index[name] = [os.path.getsize(path), mtime, mtime]
+        self._dirty = True
+
+    def flush(self):
+        """Schrijf de index naar schijf als er iets veranderd is."""
+        with self._lock:
+            if not self._dirty:
+                return
+            index_path = os.path.join(self.root, INDEX_NAME)
+            tmp_path = index_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._index, f)
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            os.rename(tmp_path, index_path)
+            self._dirty = False
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+        self._dirty = True
+
+    def get(self, key):
+        """Geef de gecachte bytes voor key, of None (verlopen telt als miss).
+
+        Een verlopen entry blijft staan (tot put of LRU eviction), zodat
+        get_stale hem nog voor revalidatie kan geven.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or now - entry[1] > self.ttl:
+                self.misses += 1
+                return None
+        # Lezen buiten de lock; een gelijktijdige eviction geeft hooguit een miss
+        data = self._read(key, entry)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            entry[2] = now
+            self._dirty = True
+            self.hits += 1
+        return data
+
+    def get_stale(self, key):
+        """Bytes voor key, ook als de entry verlopen is, of None (telt niet als hit of miss)."""
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is None:
+            return None
+        return self._read(key, entry)
+
+    def _read(self, key, entry):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            with self._lock:
+                if self._index.get(key) is entry:
+                    self._remove(key)
+            return None
+
+    def put(self, key, data):
+        """Sla bytes op onder key en evict zo nodig de oudst gebruikte entries.
+
+        Het bestand wordt buiten de lock naar een tijdelijke naam geschreven;
+        alleen het hernoemen en de index update gebeuren onder de lock, zodat
+        parallelle downloads niet op elkaars schijf IO wachten.
+        """
+        path = self._path(key)
+        folder = os.path.dirname(path)
+        if not os.path.exists(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                if not os.path.isdir(folder):
+                    raise
+        tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.current_thread().ident)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        now = time.time()
+        with self._lock:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                os.rename(tmp_path, path)
+            except OSError:
+                # Tegelijk door een andere thread geschreven (Windows): die versie houden
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                if not os.path.exists(path):
+                    raise
+            self._index[key] = [len(data), now, now]
+            self.stores += 1
+            self._dirty = True
+            evicted = self._evict_locked()
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry[0] for entry in self._index.values())
+
+    def _evict_locked(self):
+        """Haal de oudst gebruikte entries uit de index.
+
+        Returns:
+            Paden van de ge-evicte bestanden (verwijderen na de lock)
+        """
+        total = sum(entry[0] for entry in self._index.values())
+        if total <= self.max_bytes:
+            return []
+        target = int(self.max_bytes * 0.9)
+        evicted = []
+        for key, entry in sorted(self._index.items(), key=lambda kv: kv[1][2]):
+            if total <= target:
+                break
+            total -= entry[0]
+            del self._index[key]
+            evicted.append(self._path(key))
+            self.evictions += 1
+        self._dirty = True
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index.keys()):
+                self._remove(key)
+
+    def wrap(self, fetch_func, key_func=None):
+        """Maak een fetch functie die eerst de cache raadpleegt.
+
+        Bij een verlopen entry krijgt fetch_func de oude bytes als cached=...
+        mee, zodat HttpClient.fetch_bytes kan revalideren (304 = geen download).
+
+        Args:
+            fetch_func: Functie url -> bytes, met optioneel argument cached
+            key_func: Functie url -> sleutel (None of leeg = url_key)
+
+        Returns:
+            Functie url -> bytes, geschikt voor tile_fetcher.fetch_tiles
+        """
+        def cached_fetch(url):
+            key = (key_func(url) if key_func else None) or url_key(url)
+            data = self.get(key)
+            if data is None:
+                stale = self.get_stale(key)
+                data = fetch_func(url) if stale is None else fetch_func(url, cached=stale)
+                self.put(key, data)
+            return data
+        return cached_fetch
+
+    def wrap_text(self, fetch_text, key_func=None):
+        """Als wrap, voor een functie url -> tekst (UTF-8 in de cache)."""
+        def fetch_bytes(url, cached=None):
+            if cached is None:
+                return fetch_text(url).encode('utf-8')
+            return fetch_text(url, cached=cached.decode('utf-8')).encode('utf-8')
+        fetch = self.wrap(fetch_bytes, key_func)
+        return lambda url: fetch(url).decode('utf-8')
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'entries': len(self._index),
+            'bytes': self.total_bytes(),
+        }
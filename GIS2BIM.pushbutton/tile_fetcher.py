@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Tile Fetcher voor GIS2BIM - parallel downloaden van WMTS tiles
+Begrensde worker pool met retries (exponentiele backoff) en een vaste volgorde
+van resultaten, zodat het samenvoegen van tiles deterministisch blijft.
+Geen Revit/.NET afhankelijkheden: de download functie wordt meegegeven.
+"""
+
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+DEFAULT_MAX_WORKERS = 6
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+
+class TileFetchStats(object):
+    """Tellers van een fetch run (thread-safe bijgewerkt door de workers)."""
+
+    def __init__(self):
+        self.requested = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, succeeded=0, failed=0, retries=0):
+        with self._lock:
+            self.succeeded += succeeded
+            self.failed += failed
+            self.retries += retries
+
+    def as_dict(self):
+        return {
+            'requested': self.requested,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'retries': self.retries,
+            'elapsed': self.elapsed,
+        }
+
+
+def wmts_tile_url(base_url, layer_name, zoomlevel, row, col):
+    """Bouw een WMTS GetTile URL (EPSG:28992 tile matrix set)."""
+    return "{base}?SERVICE=WMTS&REQUEST=GetTile&VERSION=1.0.0&LAYER={layer}&STYLE=default&FORMAT=image/png&TILEMATRIXSET=EPSG:28992&TILEMATRIX={zoom}&TILEROW={row}&TILECOL={col}".format(
+        base=base_url, layer=layer_name, zoom=zoomlevel, row=row, col=col)
+
+
+def fetch_with_retry(fetch_func, url, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, sleep=time.sleep):
+    """Download een URL met retries en exponentiele backoff.
+
+    Args:
+        fetch_func: Functie url -> payload, mag een exception gooien
+        url: Te downloaden URL
+        retries: Aantal extra pogingen na de eerste mislukte poging
+        backoff: Wachttijd (s) voor de eerste retry, verdubbelt per poging
+
+    Returns:
+        Tuple (payload, aantal gebruikte retries). Gooit de laatste fout door
+        als alle pogingen mislukken.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fetch_func(url), attempt
+        except Exception:
+            if attempt >= retries:
+                raise
+            sleep(backoff * (2 ** attempt))
+            attempt += 1
+
+
+def fetch_tiles(urls, fetch_func, max_workers=DEFAULT_MAX_WORKERS, retries=DEFAULT_RETRIES,
+                backoff=DEFAULT_BACKOFF, sleep=time.sleep):
+    """Download een lijst URLs met een begrensde worker pool.
+
+    Args:
+        urls: List van URLs (volgorde bepaalt de volgorde van het resultaat)
+        fetch_func: Functie url -> payload (bijv. bytes of .NET byte[])
+        max_workers: Maximaal aantal gelijktijdige downloads
+        retries: Retries per tile
+        backoff: Start wachttijd voor retries in seconden
+
+    Returns:
+        Tuple (payloads, stats). payloads heeft dezelfde lengte en volgorde als
+        urls; mislukte tiles zijn None.
+    """
+    stats = TileFetchStats()
+    stats.requested = len(urls)
+    results = [None] * len(urls)
+    if not urls:
+        return results, stats
+
+    start = time.time()
+    jobs = queue.Queue()
+    for index, url in enumerate(urls):
+        jobs.put((index, url))
+
+    def worker():
+        while True:
+            try:
+                index, url = jobs.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                payload, used = fetch_with_retry(fetch_func, url, retries, backoff, sleep)
+                results[index] = payload
+                stats.add(succeeded=1, retries=used)
+            except Exception:
+                stats.add(failed=1, retries=retries)
+
+    worker_count = max(1, min(int(max_workers), len(urls)))
+    if worker_count == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(worker_count)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+
+    stats.elapsed = time.time() - start
+    return results, stats
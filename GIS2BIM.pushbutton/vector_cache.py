@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Vector cache voor GIS2BIM - geparste polygoonringen in een compact binair formaat
+Na de download van een WFS/OGC API laag worden de buitenringen (zoals
+extract_polygon_rings ze geeft, nog niet geclipt) per laag en bbox bewaard.
+Een volgende import van dezelfde plek leest het bestand via mmap in plaats
+van opnieuw te downloaden en de GeoJSON te parsen.
+
+Bestandsformaat (.g2bv, little-endian):
+    magic 'G2BV', uint16 versie, uint16 vlaggen, uint32 lengte van de header
+    JSON header (laag, bron, bbox, fetch tijd, aantallen), aangevuld tot 8 bytes
+    uint32[ringen + 1] offsets: index van het eerste punt per ring
+    (opvulling tot 8 bytes)
+    float64[punten * 2] coordinaten x0 y0 x1 y1 ...
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tile_cache import DEFAULT_TTL, default_cache_dir
+from spatial_index import bbox_contains
+
+
+MAGIC = b'G2BV'
+VERSION = 1
+EXTENSION = '.g2bv'
+_PREAMBLE = struct.Struct('<4sHHI')
+_LITTLE = sys.byteorder == 'little'
+
+
+def _pad(length, align=8):
+    return (align - length % align) % align
+
+
+class RingBuffer(object):
+    """Ringen in dezelfde compacte arrays als het bestand (16 bytes per punt).
+
+    Hiermee worden de ringen van een stroomsgewijze download verzameld voor
+    write_rings, zonder de features of lists van tuples vast te houden.
+    """
+
+    def __init__(self, rings=()):
+        self.offsets = array('I', [0])
+        self.coords = array('d')
+        self.extend(rings)
+
+    def extend(self, rings):
+        coords = self.coords
+        for ring in rings:
+            for point in ring:
+                coords.append(point[0])
+                coords.append(point[1])
+            self.offsets.append(len(coords) // 2)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def write_rings(path, rings, header):
+    """Schrijf ringen met een header naar path (via een uniek tijdelijk bestand).
+
+    Lukt het vervangen van path niet (bijv. op Windows nog gemapt door een
+    lezer), dan blijft het oude bestand staan en volgt een OSError.
+
+    Args:
+        path: Doelbestand
+        rings: RingBuffer of iterable van ringen (lists van (x, y))
+        header: Dict met laaginformatie; rings en points worden aangevuld
+
+    Returns:
+        Aantal geschreven bytes
+    """
+    if not isinstance(rings, RingBuffer):
+        rings = RingBuffer(rings)
+    offsets = rings.offsets
+    coords = rings.coords
+    header = dict(header, rings=len(offsets) - 1, points=len(coords) // 2, version=VERSION)
+    text = json.dumps(header, sort_keys=True).encode('utf-8')
+    text += b' ' * _pad(_PREAMBLE.size + len(text))
+    if not _LITTLE:
+        offsets, coords = array('I', offsets), array('d', coords)
+        offsets.byteswap()
+        coords.byteswap()
+    offset_bytes = _tobytes(offsets)
+    # Unieke naam: parallelle prefetch workers kunnen dezelfde laag en bbox schrijven
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.',
+                                    dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREAMBLE.pack(MAGIC, VERSION, 0, len(text)))
+            f.write(text)
+            f.write(offset_bytes)
+            f.write(b'\0' * _pad(len(offset_bytes)))
+            f.write(_tobytes(coords))
+            size = f.tell()
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def _tobytes(values):
+    return values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+
+def _parse_preamble(data, path):
+    if len(data) < _PREAMBLE.size:
+        raise IOError("Geen GIS2BIM vectorbestand: {}".format(path))
+    magic, version, _, header_length = _PREAMBLE.unpack(bytes(data[:_PREAMBLE.size]))
+    if magic != MAGIC or version != VERSION:
+        raise IOError("Geen GIS2BIM vectorbestand (versie {}): {}".format(VERSION, path))
+    return header_length
+
+
+def read_header(path):
+    """Lees alleen de JSON header van een .g2bv bestand."""
+    with open(path, 'rb') as f:
+        header_length = _parse_preamble(f.read(_PREAMBLE.size), path)
+        return json.loads(f.read(header_length).decode('utf-8'))
+
+
+def _view(buf, typecode, start, count):
+    """Getypeerde weergave van count waarden vanaf start, zonder kopie waar mogelijk."""
+    size = array(typecode).itemsize
+    if np is not None:
+        return np.frombuffer(buf, dtype='<u4' if typecode == 'I' else '<f8', count=count, offset=start)
+    if _LITTLE:
+        try:
+            return memoryview(buf)[start:start + count * size].cast(typecode)
+        except (AttributeError, TypeError):
+            pass
+    values = array(typecode)
+    chunk = bytes(buf[start:start + count * size])
+    if hasattr(values, 'frombytes'):
+        values.frombytes(chunk)
+    else:
+        values.fromstring(chunk)
+    if not _LITTLE:
+        values.byteswap()
+    return values
+
+
+class RingSet(object):
+    """Ringen uit een .g2bv bestand; punten worden pas per ring uitgepakt.
+
+    Itereren geeft lists van (x, y), net als extract_polygon_rings, zodat een
+    RingSet direct aan spatial_index.clip_rings doorgegeven kan worden. Het
+    bestand blijft gemapt tot close() (of het einde van een with blok).
+    """
+
+    def __init__(self, path, buf):
+        self.path = path
+        self._buf = buf
+        header_length = _parse_preamble(buf, path)
+        start = _PREAMBLE.size
+        self.header = json.loads(bytes(buf[start:start + header_length]).decode('utf-8'))
+        start += header_length
+        count = self.header['rings'] + 1
+        self._offsets = _view(buf, 'I', start, count)
+        start += count * 4
+        start += _pad(count * 4)
+        self._coords = _view(buf, 'd', start, self.header['points'] * 2)
+        self.nbytes = len(buf)
+
+    def __len__(self):
+        return self.header['rings']
+
+    def ring(self, index):
+        a, b = int(self._offsets[index]), int(self._offsets[index + 1])
+        flat = self._coords[2 * a:2 * b].tolist()
+        return list(zip(flat[0::2], flat[1::2]))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.ring(index)
+
+    def close(self):
+        # Weergaven eerst loslaten, anders weigert mmap te sluiten
+        self._offsets = self._coords = None
+        buf, self._buf = self._buf, None
+        if buf is not None and hasattr(buf, 'close'):
+            try:
+                buf.close()
+            except (BufferError, ValueError):
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_rings(path):
+    """Open een .g2bv bestand via mmap (of gewoon ingelezen als mmap ontbreekt)."""
+    with open(path, 'rb') as f:
+        buf = None
+        if mmap is not None:
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                buf = None
+        if buf is None:
+            buf = f.read()
+    return RingSet(path, buf)
+
+
+def source_key(key, layer_config):
+    """Sleutel voor de bron van een laag (sleutel, URL, laag/collectie en CRS)."""
+    parts = [key] + [layer_config.get(name) or '' for name in ('url', 'layer', 'collection', 'crs')]
+    return hashlib.sha1("|".join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class VectorCache(object):
+    """Map met .g2bv bestanden per laag en bbox, met TTL.
+
+    Een opgevraagde bbox wordt ook bediend vanuit een bestand met een
+    grotere bbox van dezelfde bron (clipping gebeurt daarna toch), behalve
+    als die download afgekapt was (truncated).
+    """
+
+    def __init__(self, root=None, ttl=DEFAULT_TTL):
+        self.root = root or default_cache_dir('vector_cache')
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+
+    def _entries(self, source):
+        now = time.time()
+        for name in os.listdir(self.root):
+            if not (name.startswith(source) and name.endswith(EXTENSION)):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                header = read_header(path)
+            except (IOError, OSError, ValueError):
+                continue
+            if now - header.get('fetched', 0) > self.ttl:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            yield path, header
+
+    def get(self, key, layer_config, bbox):
+        """RingSet voor de laag die bbox dekt, of None."""
+        bbox = [float(v) for v in bbox]
+        best = None
+        for path, header in self._entries(source_key(key, layer_config)):
+            if header['bbox'] == bbox or (not header.get('truncated') and bbox_contains(header['bbox'], bbox)):
+                if best is None or header['fetched'] > best[1]['fetched']:
+                    best = (path, header)
+        ring_set = None
+        if best is not None:
+            try:
+                ring_set = load_rings(best[0])
+            except (IOError, OSError, ValueError):
+                ring_set = None
+        with self._lock:
+            if ring_set is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return ring_set
+
+    def put(self, key, layer_config, bbox, rings, truncated=False, fetched=None):
+        """Bewaar de ringen van een laag; kleinere bboxen van dezelfde bron vervallen.
+
+        Mislukt het schrijven (bijv. tegelijk door een andere worker of een
+        lezer die het bestand nog gemapt heeft), dan wordt er niets bewaard:
+        de volgende import is dan een miss.
+
+        Returns:
+            Pad van het geschreven bestand, of None
+        """
+        bbox = [float(v) for v in bbox]
+        source = source_key(key, layer_config)
+        name = "{}_{}{}".format(source, hashlib.sha1(json.dumps(bbox).encode('utf-8')).hexdigest()[:12], EXTENSION)
+        path = os.path.join(self.root, name)
+        header = {'key': key, 'url': layer_config.get('url'), 'bbox': bbox, 'truncated': bool(truncated),
+                  'fetched': fetched or time.time()}
+        if not truncated:
+            for old_path, old in list(self._entries(source)):
+                if old_path != path and bbox_contains(bbox, old['bbox']):
+                    try:
+                        os.remove(old_path)
+                    except OSError:
+                        pass
+        try:
+            write_rings(path, rings, header)
+        except (IOError, OSError):
+            return None
+        with self._lock:
+            self.stores += 1
+        return path
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'stores': self.stores}
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+WFS 2.0 client voor GIS2BIM - STARTINDEX paginering en bbox opsplitsing
+Grote gebieden worden als quadtree opgesplitst zodra een tile meer features
+bevat dan de limiet per tile; features op tilegrenzen worden op
+identificatie / gml id ontdubbeld. Features komen als generator terug.
+"""
+
+import json
+import time
+
+from ogcapi_client import PageStats
+
+
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_TILE_MAX_FEATURES = 5000
+DEFAULT_MAX_DEPTH = 5
+
+
+class WfsStats(PageStats):
+    """PageStats aangevuld met ontdubbeling en opsplitsingen."""
+
+    def __init__(self):
+        PageStats.__init__(self)
+        self.duplicates = 0
+        self.subdivisions = 0
+
+    def summary(self):
+        return "{} ({} dubbel, {} opsplitsingen)".format(
+            PageStats.summary(self), self.duplicates, self.subdivisions)
+
+
+def wfs_getfeature_url(base_url, typename, bbox, count, start_index=0):
+    """WFS 2.0 GetFeature URL in EPSG:28992 met GeoJSON output."""
+    return "{base}?SERVICE=WFS&VERSION=2.0.0&REQUEST=GetFeature&TYPENAMES={layer}&BBOX={minx},{miny},{maxx},{maxy},urn:ogc:def:crs:EPSG::28992&COUNT={count}&STARTINDEX={start}&OUTPUTFORMAT=application/json".format(
+        base=base_url, layer=typename, minx=bbox[0], miny=bbox[1], maxx=bbox[2], maxy=bbox[3],
+        count=count, start=start_index)
+
+
+def feature_id(feature):
+    """Unieke sleutel: properties.identificatie, anders gml id, anders de geometrie."""
+    props = feature.get('properties') or {}
+    ident = props.get('identificatie') or feature.get('id')
+    if ident is not None:
+        return str(ident)
+    return json.dumps(feature.get('geometry'), sort_keys=True)
+
+
+def split_bbox(bbox):
+    """Splits een bbox in vier kwadranten (quadtree)."""
+    minx, miny, maxx, maxy = bbox
+    midx = (minx + maxx) / 2.0
+    midy = (miny + maxy) / 2.0
+    return [(minx, midy, midx, maxy), (midx, midy, maxx, maxy),
+            (minx, miny, midx, midy), (midx, miny, maxx, midy)]
+
+
+def _number_matched(data):
+    value = data.get('numberMatched', data.get('totalFeatures'))
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_wfs_features(base_url, typename, bbox, fetch_text, page_size=DEFAULT_PAGE_SIZE,
+                      tile_max_features=DEFAULT_TILE_MAX_FEATURES, max_depth=DEFAULT_MAX_DEPTH, stats=None):
+    """Loop alle features van een WFS laag binnen bbox af.
+
+    Per tile wordt met STARTINDEX gepagineerd. Meldt de server (numberMatched)
+    meer dan tile_max_features, of loopt de paginering daar overheen, dan wordt
+    de tile in vier kwadranten opgesplitst (tot max_depth).
+
+    Args:
+        base_url: WFS endpoint
+        typename: Feature type (bijv. 'bag:pand')
+        bbox: (minx, miny, maxx, maxy) in RD
+        fetch_text: Functie url -> response tekst
+        page_size: COUNT per request
+        tile_max_features: Maximum aantal features per tile voor opsplitsen
+        max_depth: Maximale quadtree diepte
+        stats: Optioneel WfsStats object
+
+    Yields:
+        Unieke GeoJSON feature dicts
+    """
+    seen = set()
+
+    def fetch_page(tile, start_index):
+        t0 = time.time()
+        text = fetch_text(wfs_getfeature_url(base_url, typename, tile, page_size, start_index))
+        data = json.loads(text)
+        features = data.get('features', []) or []
+        if stats is not None:
+            stats.add(len(features), time.time() - t0, len(text))
+        return data, features
+
+    def subdivide(tile, depth):
+        if stats is not None:
+            stats.subdivisions += 1
+        for sub in split_bbox(tile):
+            for feature in iter_tile(sub, depth + 1):
+                yield feature
+
+    def iter_tile(tile, depth):
+        start_index = 0
+        can_split = depth < max_depth
+        while True:
+            data, features = fetch_page(tile, start_index)
+            matched = _number_matched(data)
+            if start_index == 0 and can_split and matched is not None and matched > tile_max_features:
+                for feature in subdivide(tile, depth):
+                    yield feature
+                return
+            for feature in features:
+                fid = feature_id(feature)
+                if fid in seen:
+                    if stats is not None:
+                        stats.duplicates += 1
+                    continue
+                seen.add(fid)
+                yield feature
+            start_index += len(features)
+            if not features:
+                return
+            if matched is not None:
+                if start_index >= matched:
+                    return
+            elif len(features) < page_size:
+                return
+            if can_split and start_index >= tile_max_features:
+                # Server meldt geen totaal: rest via kleinere tiles (dubbelen worden overgeslagen)
+                for feature in subdivide(tile, depth):
+                    yield feature
+                return
+
+    for feature in iter_tile(tuple(bbox), 0):
+        yield feature
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+WMS tiler voor GIS2BIM - grote gebieden op een vaste grondresolutie
+Het gebied wordt in GetMap tiles opgeknipt die binnen de limieten van de
+server blijven, per tilerij parallel gedownload en regel voor regel naar een
+PNG geschreven. Er staat nooit meer dan een tilerij in het geheugen.
+"""
+
+import math
+import time
+
+from tile_fetcher import DEFAULT_MAX_WORKERS, DEFAULT_RETRIES, fetch_tiles
+from png_codec import PngWriter, decode_image
+
+
+DEFAULT_RESOLUTION = 0.25
+DEFAULT_TILE_PX = 1024
+DEFAULT_MAX_PX = 8192
+
+
+class WmsTile(object):
+    """Een GetMap request binnen het raster: positie en bbox in RD."""
+
+    def __init__(self, row, col, bbox, width, height):
+        self.row = row
+        self.col = col
+        self.bbox = bbox
+        self.width = width
+        self.height = height
+
+
+class WmsTilePlan(object):
+    """Opdeling van een bbox in tiles op een grondresolutie (m/px).
+
+    Is het resultaat groter dan max_px in een richting, dan wordt de
+    resolutie grover gemaakt zodat het beeld binnen max_px blijft.
+    """
+
+    def __init__(self, bbox, resolution=DEFAULT_RESOLUTION, tile_px=DEFAULT_TILE_PX, max_px=DEFAULT_MAX_PX):
+        minx, miny, maxx, maxy = bbox
+        extent = max(maxx - minx, maxy - miny)
+        if max_px and extent / resolution > max_px:
+            resolution = extent / float(max_px)
+        self.resolution = resolution
+        self.tile_px = tile_px
+        self.width = max(1, int(math.ceil((maxx - minx) / resolution - 1e-9)))
+        self.height = max(1, int(math.ceil((maxy - miny) / resolution - 1e-9)))
+        # Zelfde centrum, extent afgerond op hele pixels
+        cx, cy = (minx + maxx) / 2.0, (miny + maxy) / 2.0
+        self.bbox = (cx - self.width * resolution / 2.0, cy - self.height * resolution / 2.0,
+                     cx + self.width * resolution / 2.0, cy + self.height * resolution / 2.0)
+        self.cols = int(math.ceil(self.width / float(tile_px)))
+        self.rows = int(math.ceil(self.height / float(tile_px)))
+
+    @property
+    def width_m(self):
+        return self.width * self.resolution
+
+    @property
+    def height_m(self):
+        return self.height * self.resolution
+
+    def tile_row(self, row):
+        """Tiles van een rij (rij 0 = noordzijde, zoals in het beeld)."""
+        left, top = self.bbox[0], self.bbox[3]
+        y0 = row * self.tile_px
+        h = min(self.tile_px, self.height - y0)
+        tiles = []
+        for col in range(self.cols):
+            x0 = col * self.tile_px
+            w = min(self.tile_px, self.width - x0)
+            tiles.append(WmsTile(row, col, (left + x0 * self.resolution, top - (y0 + h) * self.resolution,
+                                            left + (x0 + w) * self.resolution, top - y0 * self.resolution), w, h))
+        return tiles
+
+    def tiles(self):
+        return [tile for row in range(self.rows) for tile in self.tile_row(row)]
+
+
+def wms_getmap_tile_url(base_url, layer_name, bbox, width, height):
+    return "{base}?SERVICE=WMS&VERSION=1.3.0&REQUEST=GetMap&LAYERS={layer}&STYLES=&CRS=EPSG:28992&BBOX={minx},{miny},{maxx},{maxy}&WIDTH={w}&HEIGHT={h}&FORMAT=image/png&TRANSPARENT=true".format(
+        base=base_url, layer=layer_name, minx=bbox[0], miny=bbox[1], maxx=bbox[2], maxy=bbox[3], w=width, h=height)
+
+
+class MosaicStats(object):
+    """Tellers van een WMS mosaic."""
+
+    def __init__(self):
+        self.tiles = 0
+        self.failed = 0
+        self.retries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        return "{} tiles ({} mislukt, {} retries), {:.0f} kB in {:.1f}s".format(
+            self.tiles, self.failed, self.retries, self.bytes / 1024.0, self.seconds)
+
+
+def write_wms_mosaic(path, plan, base_url, layer_name, fetch_bytes, decode_func=decode_image,
+                     max_workers=DEFAULT_MAX_WORKERS, retries=DEFAULT_RETRIES, stats=None):
+    """Download de tiles van een plan en schrijf ze als een PNG.
+
+    Per tilerij worden de tiles parallel opgehaald, gedecodeerd en als
+    beeldregels weggeschreven; mislukte tiles blijven transparant.
+
+    Args:
+        path: Uitvoer PNG
+        plan: WmsTilePlan
+        base_url, layer_name: WMS endpoint en laag
+        fetch_bytes: Functie url -> bytes (eventueel via de tile cache)
+        decode_func: Functie bytes -> (width, height, RGBA regels)
+        stats: Optioneel MosaicStats object
+    """
+    start = time.time()
+    with PngWriter(path, plan.width, plan.height) as writer:
+        for row in range(plan.rows):
+            tiles = plan.tile_row(row)
+            urls = [wms_getmap_tile_url(base_url, layer_name, t.bbox, t.width, t.height) for t in tiles]
+            payloads, fetch_stats = fetch_tiles(urls, fetch_bytes, max_workers=max_workers, retries=retries)
+            decoded = []
+            for tile, payload in zip(tiles, payloads):
+                rows = None
+                if payload is not None:
+                    try:
+                        width, height, rows = decode_func(payload)
+                        if width != tile.width or height != tile.height:
+                            rows = None
+                    except Exception:
+                        rows = None
+                if stats is not None:
+                    stats.bytes += len(payload) if payload is not None else 0
+                    stats.failed += 1 if rows is None else 0
+                decoded.append(rows if rows is not None else [bytearray(tile.width * 4)] * tile.height)
+            if stats is not None:
+                stats.tiles += len(tiles)
+                stats.retries += fetch_stats.retries
+            del payloads
+            for y in range(tiles[0].height):
+                writer.write_row(b''.join(bytes(rows[y]) for rows in decoded))
+    if stats is not None:
+        stats.seconds += time.time() - start
+    return plan